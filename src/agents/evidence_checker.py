@@ -1,6 +1,6 @@
-from langchain_openai import ChatOpenAI
-from langchain_core.prompts import ChatPromptTemplate 
+from src.config.registry import lazy
 from src.config.settings import settings
+from src.database.columnar import to_json
 from src.orchestration.mcp_context import MCPContext
 from src.observability.tracer import tracer
 import logging
@@ -13,10 +13,15 @@ class EvidenceChecker:
     """AGENTE 6: Verificador de evidências"""
     
     def __init__(self):
+        from langchain_openai import ChatOpenAI
+        from langchain_core.prompts import ChatPromptTemplate
+        from src.memory.llm_cache import get_llm_cache
+        
         self.llm = ChatOpenAI(
             model="gpt-4",
             temperature=0,
-            openai_api_key=settings.openai_api_key
+            openai_api_key=settings.openai_api_key,
+            cache=get_llm_cache("evidence_checker")
         )
         
         self.prompt = ChatPromptTemplate.from_messages([
@@ -56,36 +61,28 @@ Audite:""")
                 
                 logger.info("Checking evidence in response")
                 
-                data_str = json.dumps(
-                    context.execution_result.get('data', []),
-                    indent=2,
-                    ensure_ascii=False
-                )
-                
                 chain = self.prompt | self.llm
-                response = chain.invoke({
-                    "question": context.original_question,
-                    "sql": context.generated_sql,
-                    "data": data_str,
-                    "formatted_response": context.formatted_response
-                })
-                
-                audit_result = self._parse_audit_result(response.content)
-                context.metadata['evidence_check'] = audit_result
+                response = chain.invoke(self._build_inputs(context))
+                self._apply_audit(context, response.content)
                 
-                if not audit_result.get('is_correct'):
-                    logger.warning(f"Evidence issues: {audit_result.get('issues')}")
-                    corrected = audit_result.get('corrected_response')
-                    if corrected:
-                        context.formatted_response = corrected
-                        context.metadata['response_corrected'] = True
+            except Exception as e:
+                logger.error(f"Evidence check failed: {e}")
+                tracer.log_error("evidence_checker", e)
+        
+        return context
+    
+    async def acheck(self, context: MCPContext) -> MCPContext:
+        """Versão assíncrona de check (usa ainvoke)"""
+        with tracer.start_span("evidence_checker"):
+            try:
+                if not context.formatted_response:
+                    return context
                 
-                tracer.log_interaction("evidence_checker", {
-                    "is_correct": audit_result.get('is_correct'),
-                    "issues_count": len(audit_result.get('issues', []))
-                })
+                logger.info("Checking evidence in response")
                 
-                logger.info(f"Evidence check: {'OK' if audit_result.get('is_correct') else '❌ CORRIGIDO'}")
+                chain = self.prompt | self.llm
+                response = await chain.ainvoke(self._build_inputs(context))
+                self._apply_audit(context, response.content)
                 
             except Exception as e:
                 logger.error(f"Evidence check failed: {e}")
@@ -93,6 +90,33 @@ Audite:""")
         
         return context
     
+    def _build_inputs(self, context: MCPContext) -> dict:
+        data_str = to_json(context.execution_result.get('data', []))
+        return {
+            "question": context.original_question,
+            "sql": context.generated_sql,
+            "data": data_str,
+            "formatted_response": context.formatted_response
+        }
+    
+    def _apply_audit(self, context: MCPContext, content: str):
+        audit_result = self._parse_audit_result(content)
+        context.metadata['evidence_check'] = audit_result
+        
+        if not audit_result.get('is_correct'):
+            logger.warning(f"Evidence issues: {audit_result.get('issues')}")
+            corrected = audit_result.get('corrected_response')
+            if corrected:
+                context.formatted_response = corrected
+                context.metadata['response_corrected'] = True
+        
+        tracer.log_interaction("evidence_checker", {
+            "is_correct": audit_result.get('is_correct'),
+            "issues_count": len(audit_result.get('issues', []))
+        })
+        
+        logger.info(f"Evidence check: {'OK' if audit_result.get('is_correct') else '❌ CORRIGIDO'}")
+    
     def _parse_audit_result(self, content: str) -> dict:
         """Parse JSON do LLM"""
         try:
@@ -109,4 +133,4 @@ Audite:""")
             }
 
 
-evidence_checker = EvidenceChecker()
+evidence_checker = lazy("evidence_checker", EvidenceChecker)
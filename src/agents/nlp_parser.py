@@ -1,5 +1,4 @@
-from langchain_openai import ChatOpenAI
-from langchain.prompts import ChatPromptTemplate
+from src.config.registry import lazy
 from src.config.settings import settings
 from src.orchestration.mcp_context import MCPContext
 from src.observability.tracer import tracer
@@ -11,10 +10,15 @@ logger = logging.getLogger(__name__)
 
 class NLPParser:
     def __init__(self):
+        from langchain_openai import ChatOpenAI
+        from langchain.prompts import ChatPromptTemplate
+        from src.memory.llm_cache import get_llm_cache
+        
         self.llm = ChatOpenAI(
             model=settings.model_name,
             temperature=settings.temperature,
-            openai_api_key=settings.openai_api_key
+            openai_api_key=settings.openai_api_key,
+            cache=get_llm_cache("nlp_parser")
         )
         
         self.prompt = ChatPromptTemplate.from_messages([
@@ -47,31 +51,53 @@ class NLPParser:
                 logger.info(f"Parsing question: {context.original_question}")
                 
                 chain = self.prompt | self.llm
-                response = chain.invoke({
-                    "question": context.original_question,
-                    "schema_context": context.schema_context or "Schema nao disponivel"
-                })
-                
-                parsed_content = response.content
-                if "```json" in parsed_content:
-                    parsed_content = parsed_content.split("```json")[1].split("```")[0].strip()
-                
-                context.parsed_intent = json.loads(parsed_content)
+                response = chain.invoke(self._build_inputs(context))
+                self._apply_intent(context, response.content)
                 
-                tracer.log_interaction("nlp_parser", {
-                    "question": context.original_question,
-                    "parsed_intent": context.parsed_intent
-                })
+            except Exception as e:
+                self._handle_error(context, e)
+        
+        return context
+    
+    async def aparse(self, context: MCPContext) -> MCPContext:
+        """Versao assincrona de parse (usa ainvoke)"""
+        with tracer.start_span("nlp_parser"):
+            try:
+                logger.info(f"Parsing question: {context.original_question}")
                 
-                logger.info(f"Successfully parsed intent: {context.parsed_intent['intent']}")
+                chain = self.prompt | self.llm
+                response = await chain.ainvoke(self._build_inputs(context))
+                self._apply_intent(context, response.content)
                 
             except Exception as e:
-                error_msg = f"NLP parsing failed: {str(e)}"
-                logger.error(error_msg)
-                context.add_error("nlp_parser", error_msg)
-                tracer.log_error("nlp_parser", e)
+                self._handle_error(context, e)
         
         return context
+    
+    def _build_inputs(self, context: MCPContext) -> dict:
+        return {
+            "question": context.original_question,
+            "schema_context": context.schema_context or "Schema nao disponivel"
+        }
+    
+    def _apply_intent(self, context: MCPContext, parsed_content: str):
+        if "```json" in parsed_content:
+            parsed_content = parsed_content.split("```json")[1].split("```")[0].strip()
+        
+        context.parsed_intent = json.loads(parsed_content)
+        
+        tracer.log_interaction("nlp_parser", {
+            "question": context.original_question,
+            "parsed_intent": context.parsed_intent
+        })
+        
+        logger.info(f"Successfully parsed intent: {context.parsed_intent['intent']}")
+    
+    def _handle_error(self, context: MCPContext, error: Exception):
+        error_msg = f"NLP parsing failed: {str(error)}"
+        logger.error(error_msg)
+        context.add_error("nlp_parser", error_msg)
+        tracer.log_error("nlp_parser", error)
 
 
-nlp_parser = NLPParser()
\ No newline at end of file
+nlp_parser = lazy("nlp_parser", NLPParser)
\ No newline at end of file
@@ -1,23 +1,77 @@
+from typing import AsyncIterator, Iterator, List, NamedTuple, Optional, Sequence, TextIO, Tuple
 from sqlalchemy import text
-from src.config.database import get_db_session
+from src.config.registry import lazy
+from src.config.database import get_db_session, get_async_db_connection
+from src.database.columnar import ColumnarResult
+from src.database.data_versions import data_versions
+from src.database.keyset import KeysetPlan, decode_token, encode_token, page_query, plan_keyset
+from src.database.schema_catalog import SchemaCatalog, schema_catalog
+from src.database.sql_fingerprint import fingerprint
+from src.memory.persistent_memory import memory
+from src.memory.result_spill import SpillHandle, SpillStore, SpillWriter, load_result, stored_result
 from src.orchestration.mcp_context import MCPContext
 from src.observability.tracer import tracer
+import asyncio
 import logging
+import time
+import csv
 from decimal import Decimal
 
 logger = logging.getLogger(__name__)
 
 
-def convert_decimals(obj):
-    """Converte Decimal para float recursivamente"""
-    if isinstance(obj, list):
-        return [convert_decimals(item) for item in obj]
-    elif isinstance(obj, dict):
-        return {key: convert_decimals(value) for key, value in obj.items()}
-    elif isinstance(obj, Decimal):
-        return float(obj)
-    else:
-        return obj
+def _typed_rows(rows: List[tuple]) -> List[tuple]:
+    """Decimal -> float direto na tupla da linha (para consumidores de batches)"""
+    return [tuple(float(v) if isinstance(v, Decimal) else v for v in row) for row in rows]
+
+
+class RowBatch(NamedTuple):
+    """Batch de linhas como chegou do cursor (iter_batches converte Decimal)"""
+    columns: Tuple[str, ...]
+    rows: List[tuple]
+    offset: int               # posição da primeira linha no resultado
+    truncated: bool = False   # último batch: havia mais linhas que max_rows
+
+
+class _ResultCollector:
+    """Junta os batches de uma execução: até memory_rows em memória, o resto no spill"""
+    
+    def __init__(self, memory_rows: int, spill_store: Optional[SpillStore] = None,
+                 spill_max_rows: Optional[int] = None):
+        self.memory_rows = memory_rows
+        self.spill_store = spill_store
+        # Limite passado ao cursor: com spill, o teto é o do arquivo
+        self.limit = spill_max_rows if spill_store else memory_rows
+        self.columns: Tuple[str, ...] = ()
+        self.rows: List[tuple] = []
+        self.truncated = False
+        self.writer: Optional[SpillWriter] = None
+    
+    @property
+    def spilling(self) -> bool:
+        return self.writer is not None
+    
+    def add(self, batch: RowBatch):
+        self.columns = batch.columns
+        self.truncated = batch.truncated
+        
+        if self.writer is not None:
+            self.writer.write(batch.rows)
+            return
+        
+        self.rows.extend(batch.rows)
+        if self.spill_store is not None and len(self.rows) > self.memory_rows:
+            # Passou do limite em memória: tudo vai para o arquivo, só a prévia fica
+            self.writer = self.spill_store.writer(self.columns)
+            self.writer.write(self.rows)
+            del self.rows[self.memory_rows:]
+    
+    def finish(self) -> Optional[SpillHandle]:
+        return self.writer.close() if self.writer is not None else None
+    
+    def abort(self):
+        if self.writer is not None:
+            self.writer.abort()
 
 
 class SmartQueryExecutor:
@@ -27,100 +81,416 @@ class SmartQueryExecutor:
     BATCH_SIZE = 100
     QUERY_TIMEOUT = 30
     
+    # Resultado compartilhado entre perguntas que geram a mesma SQL (fingerprint)
+    USE_RESULT_CACHE = True
+    
+    # Modo spill: acima de MAX_ROWS_IN_MEMORY o resultado vai para um arquivo Arrow
+    SPILL_MAX_ROWS = 1_000_000
+    
+    def __init__(self, batch_size: Optional[int] = None, catalog: Optional[SchemaCatalog] = None,
+                 spill_store: Optional[SpillStore] = None, spill_max_rows: Optional[int] = None):
+        # Linhas por round-trip do cursor no servidor (itersize)
+        self.batch_size = batch_size or self.BATCH_SIZE
+        self.catalog = catalog or schema_catalog
+        self.spill_store = spill_store
+        self.spill_max_rows = spill_max_rows or self.SPILL_MAX_ROWS
+    
     def execute(self, context: MCPContext) -> MCPContext:
         with tracer.start_span("smart_query_executor"):
             try:
-                if not context.validation_result or not context.validation_result.get('is_valid'):
-                    context.execution_result = {
-                        'success': False,
-                        'error': 'Query validation failed',
-                        'data': []
-                    }
+                if not self._is_executable(context):
                     return context
                 
                 sql = context.generated_sql
                 logger.info(f"Executing SQL with smart limits: {sql[:100]}...")
                 
-                result = self._execute_with_streaming(sql, context)
-                context.execution_result = result
-                
-                tracer.log_interaction("smart_query_executor", {
-                    "sql": sql,
-                    "rows_returned": len(result.get('data', [])),
-                    "truncated": result.get('truncated', False),
-                    "execution_time": result.get('execution_time', 0)
-                })
+                # Consulta de novo: a SQL pode ter entrado no cache enquanto esperava
+                # vaga (as unidades cobradas voltam no release_for)
+                result = None
+                if self.USE_RESULT_CACHE:
+                    result = self._mark_cached(memory.get_sql_result(sql), context)
+                if result is None:
+                    # Versões lidas antes da execução: nunca mais novas que o resultado
+                    versions = data_versions.versions_for(sql)
+                    result = self._paginate(sql, self._execute_with_streaming(sql, context))
+                    result['table_versions'] = versions
+                    if self.USE_RESULT_CACHE:
+                        memory.save_sql_result(sql, self._cacheable(result))
+                self._apply_result(context, sql, result)
+            
+            except Exception as e:
+                self._handle_error(context, e)
+        
+        return context
+    
+    async def aexecute(self, context: MCPContext) -> MCPContext:
+        """Versao assincrona de execute (asyncpg, sem bloquear o event loop)"""
+        with tracer.start_span("smart_query_executor"):
+            try:
+                if not self._is_executable(context):
+                    return context
                 
-                logger.info(f"Query executed: {len(result.get('data', []))} rows")
+                sql = context.generated_sql
+                logger.info(f"Executing SQL with smart limits (async): {sql[:100]}...")
                 
+                result = None
+                if self.USE_RESULT_CACHE:
+                    result = self._mark_cached(await memory.aget_sql_result(sql), context)
+                if result is None:
+                    versions = await asyncio.to_thread(data_versions.versions_for, sql)
+                    result = await self._aexecute_with_streaming(sql, context)
+                    if result.get('truncated'):
+                        result = await asyncio.to_thread(self._paginate, sql, result)
+                    result['table_versions'] = versions
+                    if self.USE_RESULT_CACHE:
+                        await memory.asave_sql_result(sql, self._cacheable(result))
+                self._apply_result(context, sql, result)
+            
             except Exception as e:
-                error_msg = f"Query execution failed: {str(e)}"
-                logger.error(error_msg)
-                context.add_error("query_executor", error_msg)
-                context.execution_result = {
+                self._handle_error(context, e)
+        
+        return context
+    
+    def serve_from_cache(self, context: MCPContext) -> bool:
+        """Aplica o resultado do cache de SQL ao contexto, se houver
+        
+        Chamado antes do controle de admissão: hit não ocupa vaga nem orçamento.
+        """
+        if not self.USE_RESULT_CACHE or not self._is_executable(context):
+            return False
+        sql = context.generated_sql
+        result = self._mark_cached(memory.get_sql_result(sql), context)
+        if result is None:
+            return False
+        self._apply_result(context, sql, result)
+        return True
+    
+    async def aserve_from_cache(self, context: MCPContext) -> bool:
+        if not self.USE_RESULT_CACHE or not self._is_executable(context):
+            return False
+        sql = context.generated_sql
+        result = self._mark_cached(await memory.aget_sql_result(sql), context)
+        if result is None:
+            return False
+        self._apply_result(context, sql, result)
+        return True
+    
+    def run_sql(self, sql: str) -> dict:
+        """Reexecuta uma SQL já validada fora do workflow (refresh do cache, sem LLM)"""
+        with tracer.start_span("smart_query_executor.run_sql"):
+            logger.info(f"Re-executing cached SQL: {sql[:100]}...")
+            versions = data_versions.versions_for(sql)
+            result = self._execute_with_streaming(sql, None)
+            result['table_versions'] = versions
+            return result
+    
+    def fetch_page(self, token: str) -> dict:
+        """Próxima página de um resultado truncado (next_page): uma query, sem LLM"""
+        with tracer.start_span("smart_query_executor.fetch_page"):
+            try:
+                sql_key, after, served = decode_token(token)
+            except ValueError as e:
+                return {'success': False, 'error': str(e), 'data': []}
+            
+            cursor = memory.get_page_cursor(sql_key)
+            if cursor is None:
+                return {
                     'success': False,
-                    'error': error_msg,
+                    'error': 'Paginação expirada: refaça a pergunta para obter um novo token',
                     'data': []
                 }
-                tracer.log_error("query_executor", e)
+            
+            plan = KeysetPlan.from_dict(cursor['plan'])
+            logger.info(f"Fetching keyset page after {served} rows: {cursor['sql_query'][:100]}...")
+            return self._keyset_page(sql_key, plan, after, served)
+    
+    def _paginate(self, sql: str, result: dict) -> dict:
+        """Resultado truncado ganha next_page quando a SQL tem chave única (keyset)"""
+        if not result.get('success') or not result.get('truncated') or result.get('spill'):
+            return result
         
-        return context
+        plan = plan_keyset(sql, result['columns'], self.catalog)
+        if plan is None:
+            logger.info("Truncated result has no unique key; pagination unavailable")
+            return result
+        
+        memory.save_page_cursor(sql, plan.to_dict())
+        sql_key = fingerprint(sql)
+        
+        if plan.ordered:
+            return self._with_next_page(result, sql_key, plan, 0)
+        # Sem ordem total, a primeira página não serve de ponto de partida: relê na ordem da chave
+        return self._keyset_page(sql_key, plan, None, 0)
     
-    def _execute_with_streaming(self, sql: str, context: MCPContext) -> dict:
-        """Executa query com streaming (batches)"""
-        import time
-        start_time = time.time()
+    def _keyset_page(self, sql_key: str, plan: KeysetPlan, after: Optional[list], served: int) -> dict:
+        page_size = self.MAX_ROWS_IN_MEMORY
+        if plan.limit is not None:
+            page_size = min(page_size, plan.limit - served)
+        if page_size <= 0:
+            return self._build_result((), [], False, time.time())
+        
+        sql, params = page_query(plan, after, page_size + 1)
+        result = self._execute_with_streaming(sql, None, params, max_rows=page_size)
+        return self._with_next_page(result, sql_key, plan, served)
+    
+    def _with_next_page(self, result: dict, sql_key: str, plan: KeysetPlan, served: int) -> dict:
+        data = result.get('data', [])
+        served += len(data)
         
+        if not result.get('truncated') or (plan.limit is not None and served >= plan.limit):
+            result['truncated'] = False
+            return result
+        
+        last = data[-1]
+        after = [last[key] for key in plan.keys]
+        if any(value is None for value in after):
+            logger.warning("NULL in keyset key; pagination stops here")
+            return result
+        
+        result['next_page'] = encode_token(sql_key, after, served)
+        result['rows_served'] = served
+        return result
+    
+    @staticmethod
+    def _cacheable(result: dict) -> dict:
+        """Com spill, o cache de SQL guarda o handle e não a prévia"""
+        if not result.get('spill'):
+            return result
+        return {key: value for key, value in result.items() if key != 'data'}
+    
+    def _mark_cached(self, result: Optional[dict], context: MCPContext) -> Optional[dict]:
+        if result is None:
+            return None
         try:
-            with get_db_session() as session:
-                session.execute(text(f"SET statement_timeout = '{self.QUERY_TIMEOUT}s'"))
-                
-                result_proxy = session.execute(text(sql))
-                columns = list(result_proxy.keys())
-                
-                all_rows = []
-                truncated = False
-                
-                while len(all_rows) < self.MAX_ROWS_IN_MEMORY:
-                    batch = result_proxy.fetchmany(self.BATCH_SIZE)
-                    
-                    if not batch:
-                        break
-                    
-                    all_rows.extend(batch)
-                    
-                    if len(all_rows) >= self.MAX_ROWS_IN_MEMORY:
-                        truncated = True
-                        all_rows = all_rows[:self.MAX_ROWS_IN_MEMORY]
-                        break
-                
-                # Converte para dicionarios
-                data = [dict(zip(columns, row)) for row in all_rows]
-                
-                # Converte Decimals para float
-                data = convert_decimals(data)
-                
-                execution_time = time.time() - start_time
-                
-                if truncated:
-                    logger.warning(f"Results truncated to {self.MAX_ROWS_IN_MEMORY} rows")
+            result['data'] = load_result(stored_result(result), self.MAX_ROWS_IN_MEMORY)
+        except OSError as e:
+            logger.warning(f"Spill file for cached result is gone, re-executing: {e}")
+            return None
+        result['from_sql_cache'] = True
+        context.metadata['sql_cache_hit'] = True
+        return result
+    
+    def _is_executable(self, context: MCPContext) -> bool:
+        if not context.validation_result or not context.validation_result.get('is_valid'):
+            context.execution_result = {
+                'success': False,
+                'error': 'Query validation failed',
+                'data': []
+            }
+            return False
+        return True
+    
+    def _apply_result(self, context: MCPContext, sql: str, result: dict):
+        context.execution_result = result
+        
+        tracer.log_interaction("smart_query_executor", {
+            "sql": sql,
+            "rows_returned": len(result.get('data', [])),
+            "truncated": result.get('truncated', False),
+            "execution_time": result.get('execution_time', 0)
+        })
+        
+        logger.info(f"Query executed: {len(result.get('data', []))} rows")
+    
+    def _handle_error(self, context: MCPContext, error: Exception):
+        error_msg = f"Query execution failed: {str(error)}"
+        logger.error(error_msg)
+        context.add_error("query_executor", error_msg)
+        context.execution_result = {
+            'success': False,
+            'error': error_msg,
+            'data': []
+        }
+        tracer.log_error("query_executor", error)
+    
+    def iter_batches(self, sql: str, max_rows: Optional[int] = None) -> Iterator[RowBatch]:
+        """Gera batches tipados conforme chegam do cursor no servidor
+        
+        Sempre gera ao menos um batch (vazio sem linhas), para o consumidor
+        conhecer as colunas. Com max_rows, para uma linha depois do limite e
+        marca o último batch como truncated. Interromper a iteração fecha o
+        cursor sem buscar o restante.
+        """
+        for batch in self._iter_raw(sql, max_rows):
+            yield batch._replace(rows=_typed_rows(batch.rows))
+    
+    async def aiter_batches(self, sql: str, max_rows: Optional[int] = None) -> AsyncIterator[RowBatch]:
+        """Versao assincrona de iter_batches (cursor do asyncpg)"""
+        async for batch in self._aiter_raw(sql, max_rows):
+            yield batch._replace(rows=_typed_rows(batch.rows))
+    
+    def _iter_raw(self, sql: str, max_rows: Optional[int],
+                  params: Optional[dict] = None) -> Iterator[RowBatch]:
+        """Batches como vêm do driver (Decimal intacto)
+        
+        yield_per liga stream_results: no psycopg2 vira cursor nomeado, que busca
+        batch_size linhas por round-trip em vez de trazer o resultado inteiro no
+        execute.
+        """
+        with get_db_session() as session:
+            session.execute(text(f"SET statement_timeout = '{self.QUERY_TIMEOUT}s'"))
+            
+            result_proxy = session.execute(
+                text(sql), params or {}, execution_options={"yield_per": self.batch_size}
+            )
+            columns = tuple(result_proxy.keys())
+            offset = 0
+            
+            try:
+                for rows in result_proxy.partitions(self.batch_size):
+                    batch = self._make_batch(columns, rows, offset, max_rows)
+                    yield batch
+                    if batch.truncated:
+                        return
+                    offset += len(rows)
                 
-                return {
-                    'success': True,
-                    'data': data,
-                    'columns': columns,
-                    'row_count': len(data),
-                    'truncated': truncated,
-                    'execution_time': round(execution_time, 3)
-                }
+                if offset == 0:
+                    yield RowBatch(columns, [], 0)
+            finally:
+                result_proxy.close()
+    
+    async def _aiter_raw(self, sql: str, max_rows: Optional[int]) -> AsyncIterator[RowBatch]:
+        async with get_async_db_connection() as connection:
+            await connection.execute(text(f"SET statement_timeout = '{self.QUERY_TIMEOUT}s'"))
+            
+            result_stream = await connection.stream(
+                text(sql), execution_options={"yield_per": self.batch_size}
+            )
+            columns = tuple(result_stream.keys())
+            offset = 0
+            
+            try:
+                async for rows in result_stream.partitions(self.batch_size):
+                    batch = self._make_batch(columns, rows, offset, max_rows)
+                    yield batch
+                    if batch.truncated:
+                        return
+                    offset += len(rows)
                 
+                if offset == 0:
+                    yield RowBatch(columns, [], 0)
+            finally:
+                await result_stream.close()
+    
+    def export_csv(self, sql: str, output: TextIO) -> int:
+        """Grava o resultado completo em CSV batch a batch (sem MAX_ROWS_IN_MEMORY)"""
+        writer = csv.writer(output)
+        row_count = 0
+        
+        for batch in self.iter_batches(sql):
+            if batch.offset == 0:
+                writer.writerow(batch.columns)
+            writer.writerows(batch.rows)
+            row_count += len(batch.rows)
+        
+        logger.info(f"Exported {row_count} rows to CSV")
+        return row_count
+    
+    def _make_batch(self, columns: Tuple[str, ...], rows: list, offset: int,
+                    max_rows: Optional[int]) -> RowBatch:
+        truncated = max_rows is not None and offset + len(rows) > max_rows
+        if truncated:
+            rows = rows[:max_rows - offset]
+        return RowBatch(columns, list(rows), offset, truncated)
+    
+    def _execute_with_streaming(self, sql: str, context: MCPContext, params: Optional[dict] = None,
+                                max_rows: Optional[int] = None) -> dict:
+        """Executa query em batches até MAX_ROWS_IN_MEMORY (memória limitada a + um batch)
+        
+        Com spill_store (e sem max_rows explícito), o que passa do limite segue
+        do cursor direto para o arquivo; o resultado leva a prévia e o handle.
+        """
+        start_time = time.time()
+        collector = self._collector(max_rows)
+        
+        try:
+            for batch in self._iter_raw(sql, collector.limit, params):
+                collector.add(batch)
+            
+            return self._build_result(collector.columns, collector.rows, collector.truncated,
+                                      start_time, collector.finish())
+        
         except Exception as e:
+            collector.abort()
             logger.error(f"Streaming execution failed: {e}")
             return {
                 'success': False,
                 'error': str(e),
                 'data': []
             }
+    
+    async def _aexecute_with_streaming(self, sql: str, context: MCPContext) -> dict:
+        """Executa query com cursor assincrono do asyncpg (batches de batch_size)"""
+        start_time = time.time()
+        collector = self._collector(None)
+        
+        try:
+            async for batch in self._aiter_raw(sql, collector.limit):
+                if collector.spilling:
+                    await asyncio.to_thread(collector.add, batch)
+                else:
+                    collector.add(batch)
+            
+            spill = await asyncio.to_thread(collector.finish) if collector.spilling else None
+            return self._build_result(collector.columns, collector.rows, collector.truncated,
+                                      start_time, spill)
+        
+        except Exception as e:
+            collector.abort()
+            logger.error(f"Async streaming execution failed: {e}")
+            return {
+                'success': False,
+                'error': str(e),
+                'data': []
+            }
+    
+    def _collector(self, max_rows: Optional[int]) -> _ResultCollector:
+        if max_rows is not None:
+            return _ResultCollector(max_rows)
+        return _ResultCollector(self.MAX_ROWS_IN_MEMORY, self.spill_store, self.spill_max_rows)
+    
+    def _build_result(self, columns: Sequence[str], all_rows: list, truncated: bool,
+                      start_time: float, spill: Optional[SpillHandle] = None) -> dict:
+        # Uma passada por coluna: Decimal -> float64 em bloco, sem dict por linha
+        data = ColumnarResult.from_rows(columns, all_rows)
+        
+        execution_time = time.time() - start_time
+        
+        if truncated:
+            logger.warning(f"Results truncated to {spill.row_count if spill else len(all_rows)} rows")
+        
+        result = {
+            'success': True,
+            'data': data,
+            'columns': list(columns),
+            'row_count': len(data),
+            'truncated': truncated,
+            'execution_time': round(execution_time, 3)
+        }
+        
+        if spill is not None:
+            result['spill'] = spill.to_dict()
+            result['row_count'] = spill.row_count
+            logger.info(f"Result spilled to {spill.path}: {spill.row_count} rows, {spill.size_bytes} bytes")
+        
+        return result
+
+
+def _create_query_executor() -> SmartQueryExecutor:
+    from src.config.settings import settings
+    
+    spill_store = None
+    if settings.spill_enabled:
+        try:
+            spill_store = SpillStore(settings.spill_dir, settings.spill_ttl)
+        except ImportError:
+            logger.warning("SPILL_ENABLED requires pyarrow; spill mode disabled")
+    
+    return SmartQueryExecutor(
+        batch_size=settings.executor_batch_size,
+        spill_store=spill_store,
+        spill_max_rows=settings.spill_max_rows,
+    )
 
 
-query_executor = SmartQueryExecutor()
+query_executor = lazy("query_executor", _create_query_executor)
@@ -1,5 +1,4 @@
-from langchain_openai import ChatOpenAI
-from langchain_core.prompts import ChatPromptTemplate  
+from src.config.registry import lazy
 from src.config.settings import settings
 from src.orchestration.mcp_context import MCPContext
 from src.observability.tracer import tracer
@@ -12,10 +11,15 @@ class QueryRouter:
     """AGENTE 0: Roteador inteligente de queries"""
     
     def __init__(self):
+        from langchain_openai import ChatOpenAI
+        from langchain_core.prompts import ChatPromptTemplate
+        from src.memory.llm_cache import get_llm_cache
+        
         self.llm = ChatOpenAI(
             model="gpt-3.5-turbo",
             temperature=0,
-            openai_api_key=settings.openai_api_key
+            openai_api_key=settings.openai_api_key,
+            cache=get_llm_cache("query_router")
         )
         
         self.prompt = ChatPromptTemplate.from_messages([
@@ -39,35 +43,51 @@ class QueryRouter:
             try:
                 chain = self.prompt | self.llm
                 response = chain.invoke({"question": context.original_question})
-                
-                category = response.content.strip().upper()
-                
-                strategies = {
-                    "STRUCTURAL": "schema_only",
-                    "AGGREGATION": "sql_direct",
-                    "SEARCH": "filtered_rag",
-                    "ANALYTICS": "full_pipeline"
-                }
-                
-                strategy = strategies.get(category, "full_pipeline")
-                
-                context.metadata['query_category'] = category
-                context.metadata['routing_strategy'] = strategy
-                
-                tracer.log_interaction("query_router", {
-                    "question": context.original_question,
-                    "category": category,
-                    "strategy": strategy
-                })
-                
-                logger.info(f"Query routed: {category} -> {strategy}")
-                
+                self._apply_strategy(context, response.content)
+            except Exception as e:
+                self._handle_error(context, e)
+        
+        return context
+    
+    async def aroute(self, context: MCPContext) -> MCPContext:
+        """Versão assíncrona de route (usa ainvoke)"""
+        with tracer.start_span("query_router"):
+            try:
+                chain = self.prompt | self.llm
+                response = await chain.ainvoke({"question": context.original_question})
+                self._apply_strategy(context, response.content)
             except Exception as e:
-                logger.error(f"Routing error: {e}")
-                context.metadata['routing_strategy'] = "full_pipeline"
-                tracer.log_error("query_router", e)
+                self._handle_error(context, e)
         
         return context
+    
+    def _apply_strategy(self, context: MCPContext, content: str):
+        category = content.strip().upper()
+        
+        strategies = {
+            "STRUCTURAL": "schema_only",
+            "AGGREGATION": "sql_direct",
+            "SEARCH": "filtered_rag",
+            "ANALYTICS": "full_pipeline"
+        }
+        
+        strategy = strategies.get(category, "full_pipeline")
+        
+        context.metadata['query_category'] = category
+        context.metadata['routing_strategy'] = strategy
+        
+        tracer.log_interaction("query_router", {
+            "question": context.original_question,
+            "category": category,
+            "strategy": strategy
+        })
+        
+        logger.info(f"Query routed: {category} -> {strategy}")
+    
+    def _handle_error(self, context: MCPContext, error: Exception):
+        logger.error(f"Routing error: {error}")
+        context.metadata['routing_strategy'] = "full_pipeline"
+        tracer.log_error("query_router", error)
 
 
-query_router = QueryRouter()
+query_router = lazy("query_router", QueryRouter)
@@ -1,20 +1,30 @@
-from langchain_openai import ChatOpenAI
-from langchain.prompts import ChatPromptTemplate
+from src.config.registry import lazy
 from src.config.settings import settings
+from src.database.columnar import to_json
+from src.memory.result_spill import SpillHandle
 from src.orchestration.mcp_context import MCPContext
 from src.observability.tracer import tracer
 import logging
-import json
 
 logger = logging.getLogger(__name__)
 
 
 class ResponseFormatter:
+    # Resultados escalares de agregações simples (sql_direct) são formatados
+    # por template, sem LLM e sem necessidade de auditoria de evidências
+    TEMPLATE_STRATEGIES = {'sql_direct'}
+    TEMPLATE_MAX_COLUMNS = 3
+    
     def __init__(self):
+        from langchain_openai import ChatOpenAI
+        from langchain.prompts import ChatPromptTemplate
+        from src.memory.llm_cache import get_llm_cache
+        
         self.llm = ChatOpenAI(
             model=settings.model_name,
             temperature=0.3,
-            openai_api_key=settings.openai_api_key
+            openai_api_key=settings.openai_api_key,
+            cache=get_llm_cache("response_formatter")
         )
         
         self.prompt = ChatPromptTemplate.from_messages([
@@ -48,40 +58,110 @@ class ResponseFormatter:
                     context.formatted_response = self._format_error_response(context)
                     return context
                 
-                logger.info("Formatting response")
+                if self._format_with_template(context):
+                    return context
                 
-                results_str = json.dumps(context.execution_result.get('data', []), indent=2, ensure_ascii=False)
+                logger.info("Formatting response")
                 
                 chain = self.prompt | self.llm
-                response = chain.invoke({
-                    "question": context.original_question,
-                    "sql": context.generated_sql,
-                    "results": results_str
-                })
-                
-                formatted_response = response.content.strip()
-                
-                if context.execution_result.get('truncated'):
-                    formatted_response += f"\n\nNota: Resultados limitados a {len(context.execution_result['data'])} registros."
-                
-                context.formatted_response = formatted_response
+                response = chain.invoke(self._build_inputs(context))
+                self._apply_response(context, response.content)
+            
+            except Exception as e:
+                self._handle_error(context, e)
+        
+        return context
+    
+    async def aformat(self, context: MCPContext) -> MCPContext:
+        """Versao assincrona de format (usa astream)"""
+        with tracer.start_span("response_formatter"):
+            try:
+                if not context.execution_result or not context.execution_result.get('success'):
+                    context.formatted_response = self._format_error_response(context)
+                    return context
                 
-                tracer.log_interaction("response_formatter", {
-                    "question": context.original_question,
-                    "formatted_response_length": len(formatted_response)
-                })
+                if self._format_with_template(context):
+                    return context
                 
-                logger.info("Response formatted successfully")
+                logger.info("Formatting response")
                 
+                chain = self.prompt | self.llm
+                chunks = []
+                async for chunk in chain.astream(self._build_inputs(context)):
+                    chunks.append(chunk.content)
+                self._apply_response(context, "".join(chunks))
+            
             except Exception as e:
-                error_msg = f"Response formatting failed: {str(e)}"
-                logger.error(error_msg)
-                context.add_error("response_formatter", error_msg)
-                context.formatted_response = self._format_error_response(context)
-                tracer.log_error("response_formatter", e)
+                self._handle_error(context, e)
         
         return context
     
+    def _format_with_template(self, context: MCPContext) -> bool:
+        """Formata resultado de uma linha (ex: COUNT/SUM) sem chamar o LLM"""
+        if context.metadata.get('routing_strategy') not in self.TEMPLATE_STRATEGIES:
+            return False
+        
+        data = context.execution_result.get('data', [])
+        if len(data) != 1 or not data[0] or len(data[0]) > self.TEMPLATE_MAX_COLUMNS:
+            return False
+        
+        lines = []
+        for column, value in data[0].items():
+            label = str(column).replace('_', ' ').capitalize()
+            if isinstance(value, float):
+                value = f"{value:,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.')
+            lines.append(f"{label}: {value}")
+        
+        context.formatted_response = "\n".join(lines)
+        context.metadata['response_template'] = True
+        
+        tracer.log_interaction("response_formatter", {
+            "question": context.original_question,
+            "template": True
+        })
+        
+        logger.info("Response formatted by template (no LLM call)")
+        return True
+    
+    def _build_inputs(self, context: MCPContext) -> dict:
+        results_str = to_json(context.execution_result.get('data', []))
+        return {
+            "question": context.original_question,
+            "sql": context.generated_sql,
+            "results": results_str
+        }
+    
+    def _apply_response(self, context: MCPContext, content: str):
+        formatted_response = content.strip()
+        
+        if context.execution_result.get('truncated'):
+            formatted_response += f"\n\nNota: Resultados limitados a {len(context.execution_result['data'])} registros."
+            if context.execution_result.get('next_page'):
+                formatted_response += " Os próximos podem ser buscados com o token next_page, sem refazer a pergunta."
+        
+        spill = context.execution_result.get('spill')
+        if spill:
+            # Só o id do spill: o caminho é detalhe do servidor e a resposta fica no cache
+            handle = SpillHandle.from_dict(spill)
+            formatted_response += (f"\n\nNota: Exibindo os primeiros {len(context.execution_result['data'])} "
+                                   f"de {handle.row_count} registros (resultado completo: spill {handle.spill_id}).")
+        
+        context.formatted_response = formatted_response
+        
+        tracer.log_interaction("response_formatter", {
+            "question": context.original_question,
+            "formatted_response_length": len(formatted_response)
+        })
+        
+        logger.info("Response formatted successfully")
+    
+    def _handle_error(self, context: MCPContext, error: Exception):
+        error_msg = f"Response formatting failed: {str(error)}"
+        logger.error(error_msg)
+        context.add_error("response_formatter", error_msg)
+        context.formatted_response = self._format_error_response(context)
+        tracer.log_error("response_formatter", error)
+    
     def _format_error_response(self, context: MCPContext) -> str:
         error_messages = [error['error'] for error in context.errors]
         
@@ -96,4 +176,4 @@ class ResponseFormatter:
         return response
 
 
-response_formatter = ResponseFormatter()
\ No newline at end of file
+response_formatter = lazy("response_formatter", ResponseFormatter)
\ No newline at end of file
@@ -1,13 +1,15 @@
-from typing import List, Dict, Optional
-from langchain_community.vectorstores import FAISS
-from langchain_openai import OpenAIEmbeddings
-from langchain.docstore.document import Document
+from typing import TYPE_CHECKING, List, Dict, Optional
+from src.config.registry import lazy
 from src.config.settings import settings
+from src.database.schema_catalog import schema_catalog
 from src.orchestration.mcp_context import MCPContext
 from src.observability.tracer import tracer
 import logging
 import json
 
+if TYPE_CHECKING:
+    from langchain.docstore.document import Document
+
 logger = logging.getLogger(__name__)
 
 
@@ -20,32 +22,13 @@ class MultiLayerSchemaRetriever:
     """
     
     def __init__(self):
+        from langchain_openai import OpenAIEmbeddings
+        
         self.embeddings = OpenAIEmbeddings(openai_api_key=settings.openai_api_key)
         self.vectorstore = None
         
-        # LAYER 1: Metadados (lightweight, sempre disponível)
-        self.metadata = {
-            "clientes": {
-                "count": 5,
-                "size_mb": 1,
-                "has_index": True,
-                "indexed_columns": ["id", "email"],
-                "date_range": "2020-2025"
-            },
-            "transacoes": {
-                "count": 10,
-                "size_mb": 2,
-                "has_index": True,
-                "indexed_columns": ["cliente_id", "produto_id", "data_transacao"],
-                "date_range": "2020-2025"
-            },
-            "produtos": {
-                "count": 6,
-                "size_mb": 0.1,
-                "has_index": True,
-                "indexed_columns": ["id", "categoria"]
-            }
-        }
+        # LAYER 1: Metadados vêm do catálogo vivo do PostgreSQL
+        self.catalog = schema_catalog
         
         # LAYER 3: Estatísticas pré-computadas
         self.query_statistics = {
@@ -66,14 +49,25 @@ class MultiLayerSchemaRetriever:
         
         self._init_vectorstore()
     
+    @property
+    def metadata(self) -> Dict:
+        """LAYER 1: tabelas, cardinalidade, colunas, índices e FKs"""
+        return self.catalog.table_metadata()
+    
     def _init_vectorstore(self):
         """LAYER 2: Schema documents (FAISS)"""
+        from src.rag.index_store import load_or_build_index
+        
         schema_docs = self._create_schema_documents()
-        self.vectorstore = FAISS.from_documents(schema_docs, self.embeddings)
+        self.vectorstore = load_or_build_index(
+            schema_docs, self.embeddings, settings.schema_index_dir, "agent_schema"
+        )
         logger.info("Multi-layer schema retriever initialized")
     
-    def _create_schema_documents(self) -> List[Document]:
+    def _create_schema_documents(self) -> List["Document"]:
         """Documentos com descrições detalhadas - SCHEMA CORRETO"""
+        from langchain.docstore.document import Document
+        
         documents = [
             Document(
                 page_content="""
@@ -287,7 +281,8 @@ class MultiLayerSchemaRetriever:
         if not relevant_tables:
             return self.metadata
         
-        return {table: self.metadata[table] for table in relevant_tables if table in self.metadata}
+        metadata = self.metadata
+        return {table: metadata[table] for table in relevant_tables if table in metadata}
     
     def _get_relevant_statistics(self, question: str) -> str:
         """Retorna estatísticas relevantes"""
@@ -296,4 +291,4 @@ class MultiLayerSchemaRetriever:
         return "\n\n".join(stats)
 
 
-schema_retriever = MultiLayerSchemaRetriever()
+schema_retriever = lazy("agent_schema_retriever", MultiLayerSchemaRetriever)
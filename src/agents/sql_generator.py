@@ -1,6 +1,6 @@
-from langchain_openai import ChatOpenAI
-from langchain_core.prompts import ChatPromptTemplate
+from src.config.registry import lazy
 from src.config.settings import settings
+from src.database.schema_catalog import schema_catalog
 from src.orchestration.mcp_context import MCPContext
 from src.observability.tracer import tracer
 import logging
@@ -13,12 +13,20 @@ class SQLGenerator:
     """AGENTE 2: Gerador de SQL com schema enforcement"""
     
     def __init__(self):
+        from langchain_openai import ChatOpenAI
+        from langchain_core.prompts import ChatPromptTemplate
+        from src.memory.llm_cache import get_llm_cache
+        
         self.llm = ChatOpenAI(
             model="gpt-4",
             temperature=0,
-            openai_api_key=settings.openai_api_key
+            openai_api_key=settings.openai_api_key,
+            cache=get_llm_cache("sql_generator")
         )
         
+        # Colunas do prompt vêm do catálogo do banco (renderizadas a cada chamada)
+        self.catalog = schema_catalog
+        
         self.prompt = ChatPromptTemplate.from_messages([
             ("system", """Voce e um especialista em PostgreSQL que gera queries SQL PRECISAS.
 
@@ -26,25 +34,7 @@ REGRAS CRITICAS - LEIA COM ATENCAO:
 
 1. NOMES DE COLUNAS EXATOS (copie exatamente como esta aqui):
    
-   Tabela: clientes
-   - id (INTEGER)
-   - nome (VARCHAR)
-   - email (VARCHAR)
-   - created_at (TIMESTAMP)
-   
-   Tabela: produtos
-   - id (INTEGER)
-   - nome (VARCHAR)
-   - preco (DECIMAL)
-   - categoria (VARCHAR)
-   
-   Tabela: transacoes
-   - id (INTEGER)
-   - cliente_id (INTEGER)
-   - produto_id (INTEGER)
-   - quantidade (INTEGER)
-   - valor_total (DECIMAL) ATENCAO: E "valor_total", NAO "valor"!
-   - data_transacao (TIMESTAMP)
+{table_columns}
 
 2. NUNCA invente nomes de colunas!
 3. Se precisar somar valores de transacoes, use: SUM(transacoes.valor_total)
@@ -99,36 +89,60 @@ LEMBRE-SE: a coluna de valor na tabela transacoes e "valor_total"!
                 logger.info("Generating SQL query")
                 
                 chain = self.prompt | self.llm
-                response = chain.invoke({
-                    "question": context.original_question,
-                    "schema_context": context.schema_context or "",
-                    "parsed_intent": str(context.parsed_intent) if context.parsed_intent else ""
-                })
-                
-                sql_query = self._extract_sql(response.content)
-                
-                # CORRECAO AUTOMATICA: Substitui nomes de colunas errados
-                sql_query = self._fix_column_names(sql_query)
+                response = chain.invoke(self._build_inputs(context))
+                self._apply_sql(context, response.content)
                 
-                context.generated_sql = sql_query
-                context.metadata['sql_generation_method'] = 'gpt4_with_schema_enforcement'
-                
-                tracer.log_interaction("sql_generator", {
-                    "question": context.original_question,
-                    "generated_sql": sql_query
-                })
+            except Exception as e:
+                self._handle_error(context, e)
+        
+        return context
+    
+    async def agenerate(self, context: MCPContext) -> MCPContext:
+        """Versao assincrona de generate (usa ainvoke)"""
+        with tracer.start_span("sql_generator"):
+            try:
+                logger.info("Generating SQL query")
                 
-                logger.info(f"Generated SQL: {sql_query}")
+                chain = self.prompt | self.llm
+                response = await chain.ainvoke(self._build_inputs(context))
+                self._apply_sql(context, response.content)
                 
             except Exception as e:
-                error_msg = f"SQL generation failed: {str(e)}"
-                logger.error(error_msg)
-                context.add_error("sql_generator", error_msg)
-                context.generated_sql = None
-                tracer.log_error("sql_generator", e)
+                self._handle_error(context, e)
         
         return context
     
+    def _build_inputs(self, context: MCPContext) -> dict:
+        return {
+            "question": context.original_question,
+            "schema_context": context.schema_context or "",
+            "table_columns": self.catalog.describe_columns(),
+            "parsed_intent": str(context.parsed_intent) if context.parsed_intent else ""
+        }
+    
+    def _apply_sql(self, context: MCPContext, content: str):
+        sql_query = self._extract_sql(content)
+        
+        # CORRECAO AUTOMATICA: Substitui nomes de colunas errados
+        sql_query = self._fix_column_names(sql_query)
+        
+        context.generated_sql = sql_query
+        context.metadata['sql_generation_method'] = 'gpt4_with_schema_enforcement'
+        
+        tracer.log_interaction("sql_generator", {
+            "question": context.original_question,
+            "generated_sql": sql_query
+        })
+        
+        logger.info(f"Generated SQL: {sql_query}")
+    
+    def _handle_error(self, context: MCPContext, error: Exception):
+        error_msg = f"SQL generation failed: {str(error)}"
+        logger.error(error_msg)
+        context.add_error("sql_generator", error_msg)
+        context.generated_sql = None
+        tracer.log_error("sql_generator", error)
+    
     def _extract_sql(self, response: str) -> str:
         """Extrai SQL da resposta removendo markdown"""
         sql = response.strip()
@@ -174,4 +188,4 @@ LEMBRE-SE: a coluna de valor na tabela transacoes e "valor_total"!
         return sql
 
 
-sql_generator = SQLGenerator()
\ No newline at end of file
+sql_generator = lazy("sql_generator", SQLGenerator)
\ No newline at end of file
@@ -1,10 +1,14 @@
-import sqlparse
-from sqlparse.sql import IdentifierList, Identifier, Where
-from sqlparse.tokens import Keyword, DML
+from typing import Dict, Optional
+from src.config.registry import lazy
+from src.config.settings import settings
+from src.database.column_statistics import ColumnStatistics, column_statistics
+from src.database.query_planner import QueryPlanner, query_planner
+from src.database.schema_catalog import SchemaCatalog, schema_catalog
+from src.database.sql_analysis import QueryAnalysis, analyze
+from src.database.sql_rewriter import QueryRewriter
 from src.orchestration.mcp_context import MCPContext
 from src.observability.tracer import tracer
 import logging
-import re
 
 logger = logging.getLogger(__name__)
 
@@ -13,31 +17,34 @@ class SQLValidatorOptimizer:
     """AGENTE 3 EVOLUÍDO: Validação + Otimização + Estimativa de Custo"""
     
     ALLOWED_OPERATIONS = {'SELECT'}
-    DANGEROUS_PATTERNS = [
-        r'DROP\s+TABLE',
-        r'DELETE\s+FROM',
-        r'TRUNCATE',
-        r'ALTER\s+TABLE',
-        r'CREATE\s+TABLE',
-        r'INSERT\s+INTO',
-        r'UPDATE\s+',
-        r'EXEC',
-        r'EXECUTE',
-        r';.*SELECT',
-        r'--',
-        r'/\*',
-    ]
+    # Keywords fora de literais/comentários que bloqueiam a query
+    FORBIDDEN_KEYWORDS = {'DROP', 'DELETE', 'TRUNCATE', 'ALTER', 'CREATE',
+                          'INSERT', 'UPDATE', 'EXEC', 'EXECUTE'}
     
-    ALLOWED_TABLES = {'clientes', 'produtos', 'transacoes'}
+    MAX_RESULT_SIZE = 10000  # Máximo de linhas permitidas
     
-    # 🆕 Limites por tabela (em produção, use valores reais)
-    TABLE_SIZES = {
-        'clientes': 5,        # Em produção: 3_000_000
-        'transacoes': 10,     # Em produção: 150_000_000
-        'produtos': 6         # Em produção: 25_000
-    }
+    # Linhas lidas (estimadas) -> custo; acima do último limite: very_high
+    COST_LEVELS = ((100, "low"), (10_000, "medium"), (1_000_000, "high"))
     
-    MAX_RESULT_SIZE = 10000  # Máximo de linhas permitidas
+    # Modo EXPLAIN: custo total do planner -> custo
+    PLAN_COST_LEVELS = ((1_000, "low"), (100_000, "medium"), (1_000_000, "high"))
+    LARGE_TABLE_ROWS = 1_000_000  # Seq Scan acima disso gera warning
+    
+    def __init__(self, catalog: Optional[SchemaCatalog] = None,
+                 statistics: Optional[ColumnStatistics] = None,
+                 planner: Optional[QueryPlanner] = None,
+                 rewriter: Optional[QueryRewriter] = None,
+                 use_explain: bool = False, max_plan_cost: Optional[float] = None,
+                 max_result_size: Optional[int] = None):
+        # Tabelas, cardinalidades e índices vêm do catálogo vivo do PostgreSQL
+        self.catalog = catalog or schema_catalog
+        self.statistics = statistics or column_statistics
+        self.planner = planner or query_planner
+        self.use_explain = use_explain
+        self.max_plan_cost = max_plan_cost
+        # Com spill no executor, o teto de linhas sobe para o do arquivo
+        self.max_result_size = max_result_size or self.MAX_RESULT_SIZE
+        self.rewriter = rewriter or QueryRewriter(self.catalog, max_limit=self.max_result_size)
     
     def validate(self, context: MCPContext) -> MCPContext:
         with tracer.start_span("sql_validator_optimizer"):
@@ -55,20 +62,25 @@ class SQLValidatorOptimizer:
                     'optimizations': [],
                     'estimated_cost': 'low',  # 🆕
                     'estimated_rows': 0,       # 🆕
+                    'scanned_rows': 0,
                     'optimized_sql': sql       # 🆕
                 }
                 
+                # Um parse só: todas as regras leem a mesma análise
+                analysis = analyze(sql)
+                
                 # Validações originais
-                validation_result = self._check_dangerous_patterns(sql, validation_result)
-                validation_result = self._check_allowed_operations(sql, validation_result)
-                validation_result = self._check_table_references(sql, validation_result)
-                validation_result = self._check_syntax(sql, validation_result)
+                validation_result = self._check_dangerous_patterns(analysis, validation_result)
+                validation_result = self._check_allowed_operations(analysis, validation_result)
+                validation_result = self._check_table_references(analysis, validation_result)
+                validation_result = self._check_syntax(analysis, validation_result)
                 
                 # 🆕 NOVAS VALIDAÇÕES
-                validation_result = self._estimate_query_cost(sql, validation_result, context)
-                validation_result = self._check_missing_indexes(sql, validation_result)
-                validation_result = self._auto_optimize_query(sql, validation_result)
-                validation_result = self._suggest_optimizations(sql, validation_result)
+                validation_result = self._estimate_query_cost(analysis, validation_result, context)
+                validation_result = self._check_missing_indexes(analysis, validation_result)
+                validation_result = self._auto_optimize_query(sql, analysis, validation_result, context)
+                validation_result = self._apply_query_plan(validation_result)
+                validation_result = self._suggest_optimizations(analysis, validation_result)
                 
                 if validation_result['errors']:
                     validation_result['is_valid'] = False
@@ -91,7 +103,7 @@ class SQLValidatorOptimizer:
                     logger.warning(f"SQL validation failed: {error_msg}")
                 else:
                     logger.info(f"SQL validated (cost: {validation_result['estimated_cost']})")
-                
+            
             except Exception as e:
                 error_msg = f"SQL validation error: {str(e)}"
                 logger.error(error_msg)
@@ -101,160 +113,221 @@ class SQLValidatorOptimizer:
         
         return context
     
-    def _estimate_query_cost(self, sql: str, result: dict, context: MCPContext) -> dict:
-        """🆕 Estima custo e número de linhas da query"""
-        sql_upper = sql.upper()
-        estimated_rows = 0
-        cost = "low"
+    def _estimate_query_cost(self, analysis: QueryAnalysis, result: dict, context: MCPContext) -> dict:
+        """🆕 Estima custo e número de linhas da query (seletividade via pg_stats)"""
+        aliases = self._table_aliases(analysis)
+        tables_in_query = list(dict.fromkeys(aliases.values()))
         
-        # Identifica tabelas envolvidas
-        tables_in_query = []
-        for table in self.ALLOWED_TABLES:
-            if table.upper() in sql_upper:
-                tables_in_query.append(table)
+        # Linhas lidas: cardinalidade real x seletividade dos filtros e JOINs
+        scanned_rows = self._estimate_rows(analysis, aliases) if tables_in_query else 0
         
-        # Estima rows baseado nas tabelas e se tem LIMIT
-        if "LIMIT" in sql_upper:
-            # Extrai valor do LIMIT
-            match = re.search(r'LIMIT\s+(\d+)', sql_upper)
-            if match:
-                estimated_rows = int(match.group(1))
-                cost = "low"
-        else:
-            # Sem LIMIT, estima pelo pior caso
-            if "transacoes" in tables_in_query:
-                estimated_rows = self.TABLE_SIZES['transacoes']
-                cost = "very_high" if estimated_rows > 1000 else "high"
-            elif tables_in_query:
-                estimated_rows = max([self.TABLE_SIZES.get(t, 0) for t in tables_in_query])
-                cost = "medium" if estimated_rows > 100 else "low"
+        # Linhas devolvidas: agregação sem GROUP BY devolve uma linha, leia quanto ler
+        estimated_rows = scanned_rows
+        if analysis.has_aggregate and not analysis.has_group_by:
+            estimated_rows = 1
+        
+        if analysis.limit is not None:
+            estimated_rows = min(analysis.limit, estimated_rows) if tables_in_query else analysis.limit
+            # Sem ordenação/agrupamento/agregação o LIMIT interrompe a varredura
+            if not (analysis.has_order_by or analysis.has_group_by or analysis.has_distinct
+                    or analysis.has_aggregate):
+                scanned_rows = estimated_rows
+        
+        cost = self._cost_level(scanned_rows, self.COST_LEVELS)
         
         # Ajusta custo se tiver JOINs
-        join_count = sql_upper.count("JOIN")
-        if join_count >= 2:
+        if analysis.join_count >= 2:
             cost = "high" if cost == "medium" else cost
         
         result['estimated_rows'] = estimated_rows
+        result['scanned_rows'] = scanned_rows
         result['estimated_cost'] = cost
         
         # ⚠️ Se custo muito alto, adiciona warning
         if cost in ["high", "very_high"]:
-            result['warnings'].append(
-                f"Query pode retornar {estimated_rows} linhas. "
-                f"Considere adicionar LIMIT ou filtros WHERE."
-            )
+            if estimated_rows >= scanned_rows:
+                result['warnings'].append(
+                    f"Query pode retornar {estimated_rows} linhas. "
+                    f"Considere adicionar LIMIT ou filtros WHERE."
+                )
+            else:
+                result['warnings'].append(
+                    f"Query pode ler {scanned_rows} linhas para retornar {estimated_rows}. "
+                    f"Considere filtros WHERE em colunas indexadas."
+                )
         
         return result
     
-    def _check_missing_indexes(self, sql: str, result: dict) -> dict:
-        """🆕 Verifica se a query usa colunas sem índice"""
-        sql_upper = sql.upper()
+    @staticmethod
+    def _cost_level(value: float, levels) -> str:
+        for max_value, level in levels:
+            if value <= max_value:
+                return level
+        return "very_high"
+    
+    def _apply_query_plan(self, result: dict) -> dict:
+        """Modo EXPLAIN: os números do planner decidem custo, warnings e bloqueio
         
-        # Colunas indexadas conhecidas
-        indexed_columns = {
-            'clientes': ['id', 'email'],
-            'produtos': ['id', 'categoria'],
-            'transacoes': ['id', 'cliente_id', 'produto_id', 'data_transacao']
-        }
+        Roda sobre a SQL final (já com LIMIT automático) e só se nada bloqueou antes.
+        """
+        if not self.use_explain or result['errors']:
+            return result
         
-        # Verifica WHERE clauses
-        if "WHERE" in sql_upper:
-            # Extrai colunas do WHERE (simplificado)
-            where_part = sql_upper.split("WHERE")[1].split("GROUP")[0].split("ORDER")[0]
-            
-            # Procura por colunas não indexadas em tabelas grandes
-            if "TRANSACOES" in sql_upper and "TRANSACOES.DATA_TRANSACAO" not in where_part:
+        plan = self.planner.explain(result['optimized_sql'])
+        if plan is None:
+            return result
+        
+        result['plan_cost'] = plan.total_cost
+        result['estimated_rows'] = plan.plan_rows
+        result['estimated_cost'] = self._cost_level(plan.total_cost, self.PLAN_COST_LEVELS)
+        
+        for table, _ in plan.seq_scans:
+            table_rows = self.catalog.row_count(table)
+            if table_rows >= self.LARGE_TABLE_ROWS:
                 result['warnings'].append(
-                    "Query em 'transacoes' sem filtro por data_transacao (coluna indexada). "
-                    "Performance pode ser lenta."
+                    f"Seq Scan em '{table}' (~{table_rows} linhas) segundo o planner. "
+                    f"Filtre por uma coluna indexada."
                 )
         
+        if self.max_plan_cost is not None and plan.total_cost > self.max_plan_cost:
+            result['errors'].append(
+                f"Query bloqueada: custo estimado pelo planner ({plan.total_cost:.0f}) "
+                f"acima do limite ({self.max_plan_cost:.0f})"
+            )
         return result
     
-    def _auto_optimize_query(self, sql: str, result: dict) -> dict:
-        """🆕 Otimiza automaticamente a query"""
-        optimized = sql
-        sql_upper = sql.upper()
+    def _table_aliases(self, analysis: QueryAnalysis) -> Dict[str, str]:
+        """alias (ou o próprio nome) -> tabela, só para as tabelas do catálogo"""
+        known = set(self.catalog.tables())
+        return {alias: table for alias, table in analysis.tables.items() if table in known}
+    
+    def _estimate_rows(self, analysis: QueryAnalysis, aliases: Dict[str, str]) -> int:
+        predicates = self._extract_predicates(analysis, aliases)
+        rows = 1.0
+        for table in dict.fromkeys(aliases.values()):
+            rows *= self.statistics.estimate_rows(table, predicates.get(table, []))
         
-        # 1. Adiciona LIMIT se não tiver e for tabela grande
-        if "LIMIT" not in sql_upper:
-            tables_in_query = [t for t in self.ALLOWED_TABLES if t.upper() in sql_upper]
-            
-            if "transacoes" in tables_in_query:
-                # Tabela gigante - força LIMIT
-                optimized = optimized.rstrip(';') + " LIMIT 100;"
-                result['optimizations'].append("✅ LIMIT 100 adicionado automaticamente (tabela grande)")
-            
-            elif len(tables_in_query) >= 2:
-                # Múltiplas tabelas (JOINs) - adiciona LIMIT moderado
-                optimized = optimized.rstrip(';') + " LIMIT 1000;"
-                result['optimizations'].append("✅ LIMIT 1000 adicionado (query com JOINs)")
+        for join in analysis.joins:
+            left_table, right_table = aliases.get(join.left), aliases.get(join.right)
+            if left_table and right_table and left_table != right_table:
+                rows *= self.statistics.join_selectivity(
+                    left_table, join.left_column, right_table, join.right_column
+                )
+        return int(round(rows))
+    
+    def _extract_predicates(self, analysis: QueryAnalysis, aliases: Dict[str, str]) -> Dict[str, list]:
+        """Filtros simples do WHERE por tabela: (coluna, operador, valor)"""
+        # OR: assumir independência subestimaria; sem filtro a estimativa é conservadora
+        if analysis.or_count:
+            return {}
+        
+        predicates: Dict[str, list] = {}
+        tables = list(dict.fromkeys(aliases.values()))
+        for predicate in analysis.predicates:
+            if predicate.qualifier:
+                table = aliases.get(predicate.qualifier)
+            else:
+                # Coluna sem prefixo: primeira tabela da query que a possui
+                table = next((t for t in tables
+                              if predicate.column in (self.catalog.table(t) or {}).get("columns", [])), None)
+            if table:
+                predicates.setdefault(table, []).append((predicate.column, predicate.op, predicate.value))
+        return predicates
+    
+    def _check_missing_indexes(self, analysis: QueryAnalysis, result: dict) -> dict:
+        """🆕 Verifica se a query usa colunas sem índice"""
+        if not analysis.has_where or 'transacoes' not in analysis.referenced_tables:
+            return result
         
-        # 2. Substitui SELECT * por colunas específicas (se possível detectar contexto)
-        if "SELECT *" in sql_upper and "COUNT" not in sql_upper:
+        # Filtro por data_transacao (com ou sem alias) em tabela grande
+        aliases = self._table_aliases(analysis)
+        filters_by_date = any(
+            p.column == 'data_transacao'
+            and (aliases.get(p.qualifier) if p.qualifier else 'transacoes') == 'transacoes'
+            for p in analysis.predicates
+        )
+        if "data_transacao" in self.catalog.indexed_columns('transacoes') and not filters_by_date:
+            result['warnings'].append(
+                "Query em 'transacoes' sem filtro por data_transacao (coluna indexada). "
+                "Performance pode ser lenta."
+            )
+        
+        return result
+    
+    def _auto_optimize_query(self, sql: str, analysis: QueryAnalysis, result: dict,
+                             context: MCPContext) -> dict:
+        """🆕 Otimiza automaticamente a query (reescritas por regra, ver QueryRewriter)"""
+        result['optimized_sql'] = sql
+        result['rewrites'] = []
+        if result['errors']:
+            return result
+        
+        question = " ".join(
+            [context.original_question or ""]
+            + [str(value) for value in (context.parsed_entities or {}).values()]
+        )
+        rewrite = self.rewriter.rewrite(sql, analysis, question)
+        result['optimizations'].extend(rewrite.optimizations)
+        result['rewrites'] = list(rewrite.applied)
+        result['optimized_sql'] = rewrite.sql
+        
+        # SELECT * que a pergunta não permitiu expandir
+        if analysis.select_star and not analysis.has_aggregate and "select_star" not in rewrite.applied:
             result['warnings'].append(
                 "SELECT * detectado. Considere especificar apenas colunas necessárias."
             )
         
-        result['optimized_sql'] = optimized
         return result
     
     # Métodos originais mantidos...
-    def _check_dangerous_patterns(self, sql: str, result: dict) -> dict:
-        sql_upper = sql.upper()
-        for pattern in self.DANGEROUS_PATTERNS:
-            if re.search(pattern, sql_upper, re.IGNORECASE):
-                result['errors'].append(f"Dangerous pattern detected: {pattern}")
+    def _check_dangerous_patterns(self, analysis: QueryAnalysis, result: dict) -> dict:
+        for keyword in sorted(analysis.keywords & self.FORBIDDEN_KEYWORDS):
+            result['errors'].append(f"Dangerous pattern detected: {keyword}")
+        if analysis.has_comment:
+            result['errors'].append("Dangerous pattern detected: comment")
+        if analysis.statement_count > 1:
+            result['errors'].append("Dangerous pattern detected: multiple statements")
         return result
     
-    def _check_allowed_operations(self, sql: str, result: dict) -> dict:
-        parsed = sqlparse.parse(sql)
-        if not parsed:
+    def _check_allowed_operations(self, analysis: QueryAnalysis, result: dict) -> dict:
+        if not analysis.statement_count:
             result['errors'].append("Failed to parse SQL")
             return result
         
-        for statement in parsed:
-            first_token = statement.token_first(skip_ws=True, skip_cm=True)
-            if first_token and first_token.ttype is DML:
-                operation = first_token.value.upper()
-                if operation not in self.ALLOWED_OPERATIONS:
-                    result['errors'].append(f"Operation not allowed: {operation}")
+        for operation in analysis.operations:
+            # UNKNOWN: sem DML/DDL no início (ex.: EXEC), já coberto pelas keywords
+            if operation != 'UNKNOWN' and operation not in self.ALLOWED_OPERATIONS:
+                result['errors'].append(f"Operation not allowed: {operation}")
         
         return result
     
-    def _check_table_references(self, sql: str, result: dict) -> dict:
-        sql_lower = sql.lower()
-        tokens = sql_lower.split()
-        for i, token in enumerate(tokens):
-            if token in ('from', 'join'):
-                if i + 1 < len(tokens):
-                    table_name = tokens[i + 1].strip('();,')
-                    if table_name not in self.ALLOWED_TABLES and not table_name.startswith(tuple(self.ALLOWED_TABLES)):
-                        result['warnings'].append(f"Unknown table reference: {table_name}")
+    def _check_table_references(self, analysis: QueryAnalysis, result: dict) -> dict:
+        allowed_tables = set(self.catalog.tables())
+        for table_name in analysis.referenced_tables:
+            if table_name not in allowed_tables and table_name not in analysis.ctes:
+                result['warnings'].append(f"Unknown table reference: {table_name}")
         return result
     
-    def _check_syntax(self, sql: str, result: dict) -> dict:
-        try:
-            parsed = sqlparse.parse(sql)
-            if not parsed or len(parsed) == 0:
-                result['errors'].append("Invalid SQL syntax")
-            
-            if sql.count('(') != sql.count(')'):
-                result['errors'].append("Unbalanced parentheses")
-        except Exception as e:
-            result['errors'].append(f"Syntax error: {str(e)}")
+    def _check_syntax(self, analysis: QueryAnalysis, result: dict) -> dict:
+        if not analysis.statement_count:
+            result['errors'].append("Invalid SQL syntax")
+        if not analysis.balanced_parens:
+            result['errors'].append("Unbalanced parentheses")
         return result
     
-    def _suggest_optimizations(self, sql: str, result: dict) -> dict:
-        sql_upper = sql.upper()
-        
-        if 'SELECT *' in sql_upper:
+    def _suggest_optimizations(self, analysis: QueryAnalysis, result: dict) -> dict:
+        rewrites = result.get('rewrites', [])
+        if analysis.select_star and "select_star" not in rewrites:
             result['optimizations'].append("Consider specifying column names instead of SELECT *")
         
-        if re.search(r'WHERE.*OR.*OR', sql_upper):
+        if analysis.or_count >= 2 and "or_to_in" not in rewrites:
             result['optimizations'].append("Multiple OR conditions might benefit from IN clause")
         
         return result
 
 
-sql_validator = SQLValidatorOptimizer()
\ No newline at end of file
+sql_validator = lazy("sql_validator", lambda: SQLValidatorOptimizer(
+    use_explain=settings.explain_cost_enabled,
+    max_plan_cost=settings.explain_max_cost,
+    max_result_size=settings.spill_max_rows if settings.spill_enabled else None,
+))
@@ -1,7 +1,8 @@
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
 from sqlalchemy.pool import QueuePool
-from contextlib import contextmanager
+from contextlib import contextmanager, asynccontextmanager
+from src.config.registry import lazy, registry
 from src.config.settings import settings
 import logging
 
@@ -9,16 +10,27 @@ logger = logging.getLogger(__name__)
 
 Base = declarative_base()
 
-engine = create_engine(
-    settings.database_url,
-    poolclass=QueuePool,
-    pool_size=5,
-    max_overflow=10,
-    pool_pre_ping=True,
-    echo=False
+
+def _create_engine():
+    return create_engine(
+        settings.database_url,
+        poolclass=QueuePool,
+        pool_size=5,
+        max_overflow=10,
+        pool_pre_ping=True,
+        echo=False
+    )
+
+
+# Engine e sessões criadas no primeiro uso (importar o módulo não abre pool)
+engine = lazy("engine", _create_engine)
+
+SessionLocal = lazy(
+    "session_factory",
+    lambda: sessionmaker(autocommit=False, autoflush=False, bind=registry.get("engine"))
 )
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+_async_engine = None
 
 
 @contextmanager
@@ -35,9 +47,38 @@ def get_db_session():
         session.close()
 
 
+def get_async_engine():
+    """Engine assincrona (asyncpg), criada no primeiro uso"""
+    global _async_engine
+    if _async_engine is None:
+        from sqlalchemy.ext.asyncio import create_async_engine
+        
+        async_url = settings.database_url.replace("postgresql://", "postgresql+asyncpg://", 1)
+        _async_engine = create_async_engine(
+            async_url,
+            pool_size=5,
+            max_overflow=10,
+            pool_pre_ping=True,
+            echo=False
+        )
+    return _async_engine
+
+
+@asynccontextmanager
+async def get_async_db_connection():
+    async with get_async_engine().connect() as connection:
+        try:
+            yield connection
+            await connection.commit()
+        except Exception as e:
+            await connection.rollback()
+            logger.error(f"Async database connection error: {e}")
+            raise
+
+
 def init_database():
     try:
-        Base.metadata.create_all(bind=engine)
+        Base.metadata.create_all(bind=registry.get("engine"))
         logger.info("Database initialized successfully")
     except Exception as e:
         logger.error(f"Failed to initialize database: {e}")
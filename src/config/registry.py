@@ -0,0 +1,96 @@
+from typing import Any, Callable, Dict, Iterable, List, Optional
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class LazyProxy:
+    """Substituto de um singleton: constrói o componente no primeiro uso
+    
+    Acesso a atributos, atribuições e chamadas são repassados à instância
+    real, então `query_router.route(...)` continua funcionando igual.
+    """
+    
+    __slots__ = ("_registry", "_name")
+    
+    def __init__(self, registry: "ComponentRegistry", name: str):
+        object.__setattr__(self, "_registry", registry)
+        object.__setattr__(self, "_name", name)
+    
+    def _resolve(self) -> Any:
+        return self._registry.get(self._name)
+    
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(self._resolve(), attr)
+    
+    def __setattr__(self, attr: str, value: Any):
+        setattr(self._resolve(), attr, value)
+    
+    def __call__(self, *args, **kwargs):
+        return self._resolve()(*args, **kwargs)
+    
+    def __repr__(self) -> str:
+        if self._registry.is_initialized(self._name):
+            return repr(self._resolve())
+        return f"<lazy {self._name} (not initialized)>"
+
+
+class ComponentRegistry:
+    """Registro de componentes caros (LLMs, FAISS, engine, workflow...)
+    
+    Cada componente é construído uma única vez, no primeiro acesso, e o
+    tempo de construção fica registrado para o relatório de startup.
+    """
+    
+    def __init__(self):
+        self._factories: Dict[str, Callable[[], Any]] = {}
+        self._instances: Dict[str, Any] = {}
+        self._build_times: Dict[str, float] = {}
+        self._lock = threading.RLock()
+    
+    def register(self, name: str, factory: Callable[[], Any]) -> LazyProxy:
+        with self._lock:
+            self._factories[name] = factory
+        return LazyProxy(self, name)
+    
+    def get(self, name: str) -> Any:
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+        
+        # RLock: uma factory pode depender de outro componente do registro
+        with self._lock:
+            if name not in self._instances:
+                start = time.perf_counter()
+                self._instances[name] = self._factories[name]()
+                self._build_times[name] = time.perf_counter() - start
+                logger.info(f"Initialized {name} in {self._build_times[name] * 1000:.1f} ms")
+            return self._instances[name]
+    
+    def is_initialized(self, name: str) -> bool:
+        return name in self._instances
+    
+    def warmup(self, names: Optional[Iterable[str]] = None):
+        """Constrói os componentes antecipadamente (workers pré-aquecidos)"""
+        for name in names or list(self._factories):
+            self.get(name)
+    
+    def startup_report(self) -> List[Dict[str, Any]]:
+        """Componentes registrados, se já foram construídos e quanto custaram"""
+        return [
+            {
+                "component": name,
+                "initialized": name in self._instances,
+                "build_ms": round(self._build_times.get(name, 0.0) * 1000, 1),
+            }
+            for name in self._factories
+        ]
+
+
+registry = ComponentRegistry()
+
+
+def lazy(name: str, factory: Callable[[], Any]) -> LazyProxy:
+    return registry.register(name, factory)
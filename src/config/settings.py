@@ -1,6 +1,7 @@
 from pydantic_settings import BaseSettings
 from pydantic import Field
 from typing import Optional
+from src.config.registry import lazy
 
 
 class Settings(BaseSettings):
@@ -16,9 +17,41 @@ class Settings(BaseSettings):
     model_name: str = Field(default='gpt-4-turbo-preview')
     temperature: float = Field(default=0.0)
     
+    # Cache de respostas do LLM (formatter fica fora: temperatura 0.3)
+    llm_cache_enabled: bool = Field(default=True, env='LLM_CACHE_ENABLED')
+    llm_cache_agents: str = Field(
+        default='query_router,nlp_parser,sql_generator,evidence_checker',
+        env='LLM_CACHE_AGENTS'
+    )
+    llm_cache_max_entries: int = Field(default=5000, env='LLM_CACHE_MAX_ENTRIES')
+    llm_cache_db_path: str = Field(default='memory.db', env='LLM_CACHE_DB_PATH')
+    
+    # Índice FAISS do schema persistido (chave = hash dos documentos)
+    schema_index_dir: str = Field(default='.schema_index', env='SCHEMA_INDEX_DIR')
+    
+    # Custo pelo planner (EXPLAIN FORMAT JSON) no validator; acima do máximo, bloqueia
+    explain_cost_enabled: bool = Field(default=False, env='EXPLAIN_COST_ENABLED')
+    explain_max_cost: float = Field(default=1_000_000.0, env='EXPLAIN_MAX_COST')
+    
+    # Admissão antes do executor: vagas para queries caras e orçamento por usuário
+    admission_enabled: bool = Field(default=True, env='ADMISSION_ENABLED')
+    admission_max_expensive: int = Field(default=2, env='ADMISSION_MAX_EXPENSIVE')
+    admission_queue_timeout: float = Field(default=10.0, env='ADMISSION_QUEUE_TIMEOUT')
+    admission_user_budget: int = Field(default=300, env='ADMISSION_USER_BUDGET')
+    admission_budget_window: float = Field(default=60.0, env='ADMISSION_BUDGET_WINDOW')
+    
+    # Linhas por round-trip do cursor no servidor (itersize) no executor
+    executor_batch_size: int = Field(default=100, env='EXECUTOR_BATCH_SIZE')
+    
+    # Spill: resultados acima de 1000 linhas vão para arquivo Arrow (requer pyarrow)
+    spill_enabled: bool = Field(default=False, env='SPILL_ENABLED')
+    spill_dir: str = Field(default='.result_spill', env='SPILL_DIR')
+    spill_max_rows: int = Field(default=1_000_000, env='SPILL_MAX_ROWS')
+    spill_ttl: float = Field(default=24 * 3600, env='SPILL_TTL')
+    
     class Config:
         env_file = '.env'
         env_file_encoding = 'utf-8'
 
 
-settings = Settings()
\ No newline at end of file
+settings = lazy("settings", Settings)
@@ -0,0 +1,241 @@
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+from src.database.schema_catalog import SchemaCatalog, schema_catalog as default_schema_catalog
+import threading
+import time
+import bisect
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Defaults do planner do PostgreSQL (selfuncs.h) para colunas sem estatística
+DEFAULT_EQ_SEL = 0.005
+DEFAULT_INEQ_SEL = 1.0 / 3.0
+DEFAULT_MATCH_SEL = 0.005
+
+
+class ColumnStats(NamedTuple):
+    """Resumo de pg_stats de uma coluna (tuplas: compacto e imutável)"""
+    null_frac: float
+    n_distinct: float                # < 0: fração das linhas (-1 = único)
+    most_common_vals: Tuple = ()
+    most_common_freqs: Tuple = ()
+    histogram_bounds: Tuple = ()
+
+
+def _coerce(value):
+    """Números viram float; o resto fica texto (datas ISO comparam na ordem certa)"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    text = str(value).strip("'")
+    try:
+        return float(text)
+    except ValueError:
+        return text
+
+
+def _comparable(a, b) -> bool:
+    return isinstance(a, float) == isinstance(b, float)
+
+
+class ColumnStatistics:
+    """Estatísticas por coluna (pg_stats) e estimativa de seletividade
+    
+    Mesma ideia do planner: valores frequentes (MCV) respondem igualdades,
+    o histograma responde faixas e o resto é dividido igualmente entre os
+    valores distintos. Predicados diferentes são tratados como independentes.
+    Relido a cada REFRESH_INTERVAL segundos (muda com ANALYZE/autovacuum).
+    """
+    
+    REFRESH_INTERVAL = 300.0
+    SCHEMA = "public"
+    
+    STATS_QUERY = '''
+        SELECT tablename, attname, null_frac, n_distinct,
+               most_common_vals::text::text[], most_common_freqs,
+               histogram_bounds::text::text[]
+        FROM pg_stats
+        WHERE schemaname = :schema
+    '''
+    
+    def __init__(self, fetch_fn: Optional[Callable[[], Dict[Tuple[str, str], ColumnStats]]] = None,
+                 catalog: Optional[SchemaCatalog] = None,
+                 refresh_interval: Optional[float] = None):
+        self._fetch_fn = fetch_fn or self._fetch_statistics
+        self.catalog = catalog or default_schema_catalog
+        self.refresh_interval = (
+            refresh_interval if refresh_interval is not None else self.REFRESH_INTERVAL
+        )
+        self._stats: Dict[Tuple[str, str], ColumnStats] = {}
+        self._fetched_at = 0.0
+        self._lock = threading.Lock()
+    
+    def _fetch_statistics(self) -> Dict[Tuple[str, str], ColumnStats]:
+        from sqlalchemy import text
+        from src.config.database import get_db_session
+        
+        with get_db_session() as session:
+            rows = session.execute(text(self.STATS_QUERY), {"schema": self.SCHEMA}).fetchall()
+        return {
+            (table, column): ColumnStats(
+                null_frac=float(null_frac or 0.0),
+                n_distinct=float(n_distinct or 0.0),
+                most_common_vals=tuple(_coerce(v) for v in (mcv or ())),
+                most_common_freqs=tuple(float(f) for f in (mcf or ())),
+                histogram_bounds=tuple(_coerce(v) for v in (bounds or ())),
+            )
+            for table, column, null_frac, n_distinct, mcv, mcf, bounds in rows
+        }
+    
+    def snapshot(self) -> Dict[Tuple[str, str], ColumnStats]:
+        with self._lock:
+            if time.monotonic() - self._fetched_at >= self.refresh_interval:
+                try:
+                    self._stats = self._fetch_fn() or self._stats
+                except Exception as e:
+                    logger.warning(f"Column statistics refresh failed: {e}")
+                self._fetched_at = time.monotonic()
+            return self._stats
+    
+    def refresh(self):
+        with self._lock:
+            self._fetched_at = 0.0
+    
+    def get(self, table: str, column: str) -> Optional[ColumnStats]:
+        return self.snapshot().get((table, column))
+    
+    def distinct_values(self, table: str, column: str) -> Optional[float]:
+        """Número de valores distintos (n_distinct negativo é relativo ao total de linhas)
+        
+        Sem pg_stats, uma coluna única no catálogo (PK/UNIQUE) tem um valor por linha.
+        """
+        stats = self.get(table, column)
+        if stats is None or stats.n_distinct == 0:
+            if column in self.catalog.unique_columns(table):
+                return max(float(self.catalog.row_count(table)), 1.0)
+            return None
+        if stats.n_distinct > 0:
+            return stats.n_distinct
+        return max(-stats.n_distinct * self.catalog.row_count(table), 1.0)
+    
+    def selectivity(self, table: str, column: str, op: str, value=None) -> float:
+        """Fração das linhas que satisfaz `column <op> value`
+        
+        op: =, <>, !=, <, <=, >, >=, IN (value = lista), BETWEEN (value = par),
+        IS NULL, IS NOT NULL, LIKE/ILIKE.
+        """
+        op = op.upper()
+        stats = self.get(table, column)
+        
+        if op == "IS NULL":
+            return stats.null_frac if stats else DEFAULT_EQ_SEL
+        if op == "IS NOT NULL":
+            return 1.0 - stats.null_frac if stats else 1.0 - DEFAULT_EQ_SEL
+        if op in ("LIKE", "ILIKE"):
+            return DEFAULT_MATCH_SEL
+        if op == "IN":
+            return min(sum(self.selectivity(table, column, "=", v) for v in value), 1.0)
+        if op in ("<>", "!="):
+            return max(1.0 - self.selectivity(table, column, "=", value)
+                       - (stats.null_frac if stats else 0.0), 0.0)
+        if op == "BETWEEN":
+            low, high = value
+            return max(self.selectivity(table, column, "<=", high)
+                       - self.selectivity(table, column, "<", low), 0.0)
+        if stats is None:
+            if op != "=":
+                return DEFAULT_INEQ_SEL
+            distinct = self.distinct_values(table, column)
+            return 1.0 / distinct if distinct else DEFAULT_EQ_SEL
+        if op == "=":
+            return self._eq_selectivity(table, column, stats, _coerce(value))
+        if op in ("<", "<=", ">", ">="):
+            below = self._fraction_below(stats, _coerce(value), inclusive=op in ("<=", ">"))
+            return below if op in ("<", "<=") else max(1.0 - stats.null_frac - below, 0.0)
+        return DEFAULT_INEQ_SEL
+    
+    def _eq_selectivity(self, table: str, column: str, stats: ColumnStats, value) -> float:
+        for mcv, freq in zip(stats.most_common_vals, stats.most_common_freqs):
+            if mcv == value:
+                return freq
+        
+        # Fora da lista de frequentes: divide o restante entre os demais distintos
+        remaining = 1.0 - stats.null_frac - sum(stats.most_common_freqs)
+        distinct = self.distinct_values(table, column)
+        if distinct is None:
+            return DEFAULT_EQ_SEL
+        others = max(distinct - len(stats.most_common_vals), 1.0)
+        return min(max(remaining, 0.0) / others, 1.0)
+    
+    def _fraction_below(self, stats: ColumnStats, value, inclusive: bool) -> float:
+        """Fração das linhas com valor abaixo de `value` (MCV + histograma)"""
+        mcv_fraction = sum(
+            freq for mcv, freq in zip(stats.most_common_vals, stats.most_common_freqs)
+            if _comparable(mcv, value) and (mcv < value or (inclusive and mcv == value))
+        )
+        histogram_share = max(1.0 - stats.null_frac - sum(stats.most_common_freqs), 0.0)
+        bounds = [b for b in stats.histogram_bounds if _comparable(b, value)]
+        
+        if len(bounds) < 2:
+            return min(mcv_fraction + histogram_share * DEFAULT_INEQ_SEL, 1.0)
+        return min(mcv_fraction + histogram_share * self._histogram_fraction(bounds, value), 1.0)
+    
+    @staticmethod
+    def _histogram_fraction(bounds: Sequence, value) -> float:
+        """Posição do valor no histograma equi-depth (interpola dentro do bucket)"""
+        if value <= bounds[0]:
+            return 0.0
+        if value >= bounds[-1]:
+            return 1.0
+        
+        bucket = bisect.bisect_right(bounds, value) - 1
+        low, high = bounds[bucket], bounds[bucket + 1]
+        within = 0.0 if value == low else 0.5
+        if isinstance(value, float) and high > low:
+            within = (value - low) / (high - low)
+        return (bucket + within) / (len(bounds) - 1)
+    
+    def join_selectivity(self, left_table: str, left_column: str,
+                         right_table: str, right_column: str) -> float:
+        """Equi-join: 1 / max(distintos de cada lado)
+        
+        Sem estatística dos dois lados, um join por FK usa as linhas da tabela
+        referenciada (cada linha do lado da FK casa com no máximo uma).
+        """
+        left = self.distinct_values(left_table, left_column)
+        right = self.distinct_values(right_table, right_column)
+        distinct = max(left or 0.0, right or 0.0)
+        if not distinct:
+            distinct = self._referenced_rows(left_table, left_column, right_table, right_column)
+        return 1.0 / distinct if distinct else DEFAULT_EQ_SEL
+    
+    def _referenced_rows(self, left_table: str, left_column: str,
+                         right_table: str, right_column: str) -> float:
+        if self.catalog.references(left_table, left_column) == (right_table, right_column):
+            return float(self.catalog.row_count(right_table))
+        if self.catalog.references(right_table, right_column) == (left_table, left_column):
+            return float(self.catalog.row_count(left_table))
+        return 0.0
+    
+    def estimate_rows(self, table: str, predicates: List[Tuple[str, str, object]]) -> int:
+        """Linhas de `table` que passam pelos predicados (coluna, op, valor)"""
+        rows = float(self.catalog.row_count(table))
+        for column, op, value in predicates:
+            rows *= self.selectivity(table, column, op, value)
+        return int(round(rows))
+    
+    def describe(self, tables: List[str]) -> str:
+        """Resumo para a Layer 3 do retriever (distintos, nulos e valores frequentes)"""
+        lines = []
+        for (table, column), stats in sorted(self.snapshot().items()):
+            if table not in tables:
+                continue
+            distinct = self.distinct_values(table, column)
+            line = f"{table}.{column}: ~{int(distinct or 0)} distintos, {stats.null_frac:.0%} nulos"
+            if stats.most_common_vals:
+                top = ", ".join(str(v) for v in stats.most_common_vals[:3])
+                line += f", mais comuns: {top}"
+            lines.append(line)
+        return "\n".join(lines)
+
+
+column_statistics = ColumnStatistics()
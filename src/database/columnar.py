@@ -0,0 +1,138 @@
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+import numpy as np
+from decimal import Decimal
+import datetime
+import json
+
+
+class ColumnarResult:
+    """Resultado de query em colunas: nomes uma vez, um array NumPy por coluna
+    
+    Colunas numéricas viram int64/float64 (Decimal convertido de uma vez pelo
+    NumPy); NULL em coluna float fica como NaN + máscara. O resto vira array
+    de objetos. Fatias (result[a:b]) são views, sem cópia. Para quem espera a
+    lista de dicionários, result[i] e a iteração montam cada linha sob demanda.
+    """
+    
+    def __init__(self, columns: Sequence[str], arrays: List[np.ndarray],
+                 nulls: Optional[Dict[int, np.ndarray]] = None):
+        self.columns = tuple(columns)
+        self._arrays = arrays
+        self._nulls = nulls or {}   # índice da coluna -> máscara de NULL (só float)
+    
+    @classmethod
+    def from_rows(cls, columns: Sequence[str], rows: Sequence[tuple]) -> "ColumnarResult":
+        arrays, nulls = [], {}
+        values_by_column = list(zip(*rows)) if rows else [()] * len(columns)
+        
+        for index, values in enumerate(values_by_column):
+            array, mask = _column_array(values)
+            arrays.append(array)
+            if mask is not None:
+                nulls[index] = mask
+        
+        return cls(columns, arrays, nulls)
+    
+    @classmethod
+    def from_records(cls, records: Sequence[Dict[str, Any]]) -> "ColumnarResult":
+        """Lista de dicionários (ex.: resultado lido do cache) -> colunas"""
+        if isinstance(records, ColumnarResult):
+            return records
+        columns = list(records[0].keys()) if records else []
+        return cls.from_rows(columns, [tuple(r.get(c) for c in columns) for r in records])
+    
+    def __len__(self) -> int:
+        return len(self._arrays[0]) if self._arrays else 0
+    
+    def __getitem__(self, key: Union[int, slice]) -> Union[Dict[str, Any], "ColumnarResult"]:
+        if isinstance(key, slice):
+            return ColumnarResult(
+                self.columns,
+                [array[key] for array in self._arrays],
+                {i: mask[key] for i, mask in self._nulls.items()},
+            )
+        
+        index = range(len(self))[key]
+        return {
+            name: self._value(i, index) for i, name in enumerate(self.columns)
+        }
+    
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for values in self.rows():
+            yield dict(zip(self.columns, values))
+    
+    def __repr__(self) -> str:
+        return f"ColumnarResult(columns={list(self.columns)}, rows={len(self)})"
+    
+    def column(self, name: str) -> np.ndarray:
+        """Array da coluna (view; NULL de float aparece como NaN)"""
+        return self._arrays[self.columns.index(name)]
+    
+    def rows(self) -> Iterator[tuple]:
+        return zip(*self._lists())
+    
+    def to_records(self) -> List[Dict[str, Any]]:
+        columns = self.columns
+        return [dict(zip(columns, values)) for values in zip(*self._lists())]
+    
+    @property
+    def nbytes(self) -> int:
+        """Bytes dos arrays (objetos Python de colunas object não entram)"""
+        return sum(a.nbytes for a in self._arrays) + sum(m.nbytes for m in self._nulls.values())
+    
+    def _value(self, column: int, index: int) -> Any:
+        mask = self._nulls.get(column)
+        if mask is not None and mask[index]:
+            return None
+        value = self._arrays[column][index]
+        return value.item() if isinstance(value, np.generic) else value
+    
+    def _lists(self) -> List[list]:
+        """Colunas como listas Python (tolist converte o array inteiro de uma vez)"""
+        lists = [array.tolist() for array in self._arrays]
+        for i, mask in self._nulls.items():
+            column = lists[i]
+            for index in np.flatnonzero(mask).tolist():
+                column[index] = None
+        return lists
+
+
+def _column_array(values: Tuple[Any, ...]) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    sample = next((v for v in values if v is not None), None)
+    has_nulls = any(v is None for v in values)
+    
+    if isinstance(sample, (float, Decimal)) and not isinstance(sample, bool):
+        try:
+            if not has_nulls:
+                return np.array(values, dtype=np.float64), None
+            mask = np.fromiter((v is None for v in values), dtype=bool, count=len(values))
+            return np.array([np.nan if v is None else v for v in values], dtype=np.float64), mask
+        except (TypeError, ValueError):
+            pass
+    elif isinstance(sample, int) and not isinstance(sample, bool) and not has_nulls:
+        try:
+            return np.array(values, dtype=np.int64), None
+        except (TypeError, ValueError, OverflowError):
+            pass
+    
+    # Texto, datas, inteiros com NULL, tipos mistos: array de objetos
+    array = np.empty(len(values), dtype=object)
+    array[:] = values
+    return array, None
+
+
+def json_default(obj: Any) -> Any:
+    """default= do json.dumps para ColumnarResult (e Decimal/datas avulsos)"""
+    if isinstance(obj, ColumnarResult):
+        return obj.to_records()
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, (datetime.date, datetime.time)):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def to_json(data: Any, **kwargs) -> str:
+    """json.dumps que aceita ColumnarResult em qualquer ponto da estrutura"""
+    kwargs.setdefault('ensure_ascii', False)
+    return json.dumps(data, default=json_default, **kwargs)
@@ -0,0 +1,94 @@
+from typing import Callable, Dict, List, Optional
+from src.database.sql_analysis import analyze
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def extract_tables(sql: str) -> List[str]:
+    """Tabelas lidas pela query (FROM/JOIN, inclusive join por vírgula), sem CTEs"""
+    analysis = analyze(sql or "")
+    return [t for t in analysis.referenced_tables if t not in analysis.ctes]
+
+
+class DataVersionTracker:
+    """Marca d'água de dados por tabela do PostgreSQL
+    
+    A versão de uma tabela é n_tup_ins + n_tup_upd + n_tup_del de
+    pg_stat_user_tables: muda a cada escrita, sem trigger nem varredura.
+    Um único SELECT traz todas as tabelas e o snapshot é reaproveitado por
+    REFRESH_INTERVAL segundos (é esse o atraso máximo da invalidação).
+    """
+    
+    REFRESH_INTERVAL = 5.0
+    
+    VERSION_QUERY = '''
+        SELECT relname, n_tup_ins + n_tup_upd + n_tup_del
+        FROM pg_stat_user_tables
+    '''
+    
+    def __init__(self, fetch_fn: Optional[Callable[[], Dict[str, int]]] = None,
+                 refresh_interval: Optional[float] = None):
+        self._fetch_fn = fetch_fn or self._fetch_versions
+        self.refresh_interval = (
+            refresh_interval if refresh_interval is not None else self.REFRESH_INTERVAL
+        )
+        self._snapshot: Optional[Dict[str, int]] = None
+        self._fetched_at = 0.0
+        self._lock = threading.Lock()
+    
+    def _fetch_versions(self) -> Dict[str, int]:
+        from sqlalchemy import text
+        from src.config.database import get_db_session
+        
+        with get_db_session() as session:
+            rows = session.execute(text(self.VERSION_QUERY)).fetchall()
+        return {name: int(version or 0) for name, version in rows}
+    
+    def snapshot(self) -> Optional[Dict[str, int]]:
+        """Versões de todas as tabelas (None se o banco estiver indisponível)"""
+        with self._lock:
+            if time.monotonic() - self._fetched_at < self.refresh_interval:
+                return self._snapshot
+            
+            try:
+                self._snapshot = self._fetch_fn()
+            except Exception as e:
+                logger.warning(f"Data version refresh failed: {e}")
+                self._snapshot = None
+            # Falhas também respeitam o intervalo (não martela o banco)
+            self._fetched_at = time.monotonic()
+            return self._snapshot
+    
+    def refresh(self):
+        """Descarta o snapshot (ex.: logo após uma escrita conhecida)"""
+        with self._lock:
+            self._fetched_at = 0.0
+    
+    def versions_for(self, sql: str) -> Dict[str, int]:
+        """Versões atuais das tabelas que a query lê (ignora CTEs/desconhecidas)"""
+        snapshot = self.snapshot()
+        if not snapshot:
+            return {}
+        return {
+            table: snapshot[table]
+            for table in extract_tables(sql)
+            if table in snapshot
+        }
+    
+    def changed_tables(self, tagged: Dict[str, int]) -> List[str]:
+        """Tabelas cuja versão mudou desde a marcação (vazio se não der para saber)"""
+        if not tagged:
+            return []
+        snapshot = self.snapshot()
+        if not snapshot:
+            return []
+        return [
+            table for table, version in tagged.items()
+            if snapshot.get(table) != version
+        ]
+
+
+data_versions = DataVersionTracker()
@@ -0,0 +1,149 @@
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+from src.database.schema_catalog import SchemaCatalog
+from src.database.sql_analysis import analyze, clause_of, column_ref, meaningful_tokens
+import sqlparse
+from sqlparse.sql import Identifier, IdentifierList
+from sqlparse.tokens import Name
+import base64
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class KeysetPlan(NamedTuple):
+    """Como paginar uma SQL por keyset (colunas de saída que formam chave única)"""
+    base_sql: str               # SQL sem ORDER BY/LIMIT externos
+    keys: Tuple[str, ...]       # colunas do resultado, na ordem da paginação
+    descending: bool
+    limit: Optional[int]        # LIMIT original: total de linhas que as páginas cobrem
+    ordered: bool               # a SQL original já ordenava pela chave completa
+    
+    def to_dict(self) -> dict:
+        return self._asdict()
+    
+    @classmethod
+    def from_dict(cls, data: dict) -> "KeysetPlan":
+        return cls(data['base_sql'], tuple(data['keys']), data['descending'],
+                   data.get('limit'), data.get('ordered', True))
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _order_items(token, columns: Sequence[str]) -> Optional[List[Tuple[str, bool]]]:
+    """(coluna do resultado, desc) de cada item do ORDER BY
+    
+    None se algum item for expressão, posição (ORDER BY 1) ou tiver NULLS FIRST/LAST.
+    """
+    by_name = {c.lower(): c for c in columns}
+    items = token.get_identifiers() if isinstance(token, IdentifierList) else [token]
+    order = []
+    
+    for item in items:
+        if item.ttype in Name:
+            ref, descending = (None, item.value.lower()), False
+        elif isinstance(item, Identifier):
+            ref, descending = column_ref(item), item.get_ordering() == "DESC"
+            if any(t.normalized.startswith("NULLS") for t in item.tokens if t.is_keyword):
+                return None
+        else:
+            return None
+        
+        if ref is None or ref[1] not in by_name:
+            return None
+        order.append((by_name[ref[1]], descending))
+    
+    return order
+
+
+def plan_keyset(sql: str, columns: Sequence[str], catalog: SchemaCatalog) -> Optional[KeysetPlan]:
+    """Plano de keyset para a SQL executada, ou None se não houver chave confiável
+    
+    A chave é o ORDER BY externo (só colunas do resultado, mesma direção)
+    completado com a PK da tabela. Só vale para SELECT de uma tabela sem
+    GROUP BY/DISTINCT/agregação, com a PK no resultado: sem isso a chave não
+    é única e páginas repetiriam ou pulariam linhas.
+    """
+    analysis = analyze(sql)
+    if analysis.statement_count != 1 or analysis.operations != ["SELECT"]:
+        return None
+    if analysis.has_group_by or analysis.has_distinct or analysis.has_aggregate \
+            or analysis.has_set_operation or len(analysis.referenced_tables) != 1:
+        return None
+    
+    table = catalog.table(analysis.referenced_tables[0])
+    primary_key = (table or {}).get("primary_key", [])
+    by_name = {c.lower(): c for c in columns}
+    if not primary_key or any(pk not in by_name for pk in primary_key):
+        return None
+    
+    statement = sqlparse.parse(sql)[0]
+    tokens = meaningful_tokens(statement)
+    cut, order = len(tokens), []
+    
+    for index, token in enumerate(tokens):
+        clause = clause_of(token)
+        if clause == "OFFSET" or (token.is_keyword and token.normalized == "FETCH"):
+            return None
+        if clause == "ORDER BY" and index + 1 < len(tokens):
+            order = _order_items(tokens[index + 1], columns)
+            if order is None:
+                return None
+            cut = min(cut, index)
+        elif clause == "LIMIT":
+            cut = min(cut, index)
+    
+    if len({descending for _, descending in order}) > 1:
+        return None
+    descending = order[0][1] if order else False
+    
+    keys = [column for column, _ in order]
+    ordered = bool(order)
+    for pk in primary_key:
+        if by_name[pk] not in keys:
+            keys.append(by_name[pk])
+            ordered = False
+    
+    stop = statement.tokens.index(tokens[cut]) if cut < len(tokens) else len(statement.tokens)
+    base_sql = "".join(str(t) for t in statement.tokens[:stop]).strip().rstrip(";").strip()
+    
+    return KeysetPlan(base_sql, tuple(keys), descending, analysis.limit, ordered)
+
+
+def page_query(plan: KeysetPlan, after: Optional[Sequence[Any]], page_size: int) -> Tuple[str, Dict[str, Any]]:
+    """Uma página: a SQL base como subquery, filtro (chave) > (último valor) e LIMIT
+    
+    O PostgreSQL achata a subquery simples, então o filtro de linha chega ao
+    índice da chave (index scan a partir do último valor, sem OFFSET).
+    """
+    keys = ", ".join(_quote(k) for k in plan.keys)
+    direction = " DESC" if plan.descending else ""
+    order_by = ", ".join(f"{_quote(k)}{direction}" for k in plan.keys)
+    params: Dict[str, Any] = {"page_size": page_size}
+    
+    where = ""
+    if after is not None:
+        placeholders = ", ".join(f":k{i}" for i in range(len(plan.keys)))
+        where = f" WHERE ({keys}) {'<' if plan.descending else '>'} ({placeholders})"
+        params.update({f"k{i}": value for i, value in enumerate(after)})
+    
+    sql = f"SELECT * FROM ({plan.base_sql}) AS _keyset{where} ORDER BY {order_by} LIMIT :page_size"
+    return sql, params
+
+
+def encode_token(sql_key: str, after: Sequence[Any], served: int) -> str:
+    """Token opaco: fingerprint da SQL guardada + últimos valores da chave"""
+    payload = json.dumps({"q": sql_key, "after": list(after), "served": served},
+                         separators=(",", ":"), default=str)
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_token(token: str) -> Tuple[str, List[Any], int]:
+    padded = token + "=" * (-len(token) % 4)
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return payload["q"], list(payload["after"]), int(payload["served"])
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError(f"Invalid page token: {e}")
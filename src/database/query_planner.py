@@ -0,0 +1,97 @@
+from typing import Any, Callable, List, NamedTuple, Optional, Tuple
+from collections import OrderedDict
+from src.database.sql_fingerprint import fingerprint
+import threading
+import json
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class PlanEstimate(NamedTuple):
+    """Números do planner para uma query (EXPLAIN sem ANALYZE: nada é executado)"""
+    total_cost: float
+    plan_rows: int
+    seq_scans: Tuple[Tuple[str, int], ...] = ()   # (tabela, linhas estimadas na saída)
+
+
+def summarize_plan(plan: dict) -> PlanEstimate:
+    """Extrai custo total, linhas e Seq Scans de um plano EXPLAIN (FORMAT JSON)"""
+    seq_scans: List[Tuple[str, int]] = []
+    pending = [plan]
+    while pending:
+        node = pending.pop()
+        if node.get("Node Type") == "Seq Scan" and node.get("Relation Name"):
+            seq_scans.append((node["Relation Name"], int(node.get("Plan Rows", 0))))
+        pending.extend(node.get("Plans", []))
+    
+    return PlanEstimate(
+        total_cost=float(plan.get("Total Cost", 0.0)),
+        plan_rows=int(plan.get("Plan Rows", 0)),
+        seq_scans=tuple(seq_scans),
+    )
+
+
+class QueryPlanner:
+    """Estimativa de custo pelo próprio PostgreSQL (EXPLAIN FORMAT JSON)
+    
+    Os planos ficam em cache por fingerprint da SQL (LRU + PLAN_TTL): o
+    plano depende dos literais e das estatísticas, então expira junto com
+    elas. Falhas (timeout, banco fora) retornam None e o validator volta
+    para a estimativa por pg_stats.
+    """
+    
+    MAX_PLANS = 1000
+    PLAN_TTL = 300.0
+    TIMEOUT_MS = 2000
+    
+    def __init__(self, explain_fn: Optional[Callable[[str], Any]] = None,
+                 max_plans: Optional[int] = None, plan_ttl: Optional[float] = None):
+        self._explain_fn = explain_fn or self._run_explain
+        self.max_plans = max_plans if max_plans is not None else self.MAX_PLANS
+        self.plan_ttl = plan_ttl if plan_ttl is not None else self.PLAN_TTL
+        self._plans: "OrderedDict[str, Tuple[float, PlanEstimate]]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def _run_explain(self, sql: str) -> Any:
+        from sqlalchemy import text
+        from src.config.database import get_db_session
+        
+        with get_db_session() as session:
+            # SET LOCAL vale só para esta transação
+            session.execute(text(f"SET LOCAL statement_timeout = {int(self.TIMEOUT_MS)}"))
+            return session.execute(text(f"EXPLAIN (FORMAT JSON) {sql}")).scalar()
+    
+    def explain(self, sql: str) -> Optional[PlanEstimate]:
+        sql = sql.strip().rstrip(';')
+        key = fingerprint(sql)
+        
+        with self._lock:
+            cached = self._plans.get(key)
+            if cached and time.monotonic() - cached[0] < self.plan_ttl:
+                self._plans.move_to_end(key)
+                return cached[1]
+        
+        try:
+            output = self._explain_fn(sql)
+            if isinstance(output, str):
+                output = json.loads(output)
+            estimate = summarize_plan(output[0]["Plan"])
+        except Exception as e:
+            logger.warning(f"EXPLAIN failed, falling back to statistics: {e}")
+            return None
+        
+        with self._lock:
+            self._plans[key] = (time.monotonic(), estimate)
+            self._plans.move_to_end(key)
+            while len(self._plans) > self.max_plans:
+                self._plans.popitem(last=False)
+        return estimate
+    
+    def clear(self):
+        with self._lock:
+            self._plans.clear()
+
+
+query_planner = QueryPlanner()
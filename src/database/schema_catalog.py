@@ -0,0 +1,299 @@
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+import threading
+import time
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+
+# Usado enquanto o banco não responde (mesmos números de desenvolvimento de antes)
+FALLBACK_TABLES = {
+    "clientes": {
+        "count": 5,
+        "size_mb": 1,
+        "columns": ["id", "nome", "email", "saldo", "data_cadastro"],
+        "column_types": {
+            "id": "integer", "nome": "character varying", "email": "character varying",
+            "saldo": "double precision", "data_cadastro": "timestamp without time zone",
+        },
+        "primary_key": ["id"],
+        "unique_columns": ["id"],
+        "has_index": True,
+        "indexed_columns": ["id", "email"],
+        "foreign_keys": [],
+    },
+    "produtos": {
+        "count": 6,
+        "size_mb": 0.1,
+        "columns": ["id", "nome", "categoria", "preco", "estoque", "descricao"],
+        "column_types": {
+            "id": "integer", "nome": "character varying", "categoria": "character varying",
+            "preco": "double precision", "estoque": "integer", "descricao": "text",
+        },
+        "primary_key": ["id"],
+        "unique_columns": ["id"],
+        "has_index": True,
+        "indexed_columns": ["id", "categoria"],
+        "foreign_keys": [],
+    },
+    "transacoes": {
+        "count": 10,
+        "size_mb": 2,
+        "columns": ["id", "cliente_id", "produto_id", "quantidade", "valor_total", "data_transacao"],
+        "column_types": {
+            "id": "integer", "cliente_id": "integer", "produto_id": "integer",
+            "quantidade": "integer", "valor_total": "double precision",
+            "data_transacao": "timestamp without time zone",
+        },
+        "primary_key": ["id"],
+        "unique_columns": ["id"],
+        "has_index": True,
+        "indexed_columns": ["id", "cliente_id", "produto_id", "data_transacao"],
+        "foreign_keys": [
+            {"column": "cliente_id", "references": "clientes.id"},
+            {"column": "produto_id", "references": "produtos.id"},
+        ],
+    },
+}
+
+
+def index_columns(indexdef: str) -> List[str]:
+    """Colunas-chave de um CREATE INDEX de pg_indexes
+    
+    Índice de expressão (lower(email), cast) e índice parcial (WHERE) não
+    servem para qualquer filtro na coluna: devolvem lista vazia.
+    """
+    indexdef = indexdef or ""
+    start = indexdef.find('(')
+    if start < 0:
+        return []
+    end = indexdef.find(')', start)
+    keys = indexdef[start + 1:end]
+    # '(' antes do primeiro ')': parênteses aninhados, é expressão
+    if end < 0 or '(' in keys or '::' in keys:
+        return []
+    if re.search(r'\bWHERE\b', indexdef[end:], re.IGNORECASE):
+        return []
+    
+    columns = []
+    for part in keys.split(','):
+        name = part.strip().split(' ')[0].replace('"', '')
+        if name:
+            columns.append(name)
+    return columns
+
+
+def build_tables(columns: Iterable, indexes: Iterable, sizes: Iterable,
+                 constraints: Iterable) -> Dict[str, dict]:
+    """Monta o catálogo a partir das linhas das quatro consultas de introspecção"""
+    tables: Dict[str, dict] = {}
+    
+    for table, column, data_type in columns:
+        info = tables.setdefault(table, {
+            "count": 0,
+            "size_mb": 0,
+            "columns": [],
+            "column_types": {},
+            "primary_key": [],
+            "unique_columns": [],
+            "has_index": False,
+            "indexed_columns": [],
+            "foreign_keys": [],
+        })
+        info["columns"].append(column)
+        info["column_types"][column] = data_type
+    
+    for table, reltuples, total_bytes in sizes:
+        if table not in tables:
+            continue
+        # reltuples = -1: tabela nunca analisada (mantém o número conhecido, se houver)
+        if reltuples is not None and reltuples >= 0:
+            tables[table]["count"] = int(reltuples)
+        else:
+            tables[table]["count"] = FALLBACK_TABLES.get(table, {}).get("count", 0)
+        tables[table]["size_mb"] = round((total_bytes or 0) / (1024 * 1024), 1)
+    
+    for table, indexdef in indexes:
+        if table not in tables:
+            continue
+        info = tables[table]
+        columns_in_index = index_columns(indexdef)
+        for column in columns_in_index:
+            if column in info["column_types"] and column not in info["indexed_columns"]:
+                info["indexed_columns"].append(column)
+        info["has_index"] = bool(info["indexed_columns"])
+        
+        # Índice único de uma coluna (PK ou UNIQUE): um valor por linha
+        if "UNIQUE INDEX" in (indexdef or "").upper() and len(columns_in_index) == 1:
+            column = columns_in_index[0]
+            if column in info["column_types"] and column not in info["unique_columns"]:
+                info["unique_columns"].append(column)
+    
+    for constraint_type, table, column, ref_table, ref_column in constraints:
+        if table not in tables:
+            continue
+        if constraint_type == "PRIMARY KEY":
+            if column not in tables[table]["primary_key"]:
+                tables[table]["primary_key"].append(column)
+        elif constraint_type == "FOREIGN KEY":
+            tables[table]["foreign_keys"].append(
+                {"column": column, "references": f"{ref_table}.{ref_column}"}
+            )
+    
+    for info in tables.values():
+        if len(info["primary_key"]) == 1 and info["primary_key"][0] not in info["unique_columns"]:
+            info["unique_columns"].append(info["primary_key"][0])
+    
+    return tables
+
+
+class SchemaCatalog:
+    """Catálogo do schema lido do próprio PostgreSQL
+    
+    Colunas (information_schema), índices (pg_indexes), cardinalidade
+    (pg_class.reltuples, atualizada pelo ANALYZE) e PK/FK. É a fonte única
+    para os metadados do retriever, o validator e o prompt do SQLGenerator.
+    O catálogo é reaproveitado por REFRESH_INTERVAL segundos; sem banco,
+    vale o último catálogo lido ou FALLBACK_TABLES.
+    """
+    
+    REFRESH_INTERVAL = 300.0
+    SCHEMA = "public"
+    
+    # Termos explícitos da pergunta para cada coluna: {tabela: {coluna: (termos,)}}
+    COLUMN_ALIASES: Dict[str, Dict[str, Tuple[str, ...]]] = {}
+    
+    COLUMNS_QUERY = '''
+        SELECT table_name, column_name, data_type
+        FROM information_schema.columns
+        WHERE table_schema = :schema
+        ORDER BY table_name, ordinal_position
+    '''
+    
+    INDEXES_QUERY = '''
+        SELECT tablename, indexdef
+        FROM pg_indexes
+        WHERE schemaname = :schema
+    '''
+    
+    SIZES_QUERY = '''
+        SELECT c.relname, c.reltuples, pg_total_relation_size(c.oid)
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = :schema AND c.relkind IN ('r', 'p')
+    '''
+    
+    CONSTRAINTS_QUERY = '''
+        SELECT tc.constraint_type, tc.table_name, kcu.column_name,
+               ccu.table_name, ccu.column_name
+        FROM information_schema.table_constraints tc
+        JOIN information_schema.key_column_usage kcu
+            ON kcu.constraint_name = tc.constraint_name
+            AND kcu.table_schema = tc.table_schema
+        JOIN information_schema.constraint_column_usage ccu
+            ON ccu.constraint_name = tc.constraint_name
+            AND ccu.table_schema = tc.table_schema
+        WHERE tc.table_schema = :schema
+            AND tc.constraint_type IN ('PRIMARY KEY', 'FOREIGN KEY')
+    '''
+    
+    def __init__(self, fetch_fn: Optional[Callable[[], Dict[str, dict]]] = None,
+                 refresh_interval: Optional[float] = None,
+                 column_aliases: Optional[Dict[str, Dict[str, Tuple[str, ...]]]] = None):
+        self._fetch_fn = fetch_fn or self._fetch_catalog
+        self._column_aliases = column_aliases if column_aliases is not None else self.COLUMN_ALIASES
+        self.refresh_interval = (
+            refresh_interval if refresh_interval is not None else self.REFRESH_INTERVAL
+        )
+        self._tables: Optional[Dict[str, dict]] = None
+        self._fetched_at = 0.0
+        self._lock = threading.Lock()
+    
+    def _fetch_catalog(self) -> Dict[str, dict]:
+        from sqlalchemy import text
+        from src.config.database import get_db_session
+        
+        params = {"schema": self.SCHEMA}
+        with get_db_session() as session:
+            rows = [
+                session.execute(text(query), params).fetchall()
+                for query in (self.COLUMNS_QUERY, self.INDEXES_QUERY,
+                              self.SIZES_QUERY, self.CONSTRAINTS_QUERY)
+            ]
+        return build_tables(*rows)
+    
+    def snapshot(self) -> Dict[str, dict]:
+        """Catálogo atual (tabela -> metadados)"""
+        with self._lock:
+            if time.monotonic() - self._fetched_at >= self.refresh_interval:
+                try:
+                    tables = self._fetch_fn()
+                    if tables:
+                        self._tables = tables
+                    else:
+                        logger.warning("Schema catalog is empty, keeping previous catalog")
+                except Exception as e:
+                    logger.warning(f"Schema catalog refresh failed: {e}")
+                # Falhas também respeitam o intervalo (não martela o banco)
+                self._fetched_at = time.monotonic()
+            return self._tables or FALLBACK_TABLES
+    
+    def refresh(self):
+        """Descarta o catálogo (ex.: após uma migração ou ANALYZE)"""
+        with self._lock:
+            self._fetched_at = 0.0
+    
+    def tables(self) -> List[str]:
+        return list(self.snapshot())
+    
+    def table(self, name: str) -> Optional[dict]:
+        return self.snapshot().get(name)
+    
+    def row_count(self, name: str) -> int:
+        info = self.table(name)
+        return info["count"] if info else 0
+    
+    def indexed_columns(self, name: str) -> List[str]:
+        info = self.table(name)
+        return info["indexed_columns"] if info else []
+    
+    def unique_columns(self, name: str) -> List[str]:
+        """Colunas com um valor por linha (PK de uma coluna ou índice UNIQUE)"""
+        info = self.table(name)
+        return info.get("unique_columns", []) if info else []
+    
+    def column_aliases(self, name: str) -> Dict[str, Tuple[str, ...]]:
+        """Termos da pergunta que nomeiam cada coluna além do próprio nome"""
+        return self._column_aliases.get(name, {})
+    
+    def references(self, name: str, column: str) -> Optional[Tuple[str, str]]:
+        """(tabela, coluna) referenciada pela FK `name.column`, se houver"""
+        for fk in (self.table(name) or {}).get("foreign_keys", []):
+            if fk["column"] == column:
+                table, _, referenced = fk["references"].partition(".")
+                return table, referenced
+        return None
+    
+    def table_metadata(self) -> Dict[str, dict]:
+        """Layer 1 do retriever: resumo por tabela (sem os tipos das colunas)"""
+        return {
+            table: {key: value for key, value in info.items() if key != "column_types"}
+            for table, info in self.snapshot().items()
+        }
+    
+    def describe_columns(self) -> str:
+        """Colunas e tipos de cada tabela, no formato do prompt do SQLGenerator"""
+        blocks = []
+        for table, info in self.snapshot().items():
+            lines = [f"Tabela: {table}"]
+            for column in info["columns"]:
+                data_type = info["column_types"].get(column, "")
+                lines.append(f"- {column} ({data_type.upper()})")
+            for fk in info["foreign_keys"]:
+                lines.append(f"  FK: {fk['column']} -> {fk['references']}")
+            blocks.append("\n".join(lines))
+        return "\n\n".join(blocks)
+
+
+schema_catalog = SchemaCatalog()
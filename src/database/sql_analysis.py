@@ -0,0 +1,375 @@
+from typing import Dict, List, NamedTuple, Optional, Set
+from dataclasses import dataclass, field
+from collections import OrderedDict
+import sqlparse
+from sqlparse.sql import Comparison, Function, Identifier, Parenthesis, Where
+from sqlparse.tokens import DML, Comment, Keyword, Literal, Punctuation, Wildcard
+from sqlparse.tokens import Comparison as ComparisonOp
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+AGGREGATES = {"COUNT", "SUM", "AVG", "MIN", "MAX"}
+
+_CLAUSES = {"SELECT", "FROM", "WHERE", "GROUP BY", "ORDER BY", "LIMIT", "OFFSET",
+            "HAVING", "ON", "USING", "WITH", "UNION", "UNION ALL", "INTERSECT", "EXCEPT"}
+
+# Operador invertido quando o literal vem à esquerda (5 < x  ->  x > 5)
+_FLIPPED = {"<": ">", "<=": ">=", ">": "<", ">=": "<="}
+
+
+class Predicate(NamedTuple):
+    """Filtro simples do WHERE: qualifier.column <op> value"""
+    qualifier: Optional[str]   # alias ou tabela antes do ponto (None: coluna sem prefixo)
+    column: str
+    op: str
+    value: object              # literal, lista (IN), par (BETWEEN) ou None (IS NULL)
+    clause: str = "WHERE"      # WHERE ou ON
+    depth: int = 0             # 0: query externa
+
+
+class JoinCondition(NamedTuple):
+    """Igualdade entre colunas (ON ou WHERE): left.column = right.column"""
+    left: Optional[str]
+    left_column: str
+    right: Optional[str]
+    right_column: str
+
+
+@dataclass
+class QueryAnalysis:
+    """Resultado de uma passada pela árvore do sqlparse
+    
+    Compartilhado pelo cache de analyze(): tratar como somente leitura.
+    Literais (strings) nunca contam como tabela, keyword ou comentário.
+    """
+    statement_count: int = 0
+    operations: List[str] = field(default_factory=list)   # tipo de cada statement
+    keywords: Set[str] = field(default_factory=set)        # keywords fora de literais
+    has_comment: bool = False
+    tables: Dict[str, str] = field(default_factory=dict)  # alias (ou nome) -> tabela
+    table_references: Dict[str, int] = field(default_factory=dict)  # tabela/CTE -> vezes lida (todos os níveis)
+    ctes: Set[str] = field(default_factory=set)
+    predicates: List[Predicate] = field(default_factory=list)
+    joins: List[JoinCondition] = field(default_factory=list)
+    join_count: int = 0
+    or_count: int = 0          # ORs dentro do WHERE (qualquer nível)
+    outer_or_count: int = 0    # só os da query externa
+    has_where: bool = False
+    limit: Optional[int] = None  # LIMIT da query externa
+    has_limit: bool = False      # qualquer LIMIT/FETCH externo (inclui LIMIT ALL e :param)
+    subquery_count: int = 0
+    has_set_operation: bool = False  # UNION/INTERSECT/EXCEPT na query externa
+    has_window: bool = False
+    has_order_by: bool = False
+    has_group_by: bool = False
+    has_distinct: bool = False
+    select_star: bool = False
+    has_aggregate: bool = False
+    balanced_parens: bool = True
+    
+    @property
+    def referenced_tables(self) -> List[str]:
+        return list(dict.fromkeys(self.tables.values()))
+
+
+class _Scope:
+    """Posição do walker: profundidade de subquery e cláusula corrente"""
+    
+    __slots__ = ("depth", "clause", "keyword")
+    
+    def __init__(self, depth: int = 0, clause: Optional[str] = None):
+        self.depth = depth
+        self.clause = clause
+        self.keyword: Optional[str] = None   # cláusula aberta pelo token atual
+
+
+def clause_of(token) -> Optional[str]:
+    if token.ttype in DML:
+        return token.normalized
+    if token.ttype in Keyword:
+        word = " ".join(token.normalized.split())
+        if word.endswith("JOIN"):
+            return "JOIN"
+        if word in _CLAUSES:
+            return word
+    return None
+
+
+def meaningful_tokens(group) -> list:
+    return [t for t in group.tokens if not t.is_whitespace and t.ttype not in Comment]
+
+
+def is_subquery(token) -> bool:
+    if not isinstance(token, Parenthesis):
+        return False
+    inner = meaningful_tokens(token)
+    return len(inner) > 1 and inner[1].ttype in DML
+
+
+def is_literal(token) -> bool:
+    return token.ttype in Literal
+
+
+def column_ref(token):
+    """(qualifier, coluna) de um Identifier simples; None para expressões"""
+    if not isinstance(token, Identifier) or any(isinstance(t, (Function, Parenthesis)) for t in token.tokens):
+        return None
+    name = token.get_real_name()
+    if not name:
+        return None
+    parent = token.get_parent_name()
+    return (parent.lower() if parent else None), name.lower()
+
+
+def in_function_arguments(token) -> bool:
+    """Dentro dos argumentos de uma função, sem subquery no meio (EXTRACT(YEAR FROM x))"""
+    parent = token.parent
+    while parent is not None:
+        if is_subquery(parent):
+            return False
+        if isinstance(parent, Function):
+            return True
+        parent = parent.parent
+    return False
+
+
+def inside_function(token) -> bool:
+    parent = token.parent
+    while parent is not None:
+        if isinstance(parent, Function):
+            return True
+        parent = parent.parent
+    return False
+
+
+class StatementVisitor:
+    """Keywords, comentários e parênteses (segurança e sintaxe)"""
+    
+    def __init__(self):
+        self._open = 0
+    
+    def visit(self, token, scope: _Scope, analysis: QueryAnalysis):
+        if token.ttype in Comment:
+            analysis.has_comment = True
+        elif token.ttype in Keyword:
+            analysis.keywords.add(" ".join(token.normalized.split()))
+        elif token.ttype in Punctuation:
+            if token.value == "(":
+                self._open += 1
+            elif token.value == ")":
+                self._open -= 1
+                if self._open < 0:
+                    analysis.balanced_parens = False
+    
+    def finish(self, analysis: QueryAnalysis):
+        if self._open != 0:
+            analysis.balanced_parens = False
+
+
+class TableVisitor:
+    """Tabelas do FROM/JOIN (com alias) e nomes de CTEs"""
+    
+    def visit(self, token, scope: _Scope, analysis: QueryAnalysis):
+        if scope.keyword == "JOIN":
+            analysis.join_count += 1
+        if not isinstance(token, Identifier) or isinstance(token.parent, Identifier):
+            return
+        
+        if scope.clause == "WITH":
+            analysis.ctes.add(token.get_real_name().lower())
+            return
+        # EXTRACT(YEAR FROM coluna), SUBSTRING(x FROM 1): FROM de função não lê tabela
+        if scope.clause not in ("FROM", "JOIN") or in_function_arguments(token):
+            return
+        # (SELECT ...) alias: as tabelas de dentro aparecem no nível seguinte
+        if isinstance(token.token_first(skip_cm=True), (Parenthesis, Function)):
+            return
+        
+        table = token.get_real_name()
+        if not table:
+            return
+        table = table.lower()
+        analysis.tables[table] = table
+        analysis.table_references[table] = analysis.table_references.get(table, 0) + 1
+        alias = token.get_alias()
+        if alias:
+            analysis.tables[alias.lower()] = table
+
+
+class PredicateVisitor:
+    """Filtros do WHERE, condições de JOIN e contagem de ORs"""
+    
+    def visit(self, token, scope: _Scope, analysis: QueryAnalysis):
+        if isinstance(token, Where):
+            analysis.has_where = True
+            self._scan_sequence(token, scope, analysis)
+        elif isinstance(token, Parenthesis) and scope.clause == "WHERE" and not is_subquery(token):
+            self._scan_sequence(token, scope, analysis)
+        elif isinstance(token, Comparison) and scope.clause in ("WHERE", "ON"):
+            self._comparison(token, scope, analysis)
+        elif token.ttype in Keyword and token.normalized == "OR" and scope.clause == "WHERE":
+            analysis.or_count += 1
+            if scope.depth == 0:
+                analysis.outer_or_count += 1
+    
+    @staticmethod
+    def _comparison(token: Comparison, scope: _Scope, analysis: QueryAnalysis):
+        op = next((t for t in token.tokens if t.ttype in ComparisonOp), None)
+        if op is None:
+            return
+        op = op.normalized.upper()
+        left, right = token.left, token.right
+        left_col, right_col = column_ref(left), column_ref(right)
+        
+        if left_col and right_col:
+            if op == "=":
+                analysis.joins.append(JoinCondition(*left_col, *right_col))
+        elif left_col and is_literal(right):
+            analysis.predicates.append(Predicate(*left_col, op, right.value, scope.clause, scope.depth))
+        elif right_col and is_literal(left):
+            analysis.predicates.append(
+                Predicate(*right_col, _FLIPPED.get(op, op), left.value, scope.clause, scope.depth)
+            )
+    
+    @staticmethod
+    def _scan_sequence(group, scope: _Scope, analysis: QueryAnalysis):
+        """BETWEEN, IN e IS [NOT] NULL não viram grupo no sqlparse: lidos em sequência"""
+        items = meaningful_tokens(group)
+        for i, token in enumerate(items):
+            column = column_ref(token)
+            if column is None or i + 1 >= len(items) or items[i + 1].ttype not in Keyword:
+                continue
+            keyword = " ".join(items[i + 1].normalized.split())
+            rest = items[i + 2:]
+            
+            if keyword == "BETWEEN" and len(rest) >= 3 and is_literal(rest[0]) and is_literal(rest[2]):
+                analysis.predicates.append(Predicate(
+                    *column, "BETWEEN", (rest[0].value, rest[2].value), "WHERE", scope.depth
+                ))
+            elif keyword == "IN" and rest and isinstance(rest[0], Parenthesis) and not is_subquery(rest[0]):
+                values = [t.value for t in rest[0].flatten() if is_literal(t)]
+                if values:
+                    analysis.predicates.append(Predicate(*column, "IN", values, "WHERE", scope.depth))
+            elif keyword == "IS" and rest and rest[0].ttype in Keyword:
+                negated = " ".join(rest[0].normalized.split()) == "NOT NULL" or (
+                    rest[0].normalized == "NOT" and len(rest) > 1 and rest[1].normalized == "NULL"
+                )
+                if negated or rest[0].normalized == "NULL":
+                    analysis.predicates.append(Predicate(
+                        *column, "IS NOT NULL" if negated else "IS NULL", None, "WHERE", scope.depth
+                    ))
+
+
+class ShapeVisitor:
+    """Forma da query externa: LIMIT, ORDER/GROUP BY, DISTINCT, SELECT *, agregações"""
+    
+    def visit(self, token, scope: _Scope, analysis: QueryAnalysis):
+        if is_subquery(token):
+            analysis.subquery_count += 1
+        if token.ttype in Keyword and token.normalized == "OVER":
+            analysis.has_window = True
+        if scope.depth > 0:
+            return
+        if scope.keyword in ("UNION", "UNION ALL", "INTERSECT", "EXCEPT"):
+            analysis.has_set_operation = True
+        elif scope.keyword == "ORDER BY":
+            analysis.has_order_by = True
+        elif scope.keyword == "GROUP BY":
+            analysis.has_group_by = True
+        elif token.ttype in Keyword and token.normalized == "DISTINCT":
+            analysis.has_distinct = True
+        elif scope.keyword == "LIMIT" or (token.ttype in Keyword and token.normalized == "FETCH"):
+            analysis.has_limit = True
+        elif scope.clause == "LIMIT" and token.ttype in Literal.Number.Integer:
+            analysis.limit = int(token.value)
+        elif scope.clause == "SELECT":
+            if token.ttype in Wildcard and not inside_function(token):
+                analysis.select_star = True
+            elif isinstance(token, Function) and token.get_real_name() \
+                    and token.get_real_name().upper() in AGGREGATES:
+                analysis.has_aggregate = True
+
+
+def _walk(group, scope: _Scope, visitors: list, analysis: QueryAnalysis):
+    for token in group.tokens:
+        if token.is_whitespace:
+            continue
+        clause = clause_of(token)
+        if clause:
+            scope.clause = clause
+        scope.keyword = clause
+        
+        for visitor in visitors:
+            visitor.visit(token, scope, analysis)
+        
+        if token.is_group:
+            if is_subquery(token):
+                child = _Scope(scope.depth + 1)
+            else:
+                child = _Scope(scope.depth, scope.clause)
+            _walk(token, child, visitors, analysis)
+
+
+def _analyze(sql: str) -> QueryAnalysis:
+    analysis = QueryAnalysis()
+    statement_visitor = StatementVisitor()
+    visitors = [statement_visitor, TableVisitor(), PredicateVisitor(), ShapeVisitor()]
+    
+    for statement in sqlparse.parse(sql):
+        # ';' final sozinho não conta como statement
+        if all(t.is_whitespace or t.ttype in Punctuation for t in statement.flatten()):
+            continue
+        analysis.statement_count += 1
+        analysis.operations.append(statement.get_type())
+        _walk(statement, _Scope(), visitors, analysis)
+    
+    statement_visitor.finish(analysis)
+    return analysis
+
+
+class AnalysisCache:
+    """LRU de análises por texto da SQL
+    
+    A chave é o texto exato (sem espaços nas pontas), não o fingerprint():
+    canonicalize() roda sqlparse.parse, então cada consulta ao cache custaria
+    o parse que ele existe para evitar. E o rewriter reaplica a análise sobre
+    o mesmo texto (aliases, literais, aspas); textos equivalentes pelo
+    fingerprint mas escritos de outro jeito ficam em entradas separadas.
+    """
+    
+    MAX_ENTRIES = 1024
+    
+    def __init__(self, max_entries: Optional[int] = None):
+        self.max_entries = max_entries if max_entries is not None else self.MAX_ENTRIES
+        self._entries: "OrderedDict[str, QueryAnalysis]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def analyze(self, sql: str) -> QueryAnalysis:
+        key = (sql or "").strip()
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None:
+                self._entries.move_to_end(key)
+                return cached
+        
+        analysis = _analyze(key)
+        
+        with self._lock:
+            self._entries[key] = analysis
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return analysis
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+analysis_cache = AnalysisCache()
+
+
+def analyze(sql: str) -> QueryAnalysis:
+    """Analisa a SQL uma única vez (memoizado em analysis_cache)"""
+    return analysis_cache.analyze(sql)
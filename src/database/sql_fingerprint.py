@@ -0,0 +1,43 @@
+from sqlparse.tokens import Comment, Keyword, Literal, Name, Punctuation
+import sqlparse
+import hashlib
+
+
+def canonicalize(sql: str, parameterize: bool = False) -> str:
+    """Forma canônica da SQL para uso como chave de cache
+    
+    - espaços e comentários removidos (tokens separados por um espaço)
+    - keywords em maiúsculas, identificadores sem aspas em minúsculas
+    - ';' final removido; várias statements ficam todas na chave, separadas
+      por ' ; ' (senão "SELECT 1; DROP ..." colidiria com "SELECT 1")
+    - parameterize=True troca literais por '?' (mesma "forma" de query)
+    """
+    statements = [_canonical_statement(statement, parameterize)
+                  for statement in sqlparse.parse(sql or "")]
+    return " ; ".join(statement for statement in statements if statement)
+
+
+def _canonical_statement(statement, parameterize: bool) -> str:
+    parts = []
+    for token in statement.flatten():
+        if token.is_whitespace or token.ttype in Comment:
+            continue
+        
+        value = token.value
+        if token.ttype in Keyword:
+            value = value.upper()
+        elif token.ttype in Name and not value.startswith('"'):
+            value = value.lower()
+        elif token.ttype in Literal and parameterize:
+            value = "?"
+        elif token.ttype in Punctuation and value == ";":
+            continue
+        
+        parts.append(value)
+    
+    return " ".join(parts)
+
+
+def fingerprint(sql: str, parameterize: bool = False) -> str:
+    """Hash da forma canônica (queries equivalentes no texto têm o mesmo fingerprint)"""
+    return hashlib.md5(canonicalize(sql, parameterize).encode()).hexdigest()
@@ -0,0 +1,438 @@
+from typing import Iterator, List, NamedTuple, Optional, Tuple
+import sqlparse
+from sqlparse.sql import Comparison, Identifier, IdentifierList, Parenthesis, Token, Where
+from sqlparse.tokens import Comment, Keyword, Literal, Punctuation, Wildcard
+from src.database.schema_catalog import SchemaCatalog, schema_catalog as default_schema_catalog
+from src.database.sql_analysis import (
+    QueryAnalysis, analyze, clause_of, column_ref, inside_function, is_literal, is_subquery,
+)
+import unicodedata
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+# Cláusulas que encerram o corpo de um WHERE
+_CLOSING = {"GROUP BY", "ORDER BY", "LIMIT", "OFFSET", "HAVING",
+            "UNION", "UNION ALL", "INTERSECT", "EXCEPT"}
+_RANGE_OPS = {"=", "<", "<=", ">", ">=", "BETWEEN"}
+_OR = re.compile(r'\bOR\b', re.IGNORECASE)
+
+
+class RewriteResult(NamedTuple):
+    sql: str
+    optimizations: List[str]
+    applied: Tuple[str, ...] = ()   # regras que mudaram a SQL
+
+
+def _terms(text: str) -> List[str]:
+    """Palavras da pergunta sem acento e em minúsculas"""
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(c for c in text if not unicodedata.combining(c)).lower()
+    return re.findall(r'[a-z0-9_]+', text.replace("-", ""))
+
+
+def _outer_leaves(group) -> Iterator[Token]:
+    """Tokens folha da query externa (não entra em subqueries)"""
+    for token in group.tokens:
+        if token.is_group:
+            if not is_subquery(token):
+                yield from _outer_leaves(token)
+        else:
+            yield token
+
+
+def _outer_groups(group) -> Iterator:
+    for token in group.tokens:
+        if token.is_group and not is_subquery(token):
+            yield token
+            yield from _outer_groups(token)
+
+
+def _all_groups(group) -> Iterator:
+    for token in group.tokens:
+        if token.is_group:
+            yield token
+            yield from _all_groups(token)
+
+
+def _insert(group, index: int, text: str, ttype=None):
+    token = Token(ttype, text)
+    token.parent = group
+    group.tokens.insert(index, token)
+
+
+def _is_semicolon(token) -> bool:
+    return token.ttype in Punctuation and token.value == ";"
+
+
+def _limit_position(group) -> Optional[Tuple[object, int]]:
+    """Onde o LIMIT entra: depois do último token com conteúdo, antes do ';'
+    
+    O sqlparse põe o ';' dentro do último grupo (ex.: o WHERE); nesse caso
+    a posição é dentro desse grupo.
+    """
+    tokens = group.tokens
+    index = next((i for i in range(len(tokens) - 1, -1, -1)
+                  if not tokens[i].is_whitespace and not _is_semicolon(tokens[i])
+                  and tokens[i].ttype not in Comment), None)
+    if index is None:
+        return None
+    last = tokens[index]
+    if last.is_group:
+        inner = _limit_position(last)
+        if inner and any(_is_semicolon(t) for t in inner[0].tokens[inner[1]:]):
+            return inner
+    return group, index + 1
+
+
+def _replace(group, start: int, end: int, text: str):
+    del group.tokens[start:end]
+    _insert(group, start, text)
+
+
+class QueryRewriter:
+    """Reescritas por regra sobre a árvore do sqlparse (AGENTE 3)
+    
+    Regras, nesta ordem: ORs repetidos -> IN, filtro de data empurrado para
+    dentro de subqueries/CTEs sobre transacoes, SELECT * expandido para as
+    colunas da pergunta, LIMIT no nível externo. Cada regra só reescreve o
+    que consegue provar equivalente; na dúvida a SQL fica como está.
+    O parse extra só acontece quando a análise aponta alguma regra aplicável.
+    """
+    
+    LARGE_TABLES = ("transacoes",)
+    LARGE_TABLE_LIMIT = 100
+    JOIN_LIMIT = 1000
+    MAX_LIMIT = 10000
+    MIN_OR_TERMS = 2
+    DISPLAY_COLUMNS = ("nome",)   # sempre mantidas ao expandir SELECT *
+    DATE_TABLE = "transacoes"
+    DATE_COLUMN = "data_transacao"
+    
+    def __init__(self, catalog: Optional[SchemaCatalog] = None, max_limit: Optional[int] = None):
+        self.catalog = catalog or default_schema_catalog
+        self.max_limit = max_limit if max_limit is not None else self.MAX_LIMIT
+    
+    def rewrite(self, sql: str, analysis: QueryAnalysis, question: str = "") -> RewriteResult:
+        if analysis.statement_count != 1:
+            return RewriteResult(sql, [])
+        
+        limit = self._target_limit(analysis)
+        star_columns = self._star_columns(analysis, question)
+        pushdown = self._pushdown_predicates(analysis)
+        if not (limit or star_columns or pushdown or analysis.or_count):
+            return RewriteResult(sql, [])
+        
+        statement = sqlparse.parse(sql)[0]
+        optimizations: List[str] = []
+        applied: List[str] = []
+        rules = (
+            ("or_to_in", lambda: self._merge_or_terms(statement)),
+            ("date_pushdown", lambda: self._push_date_predicates(statement, pushdown)),
+            ("select_star", lambda: self._expand_star(statement, star_columns)),
+            ("limit", lambda: self._apply_limit(statement, limit)),
+        )
+        for name, rule in rules:
+            messages = rule()
+            if messages:
+                applied.append(name)
+                optimizations.extend(messages)
+        
+        if not applied:
+            return RewriteResult(sql, [])
+        return RewriteResult(str(statement), optimizations, tuple(applied))
+    
+    # LIMIT
+    
+    def _known_tables(self, analysis: QueryAnalysis) -> List[str]:
+        known = set(self.catalog.tables())
+        return [t for t in analysis.referenced_tables if t in known]
+    
+    def _target_limit(self, analysis: QueryAnalysis) -> Optional[Tuple[int, str]]:
+        if analysis.limit is not None:
+            if analysis.limit > self.max_limit:
+                return self.max_limit, f"✅ LIMIT reduzido de {analysis.limit} para {self.max_limit}"
+            return None
+        # FETCH FIRST, LIMIT ALL, LIMIT :param: a query já decidiu o próprio limite
+        if analysis.has_limit:
+            return None
+        # Agregação sem GROUP BY devolve uma linha
+        if analysis.has_aggregate and not analysis.has_group_by:
+            return None
+        
+        tables = self._known_tables(analysis)
+        if any(t in self.LARGE_TABLES for t in tables):
+            return (self.LARGE_TABLE_LIMIT,
+                    f"✅ LIMIT {self.LARGE_TABLE_LIMIT} adicionado automaticamente (tabela grande)")
+        if len(tables) < 2:
+            return None
+        if analysis.join_count:
+            return self.JOIN_LIMIT, f"✅ LIMIT {self.JOIN_LIMIT} adicionado (query com JOINs)"
+        if analysis.has_set_operation:
+            return (self.JOIN_LIMIT,
+                    f"✅ LIMIT {self.JOIN_LIMIT} adicionado (query com UNION/INTERSECT/EXCEPT)")
+        return self.JOIN_LIMIT, f"✅ LIMIT {self.JOIN_LIMIT} adicionado (query com várias tabelas)"
+    
+    @staticmethod
+    def _apply_limit(statement, limit: Optional[Tuple[int, str]]) -> List[str]:
+        if not limit:
+            return []
+        value, message = limit
+        leaves = [t for t in _outer_leaves(statement) if not t.is_whitespace]
+        
+        # LIMIT existente (nível externo): só troca o número
+        for i, token in enumerate(leaves[:-1]):
+            if token.ttype in Keyword and token.normalized == "LIMIT" \
+                    and leaves[i + 1].ttype in Literal.Number.Integer:
+                leaves[i + 1].value = str(value)
+                return [message]
+        
+        # Sem LIMIT: entra no fim da statement (antes do ';'), depois de tudo que
+        # estiver no nível de cima, inclusive um grupo que termina em subquery
+        position = _limit_position(statement)
+        if position is None:
+            return []
+        group, index = position
+        # Comentário de linha no fim do último grupo engoliria o LIMIT
+        last_leaf = [t for t in group.tokens[index - 1].flatten() if not t.is_whitespace][-1]
+        separator = "\n" if last_leaf.ttype in Comment.Single else " "
+        _insert(group, index, f"{separator}LIMIT {value}", Keyword)
+        return [message]
+    
+    # SELECT *
+    
+    def _star_columns(self, analysis: QueryAnalysis, question: str) -> Optional[List[str]]:
+        """Colunas pedidas na pergunta (+ PK e DISPLAY_COLUMNS) no lugar do *"""
+        if (not analysis.select_star or analysis.has_aggregate or analysis.has_distinct
+                or analysis.has_group_by or analysis.has_set_operation
+                or analysis.subquery_count or analysis.ctes):
+            return None
+        
+        tables = analysis.referenced_tables
+        if not tables or any(self.catalog.table(t) is None for t in tables):
+            return None
+        
+        terms = _terms(question)
+        qualify = len(tables) > 1
+        columns, matched = [], False
+        for table in tables:
+            info = self.catalog.table(table)
+            aliases = [a for a, t in analysis.tables.items() if t == table and a != table]
+            prefix = f"{aliases[0] if aliases else table}." if qualify else ""
+            
+            column_aliases = self.catalog.column_aliases(table)
+            wanted = [c for c in info["columns"]
+                      if self._mentioned(c, terms, column_aliases.get(c, ()))]
+            matched = matched or bool(wanted)
+            for column in info["columns"]:
+                if column in wanted or column in info["primary_key"] or column in self.DISPLAY_COLUMNS:
+                    columns.append(prefix + column)
+        
+        # Pergunta não cita nenhuma coluna: mantém o * (o warning continua)
+        return columns if matched else None
+    
+    @staticmethod
+    def _mentioned(column: str, terms: List[str], aliases: Tuple[str, ...] = ()) -> bool:
+        """Nome exato da coluna ("saldo", "valor total" para valor_total) ou alias do catálogo
+        
+        Sem prefixo/parcial: "clientes" não pode puxar cliente_id e esconder o resto.
+        """
+        phrase = f" {' '.join(terms)} "
+        names = [column] + [" ".join(_terms(alias)) for alias in aliases]
+        return column in terms or any(f" {name.replace('_', ' ')} " in phrase for name in names if name)
+    
+    @staticmethod
+    def _expand_star(statement, columns: Optional[List[str]]) -> List[str]:
+        if not columns:
+            return []
+        for token in _outer_leaves(statement):
+            if token.ttype in Keyword and token.normalized == "FROM":
+                break
+            # Só o * solto; alias.* e COUNT(*) ficam como estão
+            if token.ttype in Wildcard and not isinstance(token.parent, Identifier) \
+                    and not inside_function(token):
+                token.value = ", ".join(columns)
+                return [f"✅ SELECT * expandido para: {', '.join(columns)}"]
+        return []
+    
+    # OR -> IN
+    
+    def _merge_or_terms(self, statement) -> List[str]:
+        messages = []
+        for group in list(_all_groups(statement)):
+            if isinstance(group, Where) or (isinstance(group, Parenthesis) and not is_subquery(group)):
+                messages.extend(self._merge_group(group))
+        return messages
+    
+    def _merge_group(self, group) -> List[str]:
+        tokens = group.tokens
+        start = 1   # depois do WHERE ou do '('
+        end = len(tokens) - 1 if isinstance(group, Parenthesis) else len(tokens)
+        for i in range(start, end):
+            token = tokens[i]
+            if clause_of(token) in _CLOSING or (token.ttype in Punctuation and token.value == ";"):
+                end = i
+                break
+        
+        # Disjunções no nível do grupo (AND liga mais forte e fica dentro de cada uma)
+        disjuncts: List[list] = [[]]
+        for token in tokens[start:end]:
+            if token.ttype in Keyword and token.normalized == "OR":
+                disjuncts.append([])
+            else:
+                disjuncts[-1].append(token)
+        if len(disjuncts) < self.MIN_OR_TERMS:
+            return []
+        
+        equalities = {}
+        for i, disjunct in enumerate(disjuncts):
+            found = self._equality(disjunct)
+            if found:
+                equalities.setdefault(found[0], []).append((i, found[1]))
+        merged = {column: terms for column, terms in equalities.items() if len(terms) >= self.MIN_OR_TERMS}
+        if not merged:
+            return []
+        
+        parts, messages = [], []
+        replaced = {i: column for column, terms in merged.items() for i, _ in terms}
+        for i, disjunct in enumerate(disjuncts):
+            column = replaced.get(i)
+            if column is None:
+                parts.append("".join(str(t) for t in disjunct).strip())
+            elif merged[column][0][0] == i:
+                values = [value for _, value in merged[column]]
+                parts.append(f"{column} IN ({', '.join(values)})")
+                messages.append(f"✅ {len(values)} condições OR em {column} convertidas para IN")
+        
+        body = "".join(str(t) for t in tokens[start:end])
+        leading = body[:len(body) - len(body.lstrip())]
+        trailing = body[len(body.rstrip()):]
+        _replace(group, start, end, leading + " OR ".join(parts) + trailing)
+        return messages
+    
+    @staticmethod
+    def _equality(disjunct: list) -> Optional[Tuple[str, str]]:
+        """(coluna, literal) se a disjunção é só `coluna = literal`"""
+        items = [t for t in disjunct if not t.is_whitespace]
+        if len(items) != 1 or not isinstance(items[0], Comparison):
+            return None
+        comparison = items[0]
+        op = next((t for t in comparison.tokens if t.ttype in sqlparse.tokens.Comparison), None)
+        if op is None or op.value != "=":
+            return None
+        left, right = comparison.left, comparison.right
+        if column_ref(left) and is_literal(right):
+            return str(left).strip(), right.value
+        if column_ref(right) and is_literal(left):
+            return str(right).strip(), left.value
+        return None
+    
+    # Pushdown de data
+    
+    def _pushdown_predicates(self, analysis: QueryAnalysis) -> list:
+        """Filtros de data do WHERE externo sobre subqueries/CTEs (conjunções simples)
+        
+        CTE lida mais de uma vez (outro ramo do UNION, subquery escalar,
+        self-join) perderia linhas nas outras leituras: não recebe o filtro.
+        """
+        if (analysis.outer_or_count or "NOT" in analysis.keywords or analysis.has_set_operation
+                or not (analysis.subquery_count or analysis.ctes)):
+            return []
+        return [
+            p for p in analysis.predicates
+            if p.depth == 0 and p.clause == "WHERE" and p.qualifier
+            and p.column == self.DATE_COLUMN and p.op in _RANGE_OPS
+            and (p.qualifier not in analysis.tables
+                 or (p.qualifier in analysis.ctes and analysis.table_references.get(p.qualifier) == 1))
+        ]
+    
+    def _push_date_predicates(self, statement, predicates: list) -> List[str]:
+        if not predicates:
+            return []
+        messages = []
+        for name, subquery in self._derived_tables(statement):
+            inner_sql = str(subquery)[1:-1]
+            inner = analyze(inner_sql)
+            if not self._accepts_pushdown(subquery, inner):
+                continue
+            
+            aliases = [a for a, t in inner.tables.items() if t == self.DATE_TABLE and a != t]
+            qualifier = aliases[0] if aliases else self.DATE_TABLE
+            for predicate in predicates:
+                if predicate.qualifier != name:
+                    continue
+                # Já aplicado (ex.: revalidação da SQL otimizada)
+                if any(p.column == self.DATE_COLUMN and p.op == predicate.op and p.value == predicate.value
+                       and p.depth == 0 for p in inner.predicates):
+                    continue
+                condition = self._condition(f"{qualifier}.{self.DATE_COLUMN}", predicate)
+                self._add_condition(subquery, condition)
+                messages.append(f"✅ Filtro '{condition}' aplicado dentro de '{name}' (pushdown para transacoes)")
+        return messages
+    
+    @staticmethod
+    def _derived_tables(statement) -> Iterator[Tuple[str, Parenthesis]]:
+        """(alias, subquery) de FROM (SELECT ...) alias e de WITH nome AS (SELECT ...)"""
+        for group in _outer_groups(statement):
+            if not isinstance(group, Identifier):
+                continue
+            subquery = next((t for t in group.tokens if is_subquery(t)), None)
+            if subquery is None:
+                continue
+            name = group.get_alias() if group.tokens[0] is subquery else group.get_real_name()
+            if name:
+                yield name.lower(), subquery
+    
+    def _accepts_pushdown(self, subquery: Parenthesis, inner: QueryAnalysis) -> bool:
+        # LIMIT, agregação, DISTINCT e janelas mudariam de resultado com o filtro antes
+        if (inner.statement_count != 1 or inner.limit is not None or inner.has_group_by
+                or inner.has_aggregate or inner.has_distinct or inner.has_window
+                or inner.has_set_operation or inner.subquery_count
+                or self.DATE_TABLE not in inner.referenced_tables):
+            return False
+        if inner.select_star:
+            return True
+        
+        # A coluna tem que sair da subquery com o mesmo nome
+        for token in subquery.tokens:
+            if clause_of(token) == "FROM":
+                break
+            selected = token.get_identifiers() if isinstance(token, IdentifierList) else [token]
+            for item in selected:
+                column = column_ref(item)
+                if column and column[1] == self.DATE_COLUMN \
+                        and item.get_alias() in (None, self.DATE_COLUMN):
+                    return True
+        return False
+    
+    @staticmethod
+    def _condition(column: str, predicate) -> str:
+        if predicate.op == "BETWEEN":
+            low, high = predicate.value
+            return f"{column} BETWEEN {low} AND {high}"
+        return f"{column} {predicate.op} {predicate.value}"
+    
+    @staticmethod
+    def _add_condition(subquery: Parenthesis, condition: str):
+        where = next((t for t in subquery.tokens if isinstance(t, Where)), None)
+        if where is not None:
+            end = len(where.tokens)
+            for i, token in enumerate(where.tokens[1:], start=1):
+                if clause_of(token) in _CLOSING:
+                    end = i
+                    break
+            body = "".join(str(t) for t in where.tokens[1:end])
+            trailing = body[len(body.rstrip()):]
+            text = body.strip()
+            if _OR.search(text):
+                text = f"({text})"
+            _replace(where, 1, end, f" {text} AND {condition}{trailing}")
+            return
+        
+        tokens = subquery.tokens
+        index = next((i for i, t in enumerate(tokens) if clause_of(t) in _CLOSING), len(tokens) - 1)
+        if tokens[index - 1].is_whitespace:
+            _insert(subquery, index, f"WHERE {condition} ")
+        else:
+            _insert(subquery, index, f" WHERE {condition}")
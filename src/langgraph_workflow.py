@@ -1,7 +1,7 @@
-from langgraph.graph import StateGraph, END
-from typing import TypedDict, Annotated
+from typing import TYPE_CHECKING, TypedDict, Annotated, Optional
 import operator
 from src.orchestration.mcp_context import MCPContext
+from src.config.registry import lazy, registry
 
 
 from src.agents.query_router import query_router
@@ -13,12 +13,18 @@ from src.agents.sql_generator import sql_generator
 from src.agents.sql_validator import sql_validator
 from src.agents.query_executor import query_executor
 from src.agents.response_formatter import response_formatter
+from src.memory.result_spill import load_result, stored_result
+from src.orchestration.admission import admission_controller
 
 from src.rag.schema_retriever import schema_retriever
 from src.memory.persistent_memory import memory  # CORRETO: importa 'memory'
 from src.observability.tracer import tracer
+import asyncio
 import logging
 
+if TYPE_CHECKING:
+    from langgraph.graph import StateGraph
+
 logger = logging.getLogger(__name__)
 
 
@@ -34,11 +40,14 @@ def check_cache_node(state: AgentState) -> AgentState:
     with tracer.start_span("check_cache"):
         try:
             cached = memory.check_cache(context.original_question)
+            execution = _cached_execution(cached)
             
-            if cached:
+            if execution:
                 context.generated_sql = cached['sql_query']
-                context.execution_result = {'success': True, 'data': cached['result'], 'from_cache': True}
+                context.execution_result = execution
                 context.metadata['cache_hit'] = True
+                context.metadata['cache_refreshing'] = cached.get('refreshing', False)
+                _apply_cached_response(context, cached)
                 
                 tracer.log_interaction("check_cache", {"cache_hit": True})
                 logger.info("Resultado retornado do cache")
@@ -53,49 +62,133 @@ def check_cache_node(state: AgentState) -> AgentState:
     return state
 
 
-def route_query_node(state: AgentState) -> AgentState:
+def _cached_execution(cached: Optional[dict]) -> Optional[dict]:
+    """execution_result de um hit; com spill, a prévia vem do arquivo (None se ele sumiu)"""
+    if not cached:
+        return None
+    
+    stored = cached['result']
+    try:
+        data = load_result(stored)
+    except OSError as e:
+        logger.warning(f"Cached spill file unavailable, treating as miss: {e}")
+        return None
+    
+    execution = {'success': True, 'data': data, 'from_cache': True}
+    if isinstance(stored, dict) and stored.get('spill'):
+        execution['spill'] = stored['spill']
+        execution['row_count'] = stored['spill']['row_count']
+    return execution
+
+
+def _apply_cached_response(context: MCPContext, cached: dict):
+    """Guarda a referência da entrada e, se houver, a resposta já auditada"""
+    context.metadata['cache_id'] = cached.get('cache_id')
+    context.metadata['cache_result_version'] = cached.get('result_version')
+    
+    if cached.get('formatted_response'):
+        context.formatted_response = cached['formatted_response']
+        context.metadata['cached_response'] = True
+        if cached.get('evidence_check'):
+            context.metadata['evidence_check'] = cached['evidence_check']
+
+
+# Nodes do fan-out (route_query, retrieve_schema, load_history) rodam no
+# mesmo superstep: retornam apenas "errors" (atualização parcial) e escrevem
+# em campos distintos do MCPContext compartilhado.
+
+def route_query_node(state: AgentState) -> dict:
     """NOVO NODE: Roteia query para estratégia adequada"""
+    errors = []
     with tracer.start_span("route_query"):
         try:
-            state["context"] = query_router.route(state["context"])
+            query_router.route(state["context"])
             tracer.log_interaction("route_query", {
                 "strategy": state["context"].metadata.get('routing_strategy')
             })
         except Exception as e:
             tracer.log_error("route_query", e)
-            state["errors"].append(str(e))
-    return state
+            errors.append(str(e))
+    return {"errors": errors}
 
 
-def retrieve_schema_node(state: AgentState) -> AgentState:
-    """NODE EVOLUÍDO: Multi-layer schema retrieval"""
+def retrieve_schema_node(state: AgentState) -> dict:
+    """NODE EVOLUÍDO: Multi-layer schema retrieval
+    
+    Roda em paralelo com o roteamento, então busca todas as camadas
+    (full_pipeline); join_context_node recorta conforme a estratégia.
+    """
     context = state["context"]
+    errors = []
     
     with tracer.start_span("retrieve_schema", {"user_id": context.user_id}):
         try:
-            strategy = context.metadata.get('routing_strategy', 'full_pipeline')
-            
-            schema_data = schema_retriever.retrieve_relevant_schema(
+            context.metadata['schema_retrieval'] = schema_retriever.retrieve_relevant_schema(
                 context.original_question,
-                strategy=strategy
+                strategy="full_pipeline"
             )
+        except Exception as e:
+            tracer.log_error("retrieve_schema", e)
+            errors.append(str(e))
+    
+    return {"errors": errors}
+
+
+def load_history_node(state: AgentState) -> dict:
+    """Carrega o histórico da sessão (independe do roteamento)"""
+    context = state["context"]
+    errors = []
+    
+    with tracer.start_span("load_history", {"user_id": context.user_id}):
+        try:
+            context.conversation_history = memory.get_session_context(
+                context.user_id, context.session_id
+            )
+        except Exception as e:
+            tracer.log_error("load_history", e)
+            errors.append(str(e))
+    
+    return {"errors": errors}
+
+
+def join_context_node(state: AgentState) -> dict:
+    """Junta os ramos paralelos: aplica a estratégia ao schema recuperado"""
+    context = state["context"]
+    strategy = context.metadata.get('routing_strategy', 'full_pipeline')
+    
+    schema_data = schema_retriever.apply_strategy(
+        context.metadata.pop('schema_retrieval', None) or {},
+        strategy
+    )
+    
+    context.schema_context = schema_data.get('schema', '')
+    context.metadata['schema_metadata'] = schema_data.get('metadata', {})
+    context.metadata['schema_statistics'] = schema_data.get('statistics', '')
+    
+    tracer.log_interaction("retrieve_schema", {
+        "strategy": strategy,
+        "metadata_tables": list(schema_data.get('metadata', {}).keys()),
+        "history_items": len(context.conversation_history)
+    })
+    
+    return {}
+
+
+def answer_from_schema_node(state: AgentState) -> AgentState:
+    """Perguntas estruturais (schema_only): resposta direta do catálogo, sem SQL/LLM"""
+    context = state["context"]
+    
+    with tracer.start_span("answer_from_schema"):
+        try:
+            context.formatted_response = schema_retriever.describe_schema(context.original_question)
+            context.metadata['answered_from_schema'] = True
             
-            context.schema_context = schema_data.get('schema', '')
-            context.metadata['schema_metadata'] = schema_data.get('metadata', {})
-            context.metadata['schema_statistics'] = schema_data.get('statistics', '')
-            
-            history = memory.get_session_context(context.user_id, context.session_id)
-            context.conversation_history = history
-            
-            tracer.log_interaction("retrieve_schema", {
-                "strategy": strategy,
-                "metadata_tables": list(schema_data.get('metadata', {}).keys())
+            tracer.log_interaction("answer_from_schema", {
+                "tables": list(context.metadata.get('schema_metadata', {}).keys())
             })
-            
         except Exception as e:
-            tracer.log_error("retrieve_schema", e)
+            tracer.log_error("answer_from_schema", e)
             state["errors"].append(str(e))
-    
     return state
 
 
@@ -152,6 +245,28 @@ def should_execute_query(state: AgentState) -> str:
     return "format_error"
 
 
+def admit_query_node(state: AgentState) -> AgentState:
+    """NOVO NODE: Controle de admissão pelo custo estimado"""
+    context = state["context"]
+    with tracer.start_span("admit_query", {"user_id": context.user_id}):
+        # Hit no cache de SQL: responde sem passar pela admissão
+        if query_executor.serve_from_cache(context):
+            tracer.log_interaction("admit_query", {"sql_cache_hit": True})
+            return state
+        decision = admission_controller.admit(context.user_id, context.validation_result)
+        admission_controller.record(context, decision)
+        tracer.log_interaction("admit_query", context.metadata['admission'])
+    return state
+
+
+def should_run_admitted(state: AgentState) -> str:
+    context = state["context"]
+    if context.metadata.get('sql_cache_hit'):
+        return "cached"
+    admission = context.metadata.get('admission') or {}
+    return "execute" if admission.get('admitted') else "rejected"
+
+
 def execute_query_node(state: AgentState) -> AgentState:
     """NODE EVOLUÍDO: Execução com streaming"""
     with tracer.start_span("execute_query"):
@@ -166,6 +281,8 @@ def execute_query_node(state: AgentState) -> AgentState:
         except Exception as e:
             tracer.log_error("execute_query", e)
             state["errors"].append(str(e))
+        finally:
+            admission_controller.release_for(state["context"])
     return state
 
 
@@ -178,15 +295,6 @@ def format_response_node(state: AgentState) -> AgentState:
             tracer.log_interaction("format_response", {
                 "formatted_preview": str(state["context"].formatted_response)[:200]
             })
-
-            memory.save_interaction(
-                user_id=state["context"].user_id,
-                session_id=state["context"].session_id,
-                question=state["context"].original_question,
-                sql_query=state["context"].generated_sql,
-                result=state["context"].execution_result,
-                metadata=state["context"].metadata,
-            )
         except Exception as e:
             tracer.log_error("format_response", e)
             state["errors"].append(str(e))
@@ -207,47 +315,431 @@ def check_evidence_node(state: AgentState) -> AgentState:
     return state
 
 
-def create_workflow() -> StateGraph:
-    """Workflow completo evoluído"""
-    workflow = StateGraph(AgentState)
+def _verified_response(context: MCPContext) -> Optional[str]:
+    """Resposta cacheável: auditada pelo Evidence Checker ou gerada por template"""
+    if context.errors or not context.formatted_response:
+        return None
+    if context.metadata.get('response_template') or context.metadata.get('evidence_check'):
+        return context.formatted_response
+    return None
+
+
+def _interaction_record(context: MCPContext) -> dict:
+    execution = context.execution_result or {}
+    return {
+        "user_id": context.user_id,
+        "session_id": context.session_id,
+        "question": context.original_question,
+        "sql_query": context.generated_sql,
+        "result": stored_result(execution) if execution.get('success') else None,
+        "metadata": context.metadata,
+        "formatted_response": _verified_response(context),
+        "evidence_check": context.metadata.get('evidence_check'),
+        # Hit: a entrada já existe; regravar renovaria o TTL de dados antigos
+        "cache_result": not context.metadata.get('cache_hit', False),
+        "table_versions": execution.get('table_versions'),
+    }
+
+
+def _needs_cached_response(context: MCPContext) -> bool:
+    """Hit sem resposta pronta que acabou de ser formatado e auditado"""
+    return (
+        context.metadata.get('cache_hit', False)
+        and not context.metadata.get('cached_response', False)
+        and context.metadata.get('cache_id') is not None
+        and _verified_response(context) is not None
+    )
+
+
+def save_memory_node(state: AgentState) -> AgentState:
+    """NOVO NODE: Grava histórico e cache no fim (resposta final, já auditada)"""
+    context = state["context"]
+    
+    with tracer.start_span("save_memory"):
+        try:
+            memory.save_interaction(**_interaction_record(context))
+            
+            if _needs_cached_response(context):
+                memory.save_cached_response(
+                    context.metadata['cache_id'],
+                    context.metadata.get('cache_result_version'),
+                    context.formatted_response,
+                    context.metadata.get('evidence_check'),
+                )
+        except Exception as e:
+            tracer.log_error("save_memory", e)
+    return state
+
+
+async def acheck_cache_node(state: AgentState) -> AgentState:
+    """Versão assíncrona de check_cache_node"""
+    context = state["context"]
+    
+    with tracer.start_span("check_cache"):
+        try:
+            cached = await memory.acheck_cache(context.original_question)
+            execution = await asyncio.to_thread(_cached_execution, cached) if cached else None
+            
+            if execution:
+                context.generated_sql = cached['sql_query']
+                context.execution_result = execution
+                context.metadata['cache_hit'] = True
+                context.metadata['cache_refreshing'] = cached.get('refreshing', False)
+                _apply_cached_response(context, cached)
+                
+                tracer.log_interaction("check_cache", {"cache_hit": True})
+                logger.info("Resultado retornado do cache")
+            else:
+                context.metadata['cache_hit'] = False
+                tracer.log_interaction("check_cache", {"cache_hit": False})
+        
+        except Exception as e:
+            tracer.log_error("check_cache", e)
+            context.metadata['cache_hit'] = False
+    
+    return state
+
+
+async def aroute_query_node(state: AgentState) -> dict:
+    errors = []
+    with tracer.start_span("route_query"):
+        try:
+            await query_router.aroute(state["context"])
+            tracer.log_interaction("route_query", {
+                "strategy": state["context"].metadata.get('routing_strategy')
+            })
+        except Exception as e:
+            tracer.log_error("route_query", e)
+            errors.append(str(e))
+    return {"errors": errors}
+
+
+async def aretrieve_schema_node(state: AgentState) -> dict:
+    context = state["context"]
+    errors = []
+    
+    with tracer.start_span("retrieve_schema", {"user_id": context.user_id}):
+        try:
+            context.metadata['schema_retrieval'] = await schema_retriever.aretrieve_relevant_schema(
+                context.original_question,
+                strategy="full_pipeline"
+            )
+        except Exception as e:
+            tracer.log_error("retrieve_schema", e)
+            errors.append(str(e))
+    
+    return {"errors": errors}
+
+
+async def aload_history_node(state: AgentState) -> dict:
+    context = state["context"]
+    errors = []
+    
+    with tracer.start_span("load_history", {"user_id": context.user_id}):
+        try:
+            context.conversation_history = await memory.aget_session_context(
+                context.user_id, context.session_id
+            )
+        except Exception as e:
+            tracer.log_error("load_history", e)
+            errors.append(str(e))
+    
+    return {"errors": errors}
+
+
+async def aanswer_from_schema_node(state: AgentState) -> AgentState:
+    context = state["context"]
+    
+    with tracer.start_span("answer_from_schema"):
+        try:
+            context.formatted_response = schema_retriever.describe_schema(context.original_question)
+            context.metadata['answered_from_schema'] = True
+            
+            tracer.log_interaction("answer_from_schema", {
+                "tables": list(context.metadata.get('schema_metadata', {}).keys())
+            })
+        except Exception as e:
+            tracer.log_error("answer_from_schema", e)
+            state["errors"].append(str(e))
+    return state
+
+
+async def aparse_nlp_node(state: AgentState) -> AgentState:
+    with tracer.start_span("parse_nlp"):
+        try:
+            state["context"] = await nlp_parser.aparse(state["context"])
+            tracer.log_interaction("parse_nlp", {"parsed_entities": state["context"].parsed_entities})
+        except Exception as e:
+            tracer.log_error("parse_nlp", e)
+            state["errors"].append(str(e))
+    return state
+
+
+async def agenerate_sql_node(state: AgentState) -> AgentState:
+    with tracer.start_span("generate_sql"):
+        try:
+            state["context"] = await sql_generator.agenerate(state["context"])
+            tracer.log_interaction("generate_sql", {"sql_preview": state["context"].generated_sql[:200]})
+        except Exception as e:
+            tracer.log_error("generate_sql", e)
+            state["errors"].append(str(e))
+    return state
+
+
+async def aadmit_query_node(state: AgentState) -> AgentState:
+    context = state["context"]
+    with tracer.start_span("admit_query", {"user_id": context.user_id}):
+        # Hit no cache de SQL: responde sem passar pela admissão
+        if await query_executor.aserve_from_cache(context):
+            tracer.log_interaction("admit_query", {"sql_cache_hit": True})
+            return state
+        decision = await admission_controller.aadmit(context.user_id, context.validation_result)
+        admission_controller.record(context, decision)
+        tracer.log_interaction("admit_query", context.metadata['admission'])
+    return state
+
+
+async def aexecute_query_node(state: AgentState) -> AgentState:
+    with tracer.start_span("execute_query"):
+        try:
+            state["context"] = await query_executor.aexecute(state["context"])
+            
+            result = state["context"].execution_result
+            tracer.log_interaction("execute_query", {
+                "rows_count": len(result.get('data', [])),
+                "truncated": result.get('truncated', False)
+            })
+        except Exception as e:
+            tracer.log_error("execute_query", e)
+            state["errors"].append(str(e))
+        finally:
+            admission_controller.release_for(state["context"])
+    return state
+
+
+async def aformat_response_node(state: AgentState) -> AgentState:
+    with tracer.start_span("format_response"):
+        try:
+            state["context"] = await response_formatter.aformat(state["context"])
+            
+            tracer.log_interaction("format_response", {
+                "formatted_preview": str(state["context"].formatted_response)[:200]
+            })
+        except Exception as e:
+            tracer.log_error("format_response", e)
+            state["errors"].append(str(e))
+    return state
+
+
+async def asave_memory_node(state: AgentState) -> AgentState:
+    context = state["context"]
     
-    workflow.add_node("check_cache", check_cache_node)
-    workflow.add_node("route_query", route_query_node)
-    workflow.add_node("check_evidence", check_evidence_node)
+    with tracer.start_span("save_memory"):
+        try:
+            await memory.asave_interaction(**_interaction_record(context))
+            
+            if _needs_cached_response(context):
+                await memory.asave_cached_response(
+                    context.metadata['cache_id'],
+                    context.metadata.get('cache_result_version'),
+                    context.formatted_response,
+                    context.metadata.get('evidence_check'),
+                )
+        except Exception as e:
+            tracer.log_error("save_memory", e)
+    return state
+
+
+async def acheck_evidence_node(state: AgentState) -> AgentState:
+    with tracer.start_span("check_evidence"):
+        try:
+            state["context"] = await evidence_checker.acheck(state["context"])
+            
+            tracer.log_interaction("check_evidence", {
+                "corrected": state["context"].metadata.get('response_corrected', False)
+            })
+        except Exception as e:
+            tracer.log_error("check_evidence", e)
+    return state
+
+
+CONTEXT_BRANCHES = ("route_query", "retrieve_schema", "load_history")
+
+
+def route_after_cache(state: AgentState):
+    """Hit com resposta pronta encerra sem LLM; hit sem resposta vai para a
+    formatação; miss dispara os ramos paralelos"""
+    metadata = state["context"].metadata
+    if metadata.get('cache_hit'):
+        return "save_memory" if metadata.get('cached_response') else "format_response"
+    return list(CONTEXT_BRANCHES)
+
+
+def route_by_strategy(state: AgentState) -> str:
+    """Atalhos por estratégia do QueryRouter.
     
-    workflow.add_node("retrieve_schema", retrieve_schema_node)
-    workflow.add_node("parse_nlp", parse_nlp_node)
-    workflow.add_node("generate_sql", generate_sql_node)
-    workflow.add_node("validate_sql", validate_sql_node)
-    workflow.add_node("execute_query", execute_query_node)
-    workflow.add_node("format_response", format_response_node)
+    schema_only: responde do catálogo (sem SQL nem formatter)
+    sql_direct: pula o NLP Parser
+    demais: pipeline completo
+    """
+    strategy = state["context"].metadata.get('routing_strategy', 'full_pipeline')
+    if strategy == "schema_only":
+        return "answer_from_schema"
+    if strategy == "sql_direct":
+        return "generate_sql"
+    return "parse_nlp"
+
+
+def should_check_evidence(state: AgentState) -> str:
+    """Respostas geradas por template não passam pelo Evidence Checker"""
+    if state["context"].metadata.get('response_template'):
+        return "save_memory"
+    return "check_evidence"
+
+
+def _build_workflow(nodes: dict) -> "StateGraph":
+    """Monta o grafo (mesma topologia para nodes sync e async)"""
+    from langgraph.graph import StateGraph, END
+    
+    workflow = StateGraph(AgentState)
+    
+    for name, node in nodes.items():
+        workflow.add_node(name, node)
     
     workflow.set_entry_point("check_cache")
     
+    # Cache miss: roteamento (LLM), FAISS e histórico começam juntos
     workflow.add_conditional_edges(
         "check_cache",
-        lambda state: "format_response" if state["context"].metadata.get('cache_hit') else "route_query"
+        route_after_cache,
+        ["save_memory", "format_response", *CONTEXT_BRANCHES]
+    )
+    
+    workflow.add_edge(list(CONTEXT_BRANCHES), "join_context")
+    workflow.add_conditional_edges(
+        "join_context",
+        route_by_strategy,
+        ["answer_from_schema", "generate_sql", "parse_nlp"]
     )
+    workflow.add_edge("answer_from_schema", "save_memory")
     
-    workflow.add_edge("route_query", "retrieve_schema")
-    workflow.add_edge("retrieve_schema", "parse_nlp")
     workflow.add_edge("parse_nlp", "generate_sql")
     workflow.add_edge("generate_sql", "validate_sql")
     
     workflow.add_conditional_edges(
         "validate_sql",
         should_execute_query,
-        {"execute": "execute_query", "format_error": "format_response"},
+        {"execute": "admit_query", "format_error": "format_response"},
+    )
+    workflow.add_conditional_edges(
+        "admit_query",
+        should_run_admitted,
+        {"execute": "execute_query", "rejected": "format_response", "cached": "format_response"},
     )
     
     workflow.add_edge("execute_query", "format_response")
-    workflow.add_edge("format_response", "check_evidence")
-    workflow.add_edge("check_evidence", END)
+    workflow.add_conditional_edges(
+        "format_response",
+        should_check_evidence,
+        ["check_evidence", "save_memory"],
+    )
+    workflow.add_edge("check_evidence", "save_memory")
+    workflow.add_edge("save_memory", END)
     
     return workflow.compile()
 
 
-sql_agent_workflow = create_workflow()
+def create_workflow() -> "StateGraph":
+    """Workflow completo evoluído"""
+    return _build_workflow({
+        "check_cache": check_cache_node,
+        "route_query": route_query_node,
+        "check_evidence": check_evidence_node,
+        "retrieve_schema": retrieve_schema_node,
+        "load_history": load_history_node,
+        "join_context": join_context_node,
+        "answer_from_schema": answer_from_schema_node,
+        "parse_nlp": parse_nlp_node,
+        "generate_sql": generate_sql_node,
+        "validate_sql": validate_sql_node,
+        "admit_query": admit_query_node,
+        "execute_query": execute_query_node,
+        "format_response": format_response_node,
+        "save_memory": save_memory_node,
+    })
+
+
+def create_async_workflow() -> "StateGraph":
+    """Workflow assíncrono: use com ainvoke/astream.
+    
+    Validação continua síncrona (CPU-bound, sem I/O).
+    """
+    return _build_workflow({
+        "check_cache": acheck_cache_node,
+        "route_query": aroute_query_node,
+        "check_evidence": acheck_evidence_node,
+        "retrieve_schema": aretrieve_schema_node,
+        "load_history": aload_history_node,
+        "join_context": join_context_node,
+        "answer_from_schema": aanswer_from_schema_node,
+        "parse_nlp": aparse_nlp_node,
+        "generate_sql": agenerate_sql_node,
+        "validate_sql": validate_sql_node,
+        "admit_query": aadmit_query_node,
+        "execute_query": aexecute_query_node,
+        "format_response": aformat_response_node,
+        "save_memory": asave_memory_node,
+    })
+
+
+# Grafos compilados no primeiro invoke (ver src.config.registry)
+sql_agent_workflow = lazy("sql_agent_workflow", create_workflow)
+async_sql_agent_workflow = lazy("async_sql_agent_workflow", create_async_workflow)
+
+
+def _initial_state(question: str, user_id: str) -> AgentState:
+    import uuid
+    from datetime import datetime
+    
+    context = MCPContext(
+        user_id=user_id,
+        session_id=str(uuid.uuid4()),
+        original_question=question,
+        timestamp=datetime.utcnow()
+    )
+    
+    return {
+        "context": context,
+        "errors": []
+    }
+
+
+def _summarize_result(final_context: MCPContext) -> dict:
+    return {
+        "formatted_response": final_context.formatted_response or "Nao foi possivel gerar resposta",
+        "sql": final_context.generated_sql or "N/A",
+        "from_cache": final_context.metadata.get("cache_hit", False),
+        "execution_time": final_context.metadata.get("execution_time", 0),
+        "evidence_status": final_context.metadata.get("evidence_check", {}).get("is_correct", "N/A"),
+        "category": final_context.metadata.get("query_category", "N/A"),
+        "strategy": final_context.metadata.get("routing_strategy", "N/A"),
+        "next_page": (final_context.execution_result or {}).get("next_page"),
+        "spill": (final_context.execution_result or {}).get("spill"),
+    }
+
+
+def _error_result(error: Exception) -> dict:
+    return {
+        "formatted_response": f"Erro: {str(error)}",
+        "sql": "N/A",
+        "from_cache": False,
+        "execution_time": 0,
+        "evidence_status": "Erro",
+        "category": "N/A",
+        "strategy": "N/A",
+        "next_page": None,
+        "spill": None,
+    }
 
 
 def run_single_query(question: str, user_id: str = "raquel_fonseca"):
@@ -261,52 +753,55 @@ def run_single_query(question: str, user_id: str = "raquel_fonseca"):
     Returns:
         dict com resultado
     """
-    import uuid
-    from datetime import datetime
-    
     logger.info("="*80)
     logger.info("  EXECUTANDO QUERY CUSTOMIZADA")
     logger.info("="*80)
     logger.info("Usuario: %s", user_id)
     logger.info("Pergunta: %s", question)
     
-    context = MCPContext(
-        user_id=user_id,
-        session_id=str(uuid.uuid4()),
-        original_question=question,
-        timestamp=datetime.utcnow()
-    )
+    try:
+        result = sql_agent_workflow.invoke(_initial_state(question, user_id))
+        return _summarize_result(result["context"])
     
-    initial_state = {
-        "context": context,
-        "errors": []
-    }
+    except Exception as e:
+        logger.error("Erro ao executar query: %s", e)
+        return _error_result(e)
+
+
+async def arun_single_query(question: str, user_id: str = "raquel_fonseca"):
+    """
+    Versao assincrona de run_single_query
+    
+    Varias perguntas podem ser atendidas concorrentemente no mesmo processo:
+        await asyncio.gather(*(arun_single_query(q) for q in perguntas))
+    """
+    logger.info("Usuario: %s | Pergunta (async): %s", user_id, question)
     
     try:
-        result = sql_agent_workflow.invoke(initial_state)
-        final_context = result["context"]
-        
-        return {
-            "formatted_response": final_context.formatted_response or "Nao foi possivel gerar resposta",
-            "sql": final_context.generated_sql or "N/A",
-            "from_cache": final_context.metadata.get("cache_hit", False),
-            "execution_time": final_context.metadata.get("execution_time", 0),
-            "evidence_status": final_context.metadata.get("evidence_check", {}).get("is_correct", "N/A"),
-            "category": final_context.metadata.get("query_category", "N/A"),
-            "strategy": final_context.metadata.get("routing_strategy", "N/A"),
-        }
+        result = await async_sql_agent_workflow.ainvoke(_initial_state(question, user_id))
+        return _summarize_result(result["context"])
     
     except Exception as e:
         logger.error("Erro ao executar query: %s", e)
-        return {
-            "formatted_response": f"Erro: {str(e)}",
-            "sql": "N/A",
-            "from_cache": False,
-            "execution_time": 0,
-            "evidence_status": "Erro",
-            "category": "N/A",
-            "strategy": "N/A",
-        }
+        return _error_result(e)
+
+
+async def astream_single_query(question: str, user_id: str = "raquel_fonseca"):
+    """Executa o workflow assincrono emitindo o nome de cada node concluido.
+    
+    O ultimo item emitido e o resultado final (mesmo formato de run_single_query).
+    """
+    final_context = None
+    async for update in async_sql_agent_workflow.astream(
+        _initial_state(question, user_id), stream_mode="updates"
+    ):
+        for node_name, node_state in update.items():
+            if node_state and "context" in node_state:
+                final_context = node_state["context"]
+            yield {"node": node_name}
+    
+    if final_context is not None:
+        yield _summarize_result(final_context)
 
 
 def main():
@@ -397,7 +892,7 @@ def main():
                 print(f"\nErros encontrados: {len(final_state['errors'])}")
                 for error in final_state["errors"]:
                     print(f"   - {error}")
-            
+        
         except Exception as e:
             print(f"\nERRO durante execucao: {e}")
             import traceback
@@ -420,6 +915,11 @@ def main():
     except:
         pass
     
+    print("\nCOMPONENTES INICIALIZADOS:")
+    for component in registry.startup_report():
+        if component['initialized']:
+            print(f"   {component['component']}: {component['build_ms']} ms")
+    
     print("\nSistema pronto para escalar para milhoes de dados!")
     print("="*80 + "\n")
 
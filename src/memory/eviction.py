@@ -0,0 +1,89 @@
+from typing import List, Optional, Tuple
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class EvictionPolicy:
+    """Escolhe quais entradas de semantic_cache remover quando o orçamento estoura
+    
+    select_victims retorna [(id, size_bytes)] e deve ser incremental: lê no
+    máximo algumas dezenas de linhas por índice, nunca a tabela inteira.
+    """
+    
+    name = "base"
+    
+    def select_victims(self, cursor, count: int) -> List[Tuple[int, int]]:
+        raise NotImplementedError
+
+
+class LRUPolicy(EvictionPolicy):
+    """Menos usada recentemente (idx_last_used)"""
+    
+    name = "lru"
+    
+    def select_victims(self, cursor, count: int) -> List[Tuple[int, int]]:
+        return cursor.execute('''
+            SELECT id, size_bytes FROM semantic_cache
+            ORDER BY last_used ASC
+            LIMIT ?
+        ''', (count,)).fetchall()
+
+
+class LFUPolicy(EvictionPolicy):
+    """Menos usada no total; empate resolvido por recência (idx_hit_count)"""
+    
+    name = "lfu"
+    
+    def select_victims(self, cursor, count: int) -> List[Tuple[int, int]]:
+        return cursor.execute('''
+            SELECT id, size_bytes FROM semantic_cache
+            ORDER BY hit_count ASC, last_used ASC
+            LIMIT ?
+        ''', (count,)).fetchall()
+
+
+class HybridPolicy(EvictionPolicy):
+    """Hits ponderados pela idade: score = hit_count / (1 + horas sem uso)
+    
+    O score não é indexável, então a política amostra as SAMPLE_SIZE
+    entradas mais antigas (via idx_last_used) e remove as de menor score.
+    """
+    
+    name = "hybrid"
+    SAMPLE_SIZE = 64
+    
+    def select_victims(self, cursor, count: int) -> List[Tuple[int, int]]:
+        rows = cursor.execute('''
+            SELECT id, size_bytes, hit_count,
+                   (julianday('now') - julianday(last_used)) * 24 AS age_hours
+            FROM semantic_cache
+            ORDER BY last_used ASC
+            LIMIT ?
+        ''', (max(count, self.SAMPLE_SIZE),)).fetchall()
+        
+        rows.sort(key=lambda row: (row[2] or 0) / (1.0 + max(row[3] or 0.0, 0.0)))
+        return [(row[0], row[1]) for row in rows[:count]]
+
+
+EVICTION_POLICIES = {
+    policy.name: policy
+    for policy in (LRUPolicy(), LFUPolicy(), HybridPolicy())
+}
+
+
+def get_eviction_policy(name: str) -> EvictionPolicy:
+    try:
+        return EVICTION_POLICIES[name]
+    except KeyError:
+        raise ValueError(
+            f"Unknown eviction policy '{name}'. Options: {', '.join(EVICTION_POLICIES)}"
+        )
+
+
+def expires_at(ttl_seconds: Optional[float]) -> Optional[float]:
+    """Timestamp (epoch) de expiração; None/<=0 significa sem expiração"""
+    if not ttl_seconds or ttl_seconds <= 0:
+        return None
+    return time.time() + ttl_seconds
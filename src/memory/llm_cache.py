@@ -0,0 +1,211 @@
+from typing import Any, Dict, Optional
+from langchain_core.caches import BaseCache, RETURN_VAL_TYPE
+from langchain_core.messages import message_to_dict, messages_from_dict
+from langchain_core.outputs import ChatGeneration, Generation
+from src.memory.storage import SQLiteStorage
+from src.memory.write_behind import WriteBehindWriter
+import atexit
+import threading
+import hashlib
+import json
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class LLMCacheStore:
+    """Tabela llm_cache (SQLite) compartilhada por todos os agentes
+    
+    Chave: sha256(llm_string + mensagens renderizadas). O llm_string do
+    LangChain já inclui modelo, temperatura e demais parâmetros da chamada.
+    Limite por número de entradas; ao estourar, remove as menos usadas (LRU).
+    
+    O lookup só lê: hit_count e last_used dos hits são agregados no
+    WriteBehindWriter e gravados em lote, como no cache semântico.
+    """
+    
+    MAX_ENTRIES = 5000
+    EVICTION_BATCH = 100
+    
+    def __init__(self, db_path: str = 'memory.db', max_entries: Optional[int] = None,
+                 write_behind: bool = True):
+        self.storage = SQLiteStorage(db_path)
+        self.max_entries = max_entries if max_entries is not None else self.MAX_ENTRIES
+        self._lock = threading.Lock()
+        self._init_database()
+        
+        self.writer = WriteBehindWriter(self._write_hits, name="llm-cache-write-behind") if write_behind else None
+        atexit.register(self.close)
+    
+    def _init_database(self):
+        with self.storage.transaction() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    cache_key TEXT PRIMARY KEY,
+                    agent TEXT NOT NULL,
+                    response TEXT NOT NULL,
+                    hit_count INTEGER DEFAULT 0,
+                    created_at REAL NOT NULL,
+                    last_used REAL NOT NULL
+                )
+            ''')
+            conn.execute('''
+                CREATE INDEX IF NOT EXISTS idx_llm_cache_last_used
+                ON llm_cache(last_used)
+            ''')
+            self._entry_count = conn.execute('SELECT COUNT(*) FROM llm_cache').fetchone()[0]
+    
+    @staticmethod
+    def make_key(prompt: str, llm_string: str) -> str:
+        return hashlib.sha256(f"{llm_string}\x00{prompt}".encode()).hexdigest()
+    
+    def get(self, key: str) -> Optional[str]:
+        with self.storage.transaction() as conn:
+            row = conn.execute(
+                'SELECT response FROM llm_cache WHERE cache_key = ?', (key,)
+            ).fetchone()
+        
+        if not row:
+            return None
+        
+        if self.writer:
+            self.writer.record_hit(key)
+        else:
+            self._write_hits([], {key: 1})
+        return row[0]
+    
+    def _write_hits(self, ops, hits: Dict[str, int]):
+        """Flush do write-behind: só hits (put continua síncrono, é o caminho do miss)"""
+        if not hits:
+            return
+        now = time.time()
+        with self.storage.transaction() as conn:
+            conn.executemany('''
+                UPDATE llm_cache SET hit_count = hit_count + ?, last_used = ?
+                WHERE cache_key = ?
+            ''', [(count, now, key) for key, count in hits.items()])
+    
+    def put(self, key: str, agent: str, response: str):
+        now = time.time()
+        with self._lock, self.storage.transaction() as conn:
+            is_new = conn.execute(
+                'SELECT 1 FROM llm_cache WHERE cache_key = ?', (key,)
+            ).fetchone() is None
+            
+            conn.execute('''
+                INSERT INTO llm_cache (cache_key, agent, response, created_at, last_used)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(cache_key) DO UPDATE SET
+                    response = excluded.response,
+                    last_used = excluded.last_used
+            ''', (key, agent, response, now, now))
+            
+            if is_new:
+                self._entry_count += 1
+            
+            if self._entry_count > self.max_entries:
+                count = min(self._entry_count - self.max_entries, self.EVICTION_BATCH)
+                deleted = conn.execute('''
+                    DELETE FROM llm_cache WHERE cache_key IN (
+                        SELECT cache_key FROM llm_cache ORDER BY last_used ASC LIMIT ?
+                    )
+                ''', (count,)).rowcount
+                self._entry_count -= deleted
+    
+    def clear(self, agent: Optional[str] = None):
+        with self._lock, self.storage.transaction() as conn:
+            if agent:
+                conn.execute('DELETE FROM llm_cache WHERE agent = ?', (agent,))
+            else:
+                conn.execute('DELETE FROM llm_cache')
+            self._entry_count = conn.execute('SELECT COUNT(*) FROM llm_cache').fetchone()[0]
+    
+    def flush(self):
+        if self.writer:
+            self.writer.flush()
+    
+    def close(self):
+        if self.writer:
+            self.writer.close()
+        self.storage.close()
+    
+    def statistics(self) -> Dict[str, Dict[str, int]]:
+        self.flush()
+        with self.storage.transaction() as conn:
+            rows = conn.execute('''
+                SELECT agent, COUNT(*), COALESCE(SUM(hit_count), 0)
+                FROM llm_cache GROUP BY agent
+            ''').fetchall()
+        return {agent: {'entries': entries, 'hits': hits} for agent, entries, hits in rows}
+
+
+class LLMResponseCache(BaseCache):
+    """Cache de respostas do LLM de um agente (passado como cache= ao ChatOpenAI)"""
+    
+    def __init__(self, store: LLMCacheStore, agent: str):
+        self.store = store
+        self.agent = agent
+    
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        try:
+            response = self.store.get(self.store.make_key(prompt, llm_string))
+        except Exception as e:
+            logger.warning(f"LLM cache lookup failed ({self.agent}): {e}")
+            return None
+        
+        if response is None:
+            return None
+        
+        logger.info(f"LLM cache hit ({self.agent})")
+        return self._deserialize(response)
+    
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        try:
+            self.store.put(
+                self.store.make_key(prompt, llm_string), self.agent, self._serialize(return_val)
+            )
+        except Exception as e:
+            logger.warning(f"LLM cache update failed ({self.agent}): {e}")
+    
+    def clear(self, **kwargs: Any) -> None:
+        self.store.clear(agent=self.agent)
+    
+    @staticmethod
+    def _serialize(generations: RETURN_VAL_TYPE) -> str:
+        return json.dumps([
+            {'message': message_to_dict(generation.message)}
+            if isinstance(generation, ChatGeneration)
+            else {'text': generation.text}
+            for generation in generations
+        ])
+    
+    @staticmethod
+    def _deserialize(response: str) -> RETURN_VAL_TYPE:
+        generations = []
+        for item in json.loads(response):
+            if 'message' in item:
+                message = messages_from_dict([item['message']])[0]
+                generations.append(ChatGeneration(message=message))
+            else:
+                generations.append(Generation(text=item['text']))
+        return generations
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_llm_cache(agent: str) -> Optional[LLMResponseCache]:
+    """Cache do agente, ou None se desabilitado nas settings (LLM_CACHE_*)"""
+    global _store
+    from src.config.settings import settings
+    
+    enabled_agents = {name.strip() for name in settings.llm_cache_agents.split(',') if name.strip()}
+    if not settings.llm_cache_enabled or agent not in enabled_agents:
+        return None
+    
+    with _store_lock:
+        if _store is None:
+            _store = LLMCacheStore(settings.llm_cache_db_path, settings.llm_cache_max_entries)
+    return LLMResponseCache(_store, agent)
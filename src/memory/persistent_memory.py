@@ -1,22 +1,129 @@
-from typing import Dict, List, Any, Optional
+from typing import Callable, Dict, List, Any, NamedTuple, Optional, Union
+from collections import OrderedDict
 from datetime import datetime
+from src.config.registry import lazy
+from src.database.columnar import json_default
+from src.database.data_versions import DataVersionTracker, data_versions as default_data_versions
+from src.database.sql_fingerprint import fingerprint
+from src.memory.eviction import EvictionPolicy, get_eviction_policy, expires_at
+from src.memory.question_literals import extract_literals
+from src.memory.refresher import BackgroundRefresher
+from src.memory.result_spill import stored_result
+from src.memory.storage import SQLiteStorage
+from src.memory.vector_index import QuestionVectorIndex
+from src.memory.write_behind import WriteBehindWriter
+import numpy as np
+import asyncio
+import atexit
 import json
-import sqlite3
+import threading
 import logging
 import hashlib
+import time
 
 logger = logging.getLogger(__name__)
 
 
+class CacheEntry(NamedTuple):
+    """Payload de escrita em semantic_cache (write-behind)"""
+    question: str
+    sql_query: str
+    result: Any
+    ttl: Optional[float] = None
+    table_versions: Optional[Dict[str, int]] = None
+    formatted_response: Optional[str] = None
+    evidence_check: Optional[Dict] = None
+
+
 class SemanticMemoryCache:
-    """MEMÓRIA EVOLUÍDA: Cache semântico + histórico"""
+    """MEMÓRIA EVOLUÍDA: Cache semântico + histórico
+    
+    Lookup em dois níveis: hash exato da pergunta normalizada e, se falhar,
+    busca ANN (FAISS) sobre os embeddings das perguntas já cacheadas. O hit
+    por similaridade só vale se os literais (números, datas, períodos, nomes
+    próprios) das duas perguntas forem os mesmos.
+    
+    Escritas do caminho da requisição (histórico, upsert no cache e
+    hit_count) são write-behind: vão para um WriteBehindWriter e são
+    gravadas em lote fora da latência do usuário.
+    
+    O cache é limitado (número de entradas e bytes) e cada entrada tem TTL.
+    Expiradas e excedentes são removidas de forma incremental a cada flush,
+    conforme a política de eviction (lru, lfu ou hybrid).
+    
+    Cada entrada guarda as tabelas que sua SQL lê e a versão de cada uma
+    (marcadas pelo executor no resultado); um hit cujas tabelas mudaram
+    no DataVersionTracker é invalidado.
+    
+    Expiração em dois níveis: após soft_ttl o hit ainda é servido, mas a
+    SQL guardada é reexecutada em background (sem LLM) para renovar o
+    resultado; após o TTL (hard) a entrada deixa de ser servida.
+    
+    A resposta formatada (já auditada pelo Evidence Checker) é guardada junto
+    do resultado: um hit com resposta pronta não chama nenhum LLM. Ela é
+    descartada sempre que o resultado muda (refresh).
+    
+    Segundo nível (sql_result_cache): resultado indexado pelo fingerprint da
+    SQL final, compartilhado entre perguntas diferentes que geram a mesma
+    query. É consultado pelo SmartQueryExecutor antes de ir ao PostgreSQL.
+    
+    page_cursors guarda, pelo mesmo fingerprint, a SQL e o plano de keyset
+    usados para buscar as páginas seguintes de um resultado truncado.
+    """
+    
+    SIMILARITY_THRESHOLD = 0.95
+    EMBEDDING_MEMO_SIZE = 256
+    
+    MAX_ENTRIES = 10000
+    MAX_BYTES = 256 * 1024 * 1024
+    DEFAULT_TTL = 24 * 3600
+    SOFT_TTL = 10 * 60
+    EVICTION_POLICY = "lru"
     
-    def __init__(self, db_path: str = 'memory.db'):
+    SQL_RESULT_TTL = 10 * 60
+    SQL_RESULT_MAX_ENTRIES = 2000
+    
+    # Plano de keyset de resultados truncados (o token de página aponta para ele)
+    PAGE_CURSOR_TTL = 60 * 60
+    
+    # Limites por flush: a manutenção nunca varre a tabela inteira
+    EVICTION_BATCH = 100
+    EXPIRED_PURGE_BATCH = 200
+    
+    def __init__(self, db_path: str = 'memory.db', embeddings=None,
+                 similarity_threshold: Optional[float] = None, write_behind: bool = True,
+                 max_entries: Optional[int] = None, max_bytes: Optional[int] = None,
+                 eviction_policy: Union[str, EvictionPolicy, None] = None,
+                 default_ttl: Optional[float] = None, soft_ttl: Optional[float] = None,
+                 data_versions: Optional[DataVersionTracker] = None,
+                 refresh_fn: Optional[Callable[[str], dict]] = None):
         self.db_path = db_path
+        self.storage = SQLiteStorage(db_path)
+        self.embeddings = embeddings
+        self.similarity_threshold = (
+            similarity_threshold if similarity_threshold is not None else self.SIMILARITY_THRESHOLD
+        )
+        self.max_entries = max_entries if max_entries is not None else self.MAX_ENTRIES
+        self.max_bytes = max_bytes if max_bytes is not None else self.MAX_BYTES
+        self.default_ttl = default_ttl if default_ttl is not None else self.DEFAULT_TTL
+        self.soft_ttl = soft_ttl if soft_ttl is not None else self.SOFT_TTL
+        policy = eviction_policy or self.EVICTION_POLICY
+        self.eviction_policy = get_eviction_policy(policy) if isinstance(policy, str) else policy
+        self.data_versions = data_versions or default_data_versions
+        self.refresh_fn = refresh_fn or self._execute_stored_sql
+        self.refresher = BackgroundRefresher()
+        self.vector_index = QuestionVectorIndex()
+        self._embedding_memo = OrderedDict()
+        self._totals_lock = threading.Lock()
         self._init_database()
+        self._load_cache_totals()
+        self._load_vector_index()
+        
+        self.writer = WriteBehindWriter(self._write_batch) if write_behind else None
+        atexit.register(self.close)
     
     def _init_database(self):
-        with sqlite3.connect(self.db_path) as conn:
+        with self.storage.transaction() as conn:
             cursor = conn.cursor()
             
             # Tabela original
@@ -47,6 +154,39 @@ class SemanticMemoryCache:
                 )
             ''')
             
+            # 🆕 Embeddings das perguntas cacheadas (índice ANN em memória)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS semantic_cache_embeddings (
+                    cache_id INTEGER PRIMARY KEY,
+                    embedding BLOB NOT NULL,
+                    FOREIGN KEY (cache_id) REFERENCES semantic_cache(id) ON DELETE CASCADE
+                )
+            ''')
+            
+            # 🆕 Tabelas lidas por cada entrada + versão dos dados no momento do cache
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS semantic_cache_tables (
+                    cache_id INTEGER NOT NULL,
+                    table_name TEXT NOT NULL,
+                    version INTEGER NOT NULL,
+                    PRIMARY KEY (cache_id, table_name),
+                    FOREIGN KEY (cache_id) REFERENCES semantic_cache(id) ON DELETE CASCADE
+                )
+            ''')
+            
+            # 🆕 Cache por SQL (fingerprint da query canônica)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS sql_result_cache (
+                    fingerprint TEXT PRIMARY KEY,
+                    sql_query TEXT NOT NULL,
+                    result TEXT NOT NULL,
+                    table_versions TEXT,
+                    hit_count INTEGER DEFAULT 0,
+                    expires_at REAL,
+                    last_used DATETIME DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            
             # Índices
             cursor.execute('''
                 CREATE INDEX IF NOT EXISTS idx_user_session 
@@ -63,7 +203,122 @@ class SemanticMemoryCache:
                 ON semantic_cache(last_used DESC)
             ''')
             
-            conn.commit()
+            # 🆕 Colunas de tamanho/expiração (migra bancos já existentes)
+            self._ensure_columns(cursor, 'semantic_cache', {
+                'size_bytes': 'INTEGER DEFAULT 0',
+                'expires_at': 'REAL',
+                'refresh_at': 'REAL',
+                'updated_at': 'REAL',
+                'formatted_response': 'TEXT',
+                'evidence_check': 'TEXT'
+            })
+            
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_expires_at
+                ON semantic_cache(expires_at)
+            ''')
+            
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_hit_count
+                ON semantic_cache(hit_count, last_used)
+            ''')
+            
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_sql_result_last_used
+                ON sql_result_cache(last_used)
+            ''')
+            
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS page_cursors (
+                    fingerprint TEXT PRIMARY KEY,
+                    sql_query TEXT NOT NULL,
+                    plan TEXT NOT NULL,
+                    expires_at REAL
+                )
+            ''')
+    
+    @staticmethod
+    def _ensure_columns(cursor, table: str, columns: Dict[str, str]):
+        existing = {row[1] for row in cursor.execute(f'PRAGMA table_info({table})')}
+        for name, definition in columns.items():
+            if name not in existing:
+                cursor.execute(f'ALTER TABLE {table} ADD COLUMN {name} {definition}')
+    
+    def _load_cache_totals(self):
+        """Totais do orçamento (uma agregação no startup, depois mantidos em memória)"""
+        with self.storage.transaction() as conn:
+            row = conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM(size_bytes), 0) FROM semantic_cache'
+            ).fetchone()
+        self._entry_count, self._total_bytes = row
+    
+    def _load_vector_index(self):
+        """Reconstrói o índice ANN a partir dos embeddings persistidos"""
+        try:
+            with self.storage.transaction() as conn:
+                rows = conn.execute('''
+                    SELECT e.cache_id, e.embedding
+                    FROM semantic_cache_embeddings e
+                    JOIN semantic_cache c ON c.id = e.cache_id
+                ''').fetchall()
+            
+            for cache_id, blob in rows:
+                self.vector_index.add(cache_id, np.frombuffer(blob, dtype=np.float32))
+            
+            if rows:
+                logger.info(f"Semantic index loaded: {len(rows)} embeddings")
+        except Exception as e:
+            logger.error(f"Failed to load semantic index: {e}")
+    
+    def _get_embeddings(self):
+        if self.embeddings is None:
+            from langchain_openai import OpenAIEmbeddings
+            from src.config.settings import settings
+            self.embeddings = OpenAIEmbeddings(openai_api_key=settings.openai_api_key)
+        return self.embeddings
+    
+    def _embed_question(self, question: str) -> Optional[np.ndarray]:
+        """Embedding da pergunta normalizada (memoizado: check + save usam o mesmo)"""
+        normalized = self._normalize_question(question)
+        
+        if normalized in self._embedding_memo:
+            self._embedding_memo.move_to_end(normalized)
+            return self._embedding_memo[normalized]
+        
+        try:
+            vector = QuestionVectorIndex.normalize(self._get_embeddings().embed_query(normalized))
+        except Exception as e:
+            logger.warning(f"Question embedding failed, using exact match only: {e}")
+            return None
+        
+        self._embedding_memo[normalized] = vector
+        if len(self._embedding_memo) > self.EMBEDDING_MEMO_SIZE:
+            self._embedding_memo.popitem(last=False)
+        return vector
+    
+    def _find_similar(self, question: str) -> Optional[int]:
+        """Busca ANN: retorna o id de semantic_cache se similaridade >= threshold"""
+        if len(self.vector_index) == 0:
+            return None
+        
+        vector = self._embed_question(question)
+        if vector is None:
+            return None
+        
+        start = time.perf_counter()
+        match = self.vector_index.search(vector)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        
+        if match is None:
+            return None
+        
+        cache_id, similarity = match
+        logger.debug(f"Semantic search: similarity={similarity:.3f} ({elapsed_ms:.2f} ms)")
+        
+        if similarity >= self.similarity_threshold:
+            logger.info(f"Semantic match (similarity: {similarity:.3f})")
+            return cache_id
+        return None
     
     def _normalize_question(self, question: str) -> str:
         """Normaliza pergunta para cache (case-insensitive, sem pontuação extra)"""
@@ -79,105 +334,545 @@ class SemanticMemoryCache:
         return hashlib.md5(normalized.encode()).hexdigest()
     
     def check_cache(self, question: str) -> Optional[dict]:
-        """🆕 Verifica se pergunta está no cache"""
+        """🆕 Verifica se pergunta está no cache (hash exato, depois similaridade)"""
         question_hash = self._hash_question(question)
+        now = time.time()
         
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    SELECT sql_query, result, hit_count
-                    FROM semantic_cache
-                    WHERE question_hash = ?
-                ''', (question_hash,))
-                
-                row = cursor.fetchone()
-                
-                if row:
-                    # Atualiza hit_count e last_used
-                    cursor.execute('''
-                        UPDATE semantic_cache
-                        SET hit_count = hit_count + 1,
-                            last_used = CURRENT_TIMESTAMP
-                        WHERE question_hash = ?
-                    ''', (question_hash,))
-                    conn.commit()
-                    
-                    logger.info(f"✅ CACHE HIT! (hits: {row[2] + 1})")
-                    
-                    return {
-                        'sql_query': row[0],
-                        'result': json.loads(row[1]) if row[1] else None,
-                        'from_cache': True
-                    }
+            row, tagged = self._lookup_entry('question_hash', question_hash, now)
+            
+            if not row:
+                # Embedding é chamada de rede: roda fora de qualquer transação do SQLite
+                cache_id = self._find_similar(question)
+                if cache_id is not None:
+                    row, tagged = self._lookup_entry('id', cache_id, now)
+                if row and extract_literals(row[4]) != extract_literals(question):
+                    # "vendas de março" x "vendas de abril": embedding quase igual, filtro diferente
+                    logger.info("Semantic match rejected: question literals differ")
+                    row = None
+            
+            if row and self._tables_changed(row[0], tagged):
+                self._invalidate(row[0])
+                row = None
+            
+            if row:
+                # Atualiza hit_count e last_used (agregado no write-behind)
+                self._record_hit(row[0])
+                logger.info(f"✅ CACHE HIT! (hits: {row[3] + 1})")
                 
-                logger.info("❌ Cache miss")
-                return None
+                # Soft expiry: serve o resultado atual e renova em background
+                refreshing = row[5] is not None and row[5] <= now
+                if refreshing:
+                    self._schedule_refresh(row[0], row[4], row[1])
                 
+                return {
+                    'cache_id': row[0],
+                    'result_version': row[6],
+                    'sql_query': row[1],
+                    'result': json.loads(row[2]) if row[2] else None,
+                    'formatted_response': row[7],
+                    'evidence_check': json.loads(row[8]) if row[8] else None,
+                    'from_cache': True,
+                    'refreshing': refreshing
+                }
+            
+            logger.info("❌ Cache miss")
+            return None
+        
         except Exception as e:
             logger.error(f"Cache check failed: {e}")
             return None
     
-    def save_to_cache(self, question: str, sql_query: str, result: Any):
-        """🆕 Salva no cache semântico"""
-        question_hash = self._hash_question(question)
+    def _lookup_entry(self, column: str, value: Any, now: float):
+        """Entrada válida (não expirada) + versões das tabelas marcadas nela"""
+        with self.storage.transaction() as conn:
+            row = conn.execute(f'''
+                SELECT id, sql_query, result, hit_count, question, refresh_at,
+                       updated_at, formatted_response, evidence_check
+                FROM semantic_cache
+                WHERE {column} = ?
+                  AND (expires_at IS NULL OR expires_at > ?)
+            ''', (value, now)).fetchone()
+            
+            if not row:
+                return None, {}
+            
+            tagged = dict(conn.execute(
+                'SELECT table_name, version FROM semantic_cache_tables WHERE cache_id = ?',
+                (row[0],)
+            ).fetchall())
+        return row, tagged
+    
+    def _tables_changed(self, cache_id: int, tagged: Dict[str, int]) -> bool:
+        # Fora da transação: o snapshot de versões pode ir ao PostgreSQL
+        changed = self.data_versions.changed_tables(tagged)
+        if changed:
+            logger.info(f"Cache entry {cache_id} stale, tables changed: {', '.join(changed)}")
+        return bool(changed)
+    
+    def _schedule_refresh(self, cache_id: int, question: str, sql_query: str):
+        if self.refresher.schedule(cache_id, lambda: self._refresh_entry(question, sql_query)):
+            logger.info(f"Cache entry {cache_id} past soft expiry, refreshing in background")
+    
+    def _refresh_entry(self, question: str, sql_query: str):
+        result = self.refresh_fn(sql_query)
+        
+        if not result or not result.get('success'):
+            logger.warning(f"Cache refresh failed: {(result or {}).get('error')}")
+            return
         
+        # Resposta formatada não é reaproveitada: será refeita no próximo hit.
+        # Versões vêm do executor (lidas antes da execução, nunca mais novas que o resultado)
+        self._submit('cache', CacheEntry(question, sql_query, stored_result(result),
+                                         table_versions=result.get('table_versions')))
+        logger.info("Cache entry refreshed")
+    
+    @staticmethod
+    def _execute_stored_sql(sql_query: str) -> dict:
+        from src.agents.query_executor import query_executor
+        return query_executor.run_sql(sql_query)
+    
+    def _submit(self, kind: str, payload: Any):
+        if self.writer:
+            self.writer.submit(kind, payload)
+        else:
+            self._write_batch([(kind, payload)], {})
+    
+    def _invalidate(self, cache_id: int):
+        self._submit('invalidate', cache_id)
+    
+    def save_to_cache(self, question: str, sql_query: str, result: Any,
+                      ttl: Optional[float] = None, table_versions: Optional[Dict[str, int]] = None):
+        """🆕 Salva no cache semântico (+ embedding da pergunta); ttl em segundos
+        
+        table_versions: versões das tabelas lidas pela SQL, como o executor as
+        marcou no resultado (sem elas a entrada só expira pelo TTL).
+        """
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                
-                # Insert or update
-                cursor.execute('''
-                    INSERT INTO semantic_cache (question_hash, question, sql_query, result)
-                    VALUES (?, ?, ?, ?)
-                    ON CONFLICT(question_hash) DO UPDATE SET
-                        sql_query = excluded.sql_query,
-                        result = excluded.result,
-                        last_used = CURRENT_TIMESTAMP
-                ''', (
-                    question_hash,
-                    question,
-                    sql_query,
-                    json.dumps(result)
-                ))
-                conn.commit()
-                logger.info("Saved to semantic cache")
+            self._submit('cache', CacheEntry(question, sql_query, result, ttl, table_versions))
+            logger.info("Saved to semantic cache")
         except Exception as e:
             logger.error(f"Failed to save to cache: {e}")
     
     def save_interaction(self, user_id: str, session_id: str, 
                         question: str, sql_query: Optional[str] = None,
-                        result: Optional[Any] = None, metadata: Optional[Dict] = None):
-        """Salva no histórico (método original mantido)"""
+                        result: Optional[Any] = None, metadata: Optional[Dict] = None,
+                        cache_ttl: Optional[float] = None,
+                        formatted_response: Optional[str] = None,
+                        evidence_check: Optional[Dict] = None, cache_result: bool = True,
+                        table_versions: Optional[Dict[str, int]] = None):
+        """Salva no histórico (método original mantido)
+        
+        cache_result=False grava só o histórico (ex.: resposta vinda do cache).
+        table_versions vem do resultado do executor (ver save_to_cache).
+        """
+        try:
+            ops = [('history', (
+                user_id,
+                session_id,
+                question,
+                sql_query,
+                json.dumps(result, default=json_default) if result else None,
+                json.dumps(metadata) if metadata else None
+            ))]
+            
+            # 🆕 Também salva no cache se tiver resultado válido
+            if cache_result and sql_query and result:
+                ops.append(('cache', CacheEntry(
+                    question, sql_query, result, cache_ttl, table_versions,
+                    formatted_response, evidence_check
+                )))
+            
+            if self.writer:
+                for kind, payload in ops:
+                    self.writer.submit(kind, payload)
+            else:
+                self._write_batch(ops, {})
+            
+            logger.info(f"Interaction saved for user {user_id}")
+        except Exception as e:
+            logger.error(f"Failed to save interaction: {e}")
+    
+    def save_cached_response(self, cache_id: int, result_version: Optional[float],
+                             formatted_response: str, evidence_check: Optional[Dict] = None):
+        """Anexa a resposta formatada a uma entrada já existente (hit sem resposta pronta)"""
+        self._submit('response', (cache_id, result_version, formatted_response, evidence_check))
+    
+    def get_sql_result(self, sql_query: str) -> Optional[dict]:
+        """🆕 Resultado cacheado para a SQL (qualquer pergunta que a tenha gerado)"""
+        key = fingerprint(sql_query)
+        
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self.storage.transaction() as conn:
+                row = conn.execute('''
+                    SELECT result, table_versions
+                    FROM sql_result_cache
+                    WHERE fingerprint = ?
+                      AND (expires_at IS NULL OR expires_at > ?)
+                ''', (key, time.time())).fetchone()
+        except Exception as e:
+            logger.error(f"SQL result cache check failed: {e}")
+            return None
+        
+        if not row:
+            return None
+        
+        if self.data_versions.changed_tables(json.loads(row[1]) if row[1] else {}):
+            self._submit('sql_invalidate', key)
+            return None
+        
+        self._record_hit(('sql', key))
+        logger.info("✅ SQL result cache hit")
+        return json.loads(row[0])
+    
+    def save_sql_result(self, sql_query: str, result: dict, ttl: Optional[float] = None):
+        """🆕 Guarda o resultado da execução (só execuções bem-sucedidas)"""
+        if not result or not result.get('success'):
+            return
+        
+        try:
+            self._submit('sql_result', (
+                fingerprint(sql_query),
+                sql_query,
+                result,
+                result.get('table_versions'),
+                expires_at(ttl if ttl is not None else self.SQL_RESULT_TTL)
+            ))
+        except Exception as e:
+            logger.error(f"Failed to save SQL result: {e}")
+    
+    def save_page_cursor(self, sql_query: str, plan: dict):
+        """Guarda o plano de keyset da SQL; o token de página leva só o fingerprint"""
+        try:
+            self._submit('page_cursor', (
+                fingerprint(sql_query),
+                sql_query,
+                plan,
+                expires_at(self.PAGE_CURSOR_TTL)
+            ))
+        except Exception as e:
+            logger.error(f"Failed to save page cursor: {e}")
+    
+    def get_page_cursor(self, key: str) -> Optional[dict]:
+        """SQL e plano de keyset pelo fingerprint (None se expirou)"""
+        try:
+            with self.storage.transaction() as conn:
+                row = conn.execute('''
+                    SELECT sql_query, plan
+                    FROM page_cursors
+                    WHERE fingerprint = ?
+                      AND (expires_at IS NULL OR expires_at > ?)
+                ''', (key, time.time())).fetchone()
+        except Exception as e:
+            logger.error(f"Page cursor lookup failed: {e}")
+            return None
+        
+        if not row:
+            return None
+        return {'sql_query': row[0], 'plan': json.loads(row[1])}
+    
+    def _record_hit(self, key):
+        """key: id de semantic_cache ou ('sql', fingerprint)"""
+        if self.writer:
+            self.writer.record_hit(key)
+        else:
+            self._write_batch([], {key: 1})
+    
+    def _write_batch(self, ops: List, hits: Dict[int, int]):
+        """Grava um lote de escritas numa única transação"""
+        history_rows = [payload for kind, payload in ops if kind == 'history']
+        cache_entries = [payload for kind, payload in ops if kind == 'cache']
+        invalidated = [payload for kind, payload in ops if kind == 'invalidate']
+        responses = [payload for kind, payload in ops if kind == 'response']
+        sql_results = [payload for kind, payload in ops if kind == 'sql_result']
+        sql_invalidated = [payload for kind, payload in ops if kind == 'sql_invalidate']
+        page_cursors = [payload for kind, payload in ops if kind == 'page_cursor']
+        
+        sql_hits = {key[1]: count for key, count in hits.items() if isinstance(key, tuple)}
+        hits = {key: count for key, count in hits.items() if not isinstance(key, tuple)}
+        
+        # Embeddings calculados fora da transação (chamada de rede não segura o lock de escrita)
+        vectors = [self._embed_question(entry.question) for entry in cache_entries]
+        new_vectors = []
+        evicted_ids = []
+        
+        # Totais do orçamento: deltas só são aplicados após o commit
+        delta = {'entries': 0, 'bytes': 0}
+        
+        with self._totals_lock:
+            with self.storage.transaction() as conn:
                 cursor = conn.cursor()
-                cursor.execute('''
-                    INSERT INTO conversation_history 
-                    (user_id, session_id, question, sql_query, result, metadata)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                ''', (
-                    user_id,
-                    session_id,
-                    question,
-                    sql_query,
-                    json.dumps(result) if result else None,
-                    json.dumps(metadata) if metadata else None
-                ))
-                conn.commit()
                 
-                # 🆕 Também salva no cache se tiver resultado válido
-                if sql_query and result:
-                    self.save_to_cache(question, sql_query, result)
+                if history_rows:
+                    cursor.executemany('''
+                        INSERT INTO conversation_history 
+                        (user_id, session_id, question, sql_query, result, metadata)
+                        VALUES (?, ?, ?, ?, ?, ?)
+                    ''', history_rows)
                 
-                logger.info(f"Interaction saved for user {user_id}")
-        except Exception as e:
-            logger.error(f"Failed to save interaction: {e}")
+                # Invalidações antes dos upserts: um resultado novo da mesma pergunta prevalece
+                if invalidated:
+                    placeholders = ','.join('?' * len(invalidated))
+                    stale = cursor.execute(
+                        f'SELECT id, size_bytes FROM semantic_cache WHERE id IN ({placeholders})',
+                        invalidated
+                    ).fetchall()
+                    self._delete_entries(cursor, stale, delta)
+                    evicted_ids.extend(cache_id for cache_id, _ in stale)
+                
+                for entry, vector in zip(cache_entries, vectors):
+                    cache_id = self._upsert_cache_entry(cursor, entry, vector, delta)
+                    if cache_id is not None:
+                        new_vectors.append((cache_id, vector))
+                
+                for response in responses:
+                    self._attach_response(cursor, response, delta)
+                
+                if hits:
+                    cursor.executemany('''
+                        UPDATE semantic_cache
+                        SET hit_count = hit_count + ?,
+                            last_used = CURRENT_TIMESTAMP
+                        WHERE id = ?
+                    ''', [(count, cache_id) for cache_id, count in hits.items()])
+                
+                if cache_entries:
+                    evicted_ids.extend(self._enforce_budget(cursor, delta))
+                
+                if sql_results or sql_invalidated or sql_hits:
+                    self._write_sql_results(cursor, sql_results, sql_invalidated, sql_hits)
+                
+                if page_cursors:
+                    self._write_page_cursors(cursor, page_cursors)
+            
+            self._entry_count += delta['entries']
+            self._total_bytes += delta['bytes']
+        
+        for cache_id, vector in new_vectors:
+            self.vector_index.add(cache_id, vector)
+        
+        if evicted_ids:
+            self.vector_index.remove(evicted_ids)
+            if self.vector_index.needs_rebuild():
+                self.vector_index.reset()
+                self._load_vector_index()
+    
+    def _write_sql_results(self, cursor, sql_results: List, sql_invalidated: List[str],
+                           sql_hits: Dict[str, int]):
+        if sql_invalidated:
+            cursor.executemany(
+                'DELETE FROM sql_result_cache WHERE fingerprint = ?',
+                [(key,) for key in sql_invalidated]
+            )
+        
+        if sql_results:
+            cursor.executemany('''
+                INSERT INTO sql_result_cache
+                (fingerprint, sql_query, result, table_versions, expires_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(fingerprint) DO UPDATE SET
+                    result = excluded.result,
+                    table_versions = excluded.table_versions,
+                    expires_at = excluded.expires_at,
+                    last_used = CURRENT_TIMESTAMP
+            ''', [
+                (key, sql_query, json.dumps(result, default=json_default), json.dumps(versions) if versions else None, expiry)
+                for key, sql_query, result, versions, expiry in sql_results
+            ])
+        
+        if sql_hits:
+            cursor.executemany('''
+                UPDATE sql_result_cache
+                SET hit_count = hit_count + ?,
+                    last_used = CURRENT_TIMESTAMP
+                WHERE fingerprint = ?
+            ''', [(count, key) for key, count in sql_hits.items()])
+        
+        if not sql_results:
+            return
+        
+        cursor.execute('''
+            DELETE FROM sql_result_cache
+            WHERE fingerprint IN (
+                SELECT fingerprint FROM sql_result_cache
+                WHERE expires_at IS NOT NULL AND expires_at <= ?
+                LIMIT ?
+            )
+        ''', (time.time(), self.EXPIRED_PURGE_BATCH))
+        
+        # Tabela pequena (limitada); COUNT usa o índice da PK
+        count = cursor.execute('SELECT COUNT(*) FROM sql_result_cache').fetchone()[0]
+        excess = count - self.SQL_RESULT_MAX_ENTRIES
+        if excess > 0:
+            cursor.execute('''
+                DELETE FROM sql_result_cache
+                WHERE fingerprint IN (
+                    SELECT fingerprint FROM sql_result_cache
+                    ORDER BY last_used ASC
+                    LIMIT ?
+                )
+            ''', (excess,))
+    
+    def _write_page_cursors(self, cursor, page_cursors: List):
+        cursor.executemany('''
+            INSERT INTO page_cursors (fingerprint, sql_query, plan, expires_at)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(fingerprint) DO UPDATE SET
+                sql_query = excluded.sql_query,
+                plan = excluded.plan,
+                expires_at = excluded.expires_at
+        ''', [
+            (key, sql_query, json.dumps(plan), expiry)
+            for key, sql_query, plan, expiry in page_cursors
+        ])
+        
+        cursor.execute('''
+            DELETE FROM page_cursors
+            WHERE fingerprint IN (
+                SELECT fingerprint FROM page_cursors
+                WHERE expires_at IS NOT NULL AND expires_at <= ?
+                LIMIT ?
+            )
+        ''', (time.time(), self.EXPIRED_PURGE_BATCH))
+    
+    def _enforce_budget(self, cursor, delta: Dict[str, int]) -> List[int]:
+        """Remove expiradas e, se preciso, vítimas da política (limitado por flush)"""
+        removed = cursor.execute('''
+            SELECT id, size_bytes FROM semantic_cache
+            WHERE expires_at IS NOT NULL AND expires_at <= ?
+            ORDER BY expires_at
+            LIMIT ?
+        ''', (time.time(), self.EXPIRED_PURGE_BATCH)).fetchall()
+        self._delete_entries(cursor, removed, delta)
+        
+        evicted = 0
+        while evicted < self.EVICTION_BATCH:
+            excess_entries = self._entry_count + delta['entries'] - self.max_entries
+            over_bytes = self._total_bytes + delta['bytes'] > self.max_bytes
+            if excess_entries <= 0 and not over_bytes:
+                break
+            
+            count = min(max(excess_entries, 1), self.EVICTION_BATCH - evicted)
+            victims = self.eviction_policy.select_victims(cursor, count)
+            if not victims:
+                break
+            self._delete_entries(cursor, victims, delta)
+            removed.extend(victims)
+            evicted += len(victims)
+        
+        if evicted:
+            logger.info(f"Cache eviction ({self.eviction_policy.name}): {evicted} entries removed")
+        return [cache_id for cache_id, _ in removed]
+    
+    @staticmethod
+    def _delete_entries(cursor, entries: List, delta: Dict[str, int]):
+        if not entries:
+            return
+        # Embeddings saem junto via ON DELETE CASCADE
+        cursor.executemany(
+            'DELETE FROM semantic_cache WHERE id = ?', [(cache_id,) for cache_id, _ in entries]
+        )
+        delta['entries'] -= len(entries)
+        delta['bytes'] -= sum(size or 0 for _, size in entries)
+    
+    @staticmethod
+    def _attach_response(cursor, response: tuple, delta: Dict[str, int]):
+        cache_id, result_version, formatted, evidence = response
+        evidence_json = json.dumps(evidence) if evidence else None
+        extra_bytes = len(formatted) + len(evidence_json or '')
+        
+        # Só grava se o resultado não mudou desde o hit (senão a resposta é de dados antigos)
+        cursor.execute('''
+            UPDATE semantic_cache
+            SET formatted_response = ?, evidence_check = ?, size_bytes = size_bytes + ?
+            WHERE id = ? AND updated_at IS ? AND formatted_response IS NULL
+        ''', (formatted, evidence_json, extra_bytes, cache_id, result_version))
+        
+        if cursor.rowcount:
+            delta['bytes'] += extra_bytes
+    
+    def _upsert_cache_entry(self, cursor, entry: CacheEntry, vector: Optional[np.ndarray],
+                            delta: Optional[Dict[str, int]] = None) -> Optional[int]:
+        """Insert/update em semantic_cache; retorna o id se o embedding for novo"""
+        question_hash = self._hash_question(entry.question)
+        result_json = json.dumps(entry.result, default=json_default)
+        evidence_json = json.dumps(entry.evidence_check) if entry.evidence_check else None
+        size_bytes = (
+            len(entry.question) + len(entry.sql_query) + len(result_json)
+            + len(entry.formatted_response or '') + len(evidence_json or '')
+        )
+        
+        previous = cursor.execute(
+            'SELECT size_bytes FROM semantic_cache WHERE question_hash = ?', (question_hash,)
+        ).fetchone()
+        
+        # Insert or update
+        cursor.execute('''
+            INSERT INTO semantic_cache
+            (question_hash, question, sql_query, result, size_bytes, expires_at, refresh_at,
+             updated_at, formatted_response, evidence_check)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(question_hash) DO UPDATE SET
+                sql_query = excluded.sql_query,
+                result = excluded.result,
+                size_bytes = excluded.size_bytes,
+                expires_at = excluded.expires_at,
+                refresh_at = excluded.refresh_at,
+                updated_at = excluded.updated_at,
+                formatted_response = excluded.formatted_response,
+                evidence_check = excluded.evidence_check,
+                last_used = CURRENT_TIMESTAMP
+        ''', (
+            question_hash,
+            entry.question,
+            entry.sql_query,
+            result_json,
+            size_bytes,
+            expires_at(entry.ttl if entry.ttl is not None else self.default_ttl),
+            expires_at(self.soft_ttl),
+            time.time(),
+            entry.formatted_response,
+            evidence_json
+        ))
+        
+        if delta is not None:
+            delta['entries'] += 0 if previous else 1
+            delta['bytes'] += size_bytes - ((previous[0] or 0) if previous else 0)
+        
+        cache_id = cursor.execute(
+            'SELECT id FROM semantic_cache WHERE question_hash = ?', (question_hash,)
+        ).fetchone()[0]
+        
+        cursor.execute('DELETE FROM semantic_cache_tables WHERE cache_id = ?', (cache_id,))
+        if entry.table_versions:
+            cursor.executemany('''
+                INSERT INTO semantic_cache_tables (cache_id, table_name, version)
+                VALUES (?, ?, ?)
+            ''', [(cache_id, table, version) for table, version in entry.table_versions.items()])
+        
+        is_new_embedding = vector is not None and cursor.execute(
+            'SELECT 1 FROM semantic_cache_embeddings WHERE cache_id = ?', (cache_id,)
+        ).fetchone() is None
+        
+        if not is_new_embedding:
+            return None
+        
+        cursor.execute('''
+            INSERT INTO semantic_cache_embeddings (cache_id, embedding)
+            VALUES (?, ?)
+        ''', (cache_id, vector.astype(np.float32).tobytes()))
+        return cache_id
+    
+    def flush(self):
+        """Força a gravação das escritas pendentes do write-behind"""
+        if self.writer:
+            self.writer.flush()
     
     def get_cache_statistics(self) -> Dict:
         """🆕 Estatísticas do cache"""
+        self.flush()
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self.storage.transaction() as conn:
                 cursor = conn.cursor()
                 
                 cursor.execute('SELECT COUNT(*), SUM(hit_count) FROM semantic_cache')
@@ -186,7 +881,11 @@ class SemanticMemoryCache:
                 return {
                     'total_cached_queries': row[0] or 0,
                     'total_cache_hits': row[1] or 0,
-                    'cache_hit_rate': f"{(row[1] / max(row[0], 1) * 100):.1f}%"
+                    'cache_hit_rate': f"{((row[1] or 0) / max(row[0], 1) * 100):.1f}%",
+                    'cache_bytes': self._total_bytes,
+                    'max_entries': self.max_entries,
+                    'max_bytes': self.max_bytes,
+                    'eviction_policy': self.eviction_policy.name
                 }
         except Exception as e:
             logger.error(f"Failed to get cache stats: {e}")
@@ -195,7 +894,7 @@ class SemanticMemoryCache:
     # Métodos originais mantidos...
     def get_user_history(self, user_id: str, limit: int = 10) -> List[Dict]:
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self.storage.transaction() as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
                     SELECT question, sql_query, result, timestamp
@@ -221,7 +920,7 @@ class SemanticMemoryCache:
     
     def get_session_context(self, user_id: str, session_id: str) -> List[Dict]:
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self.storage.transaction() as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
                     SELECT question, sql_query, result, timestamp
@@ -243,6 +942,45 @@ class SemanticMemoryCache:
         except Exception as e:
             logger.error(f"Failed to retrieve session context: {e}")
             return []
+    
+    def close(self):
+        """Grava o que estiver pendente e fecha as conexões do SQLite"""
+        self.refresher.close()
+        if self.writer:
+            self.writer.close()
+        self.storage.close()
+    
+    # Versões assíncronas: o I/O do SQLite roda em thread separada para
+    # não bloquear o event loop do workflow assíncrono
+    async def acheck_cache(self, question: str) -> Optional[dict]:
+        return await asyncio.to_thread(self.check_cache, question)
+    
+    async def asave_interaction(self, user_id: str, session_id: str,
+                                question: str, sql_query: Optional[str] = None,
+                                result: Optional[Any] = None, metadata: Optional[Dict] = None,
+                                cache_ttl: Optional[float] = None,
+                                formatted_response: Optional[str] = None,
+                                evidence_check: Optional[Dict] = None, cache_result: bool = True,
+                                table_versions: Optional[Dict[str, int]] = None):
+        await asyncio.to_thread(
+            self.save_interaction, user_id, session_id, question, sql_query, result, metadata,
+            cache_ttl, formatted_response, evidence_check, cache_result, table_versions
+        )
+    
+    async def asave_cached_response(self, cache_id: int, result_version: Optional[float],
+                                    formatted_response: str, evidence_check: Optional[Dict] = None):
+        await asyncio.to_thread(
+            self.save_cached_response, cache_id, result_version, formatted_response, evidence_check
+        )
+    
+    async def aget_sql_result(self, sql_query: str) -> Optional[dict]:
+        return await asyncio.to_thread(self.get_sql_result, sql_query)
+    
+    async def asave_sql_result(self, sql_query: str, result: dict, ttl: Optional[float] = None):
+        await asyncio.to_thread(self.save_sql_result, sql_query, result, ttl)
+    
+    async def aget_session_context(self, user_id: str, session_id: str) -> List[Dict]:
+        return await asyncio.to_thread(self.get_session_context, user_id, session_id)
 
 
-memory = SemanticMemoryCache()
\ No newline at end of file
+memory = lazy("memory", SemanticMemoryCache)
\ No newline at end of file
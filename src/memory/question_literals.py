@@ -0,0 +1,52 @@
+from typing import FrozenSet
+import re
+import unicodedata
+
+# Termos que mudam o filtro da query sem mudar o embedding da pergunta
+TEMPORAL_TERMS = {
+    'janeiro', 'fevereiro', 'marco', 'abril', 'maio', 'junho', 'julho',
+    'agosto', 'setembro', 'outubro', 'novembro', 'dezembro',
+    'segunda', 'terca', 'quarta', 'quinta', 'sexta', 'sabado', 'domingo',
+    'hoje', 'ontem', 'anteontem', 'amanha', 'atual', 'corrente',
+    'passado', 'passada', 'ultimo', 'ultima', 'ultimos', 'ultimas',
+    'proximo', 'proxima', 'anterior',
+    'dia', 'semana', 'mes', 'bimestre', 'trimestre', 'semestre', 'ano',
+}
+
+_QUOTED = re.compile(r'"([^"]+)"|\'([^\']+)\'')
+_NUMBER = re.compile(r'\d+(?:[.,/:-]\d+)*')
+_WORD = re.compile(r'[^\W\d_]+')
+
+
+def _fold(text: str) -> str:
+    """Minúsculas e sem acento ("Março" == "marco")"""
+    decomposed = unicodedata.normalize('NFKD', text.lower())
+    return ''.join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def extract_literals(question: str) -> FrozenSet[str]:
+    """Valores da pergunta que viram filtro na SQL
+    
+    Trechos entre aspas, números e datas, termos de período (meses, dias,
+    "último", "ano"...) e nomes próprios (palavra com maiúscula fora do
+    início da frase). Duas perguntas só compartilham resultado por
+    similaridade se esses conjuntos forem iguais.
+    """
+    literals = set()
+    
+    for double, single in _QUOTED.findall(question):
+        literals.add('"' + _fold(double or single).strip() + '"')
+    unquoted = _QUOTED.sub(' ', question)
+    
+    literals.update(_NUMBER.findall(unquoted))
+    
+    for sentence in re.split(r'[.!?]+', unquoted):
+        for position, match in enumerate(_WORD.finditer(sentence)):
+            word = match.group()
+            folded = _fold(word)
+            if folded in TEMPORAL_TERMS:
+                literals.add(folded)
+            elif position > 0 and word[0].isupper():
+                literals.add(folded)
+    
+    return frozenset(literals)
@@ -0,0 +1,60 @@
+from typing import Callable, Hashable
+from concurrent.futures import ThreadPoolExecutor, wait
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundRefresher:
+    """Executa refreshes de entradas do cache em background (stale-while-revalidate)
+    
+    Um refresh por chave: enquanto uma chave está em andamento, novos
+    pedidos para ela são descartados. O pool é criado no primeiro uso.
+    """
+    
+    MAX_WORKERS = 2
+    
+    def __init__(self, name: str = "cache-refresh"):
+        self._name = name
+        self._pool = None
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self._closed = False
+    
+    def schedule(self, key: Hashable, job: Callable[[], None]) -> bool:
+        """Agenda job para a chave; False se já houver um refresh em andamento"""
+        with self._lock:
+            if self._closed or key in self._in_flight:
+                return False
+            
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(
+                    max_workers=self.MAX_WORKERS, thread_name_prefix=self._name
+                )
+            future = self._pool.submit(self._run, key, job)
+            self._in_flight[key] = future
+            return True
+    
+    def _run(self, key: Hashable, job: Callable[[], None]):
+        try:
+            job()
+        except Exception as e:
+            logger.warning(f"Background refresh failed for {key}: {e}")
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+    
+    def wait(self, timeout: float = 30.0):
+        """Bloqueia até os refreshes em andamento terminarem"""
+        with self._lock:
+            futures = list(self._in_flight.values())
+        wait(futures, timeout=timeout)
+    
+    def close(self):
+        with self._lock:
+            self._closed = True
+            pool, self._pool = self._pool, None
+        
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,201 @@
+from typing import TYPE_CHECKING, Any, List, NamedTuple, Optional, Sequence, Tuple
+from src.database.columnar import ColumnarResult
+from decimal import Decimal
+import numpy as np
+import os
+import time
+import uuid
+import logging
+
+if TYPE_CHECKING:
+    import pyarrow as pa
+
+logger = logging.getLogger(__name__)
+
+
+class SpillHandle(NamedTuple):
+    """Referência a um resultado gravado em disco (Arrow IPC, formato file)"""
+    path: str
+    columns: List[str]
+    row_count: int
+    size_bytes: int
+    format: str = "arrow"
+    
+    @property
+    def spill_id(self) -> str:
+        """Nome do arquivo sem diretório nem extensão (o que vai para o usuário)"""
+        return os.path.splitext(os.path.basename(self.path))[0]
+    
+    def to_dict(self) -> dict:
+        return self._asdict()
+    
+    @classmethod
+    def from_dict(cls, data: dict) -> "SpillHandle":
+        return cls(data['path'], list(data['columns']), data['row_count'],
+                   data['size_bytes'], data.get('format', 'arrow'))
+
+
+class SpillWriter:
+    """Grava batches de linhas num arquivo Arrow IPC, um record batch por vez
+    
+    O schema sai do primeiro batch (Decimal vira float64, mesmo tipo do
+    ColumnarResult; coluna só com NULL fica com tipo null). Batch seguinte
+    com tipo mais largo (null -> int, int -> float) alarga o schema: o que
+    já foi gravado é relido e regravado com o tipo novo. Acontece no máximo
+    poucas vezes por coluna, quase sempre logo no segundo batch.
+    """
+    
+    def __init__(self, path: str, columns: Sequence[str]):
+        self.path = path
+        self.columns = list(columns)
+        self.row_count = 0
+        self._schema = None
+        self._sink = None
+        self._writer = None
+    
+    def write(self, rows: Sequence[tuple]):
+        if not rows:
+            return
+        import pyarrow as pa
+        
+        values_by_column = [_plain(values) for values in zip(*rows)]
+        batch_schema = pa.schema([
+            pa.field(name, pa.array(values).type)
+            for name, values in zip(self.columns, values_by_column)
+        ])
+        if self._writer is None:
+            self._open(pa, batch_schema)
+        else:
+            schema = pa.unify_schemas([self._schema, batch_schema], promote_options="permissive")
+            if not schema.equals(self._schema):
+                self._widen(pa, schema)
+        
+        arrays = [
+            pa.array(values, type=field.type)
+            for values, field in zip(values_by_column, self._schema)
+        ]
+        self._writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=self._schema))
+        self.row_count += len(rows)
+    
+    def close(self) -> SpillHandle:
+        if self._writer is None:
+            import pyarrow as pa
+            self._open(pa, pa.schema([pa.field(name, pa.null()) for name in self.columns]))
+        self._writer.close()
+        self._sink.close()
+        return SpillHandle(self.path, self.columns, self.row_count, os.path.getsize(self.path))
+    
+    def abort(self):
+        """Descarta o arquivo parcial (erro no meio do streaming)"""
+        try:
+            if self._writer is not None:
+                self._writer.close()
+                self._sink.close()
+        finally:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+    
+    def _open(self, pa, schema: "pa.Schema"):
+        self._schema = schema
+        self._sink = pa.OSFile(self.path, "wb")
+        self._writer = pa.ipc.new_file(self._sink, self._schema)
+    
+    def _widen(self, pa, schema: "pa.Schema"):
+        logger.info(f"Widening spill schema to {schema.types}")
+        self._writer.close()
+        self._sink.close()
+        # Leitura sem mmap: o arquivo é reaberto para escrita logo abaixo
+        with pa.OSFile(self.path, "rb") as source:
+            written = pa.ipc.open_file(source).read_all().cast(schema)
+        
+        self._open(pa, schema)
+        for batch in written.to_batches():
+            self._writer.write_batch(batch)
+
+
+def _plain(values: Tuple[Any, ...]) -> list:
+    return [float(v) if isinstance(v, Decimal) else v for v in values]
+
+
+class SpillStore:
+    """Diretório dos arquivos de spill: um arquivo por execução, removido após o TTL
+    
+    O TTL acompanha o do cache semântico (DEFAULT_TTL): cache e histórico
+    guardam só o handle, então o arquivo precisa viver tanto quanto a entrada.
+    """
+    
+    TTL = 24 * 3600
+    
+    def __init__(self, directory: str, ttl: Optional[float] = None):
+        # pyarrow é opcional: sem ele, falha aqui (na criação) e não no meio de uma query
+        import pyarrow
+        
+        self.directory = directory
+        self.ttl = ttl if ttl is not None else self.TTL
+        os.makedirs(directory, exist_ok=True)
+    
+    def writer(self, columns: Sequence[str]) -> SpillWriter:
+        self.purge()
+        path = os.path.join(self.directory, f"{uuid.uuid4().hex}.arrow")
+        return SpillWriter(path, columns)
+    
+    def purge(self) -> int:
+        """Remove arquivos mais velhos que o TTL"""
+        cutoff = time.time() - self.ttl
+        removed = 0
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".arrow") and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+                removed += 1
+        if removed:
+            logger.info(f"Purged {removed} expired spill files")
+        return removed
+
+
+def open_spill(handle: SpillHandle) -> "pa.Table":
+    """Tabela Arrow sobre o arquivo memory-mapped (os buffers não são copiados)"""
+    import pyarrow as pa
+    
+    source = pa.memory_map(handle.path, "r")
+    return pa.ipc.open_file(source).read_all()
+
+
+def columnar_from_arrow(table: "pa.Table") -> ColumnarResult:
+    """Tabela Arrow -> ColumnarResult
+    
+    Números viram arrays NumPy direto dos buffers Arrow (só há cópia para juntar
+    record batches); texto, datas e inteiros com NULL viram arrays de objetos.
+    """
+    import pyarrow as pa
+    
+    arrays, nulls = [], {}
+    for index, column in enumerate(table.columns):
+        data_type = column.type
+        if (pa.types.is_integer(data_type) or pa.types.is_floating(data_type)) and column.null_count == 0:
+            arrays.append(column.to_numpy())
+        elif pa.types.is_floating(data_type):
+            arrays.append(column.to_numpy())   # NULL vira NaN
+            nulls[index] = column.is_null().to_numpy()
+        else:
+            array = np.empty(len(column), dtype=object)
+            array[:] = column.to_pylist()
+            arrays.append(array)
+    return ColumnarResult(table.column_names, arrays, nulls)
+
+
+def read_preview(handle: SpillHandle, max_rows: int) -> ColumnarResult:
+    return columnar_from_arrow(open_spill(handle).slice(0, max_rows))
+
+
+def stored_result(result: dict) -> Any:
+    """O que cache e histórico guardam: o handle do spill (nunca as linhas) ou os dados"""
+    if result.get('spill'):
+        return {'spill': result['spill']}
+    return result.get('data')
+
+
+def load_result(stored: Any, max_rows: int = 1000) -> ColumnarResult:
+    """Inverso de stored_result: registros ou prévia lida do arquivo (mmap)"""
+    if isinstance(stored, dict) and 'spill' in stored:
+        return read_preview(SpillHandle.from_dict(stored['spill']), max_rows)
+    return ColumnarResult.from_records(stored or [])
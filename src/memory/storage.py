@@ -0,0 +1,73 @@
+from contextlib import contextmanager
+import sqlite3
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class SQLiteStorage:
+    """Camada de conexão do SQLite da memória
+    
+    - Uma conexão persistente por thread (sqlite3 não compartilha conexões
+      entre threads com segurança)
+    - WAL: leitores não bloqueiam o escritor e vice-versa
+    - synchronous=NORMAL: em WAL, fsync só no checkpoint
+    - Cache de prepared statements do sqlite3 (mesmo texto SQL = reuso)
+    """
+    
+    JOURNAL_MODE = "WAL"
+    SYNCHRONOUS = "NORMAL"
+    CACHE_SIZE_KB = 16384
+    BUSY_TIMEOUT_MS = 5000
+    STATEMENT_CACHE_SIZE = 256
+    
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+    
+    def connection(self) -> sqlite3.Connection:
+        """Conexão da thread atual (criada e configurada no primeiro uso)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+    
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.BUSY_TIMEOUT_MS / 1000,
+            cached_statements=self.STATEMENT_CACHE_SIZE,
+            # Cada conexão só é usada pela sua thread; a flag permite
+            # que close() feche todas a partir da thread de shutdown
+            check_same_thread=False
+        )
+        conn.execute(f"PRAGMA journal_mode = {self.JOURNAL_MODE}")
+        conn.execute(f"PRAGMA synchronous = {self.SYNCHRONOUS}")
+        conn.execute(f"PRAGMA cache_size = -{self.CACHE_SIZE_KB}")
+        conn.execute(f"PRAGMA busy_timeout = {self.BUSY_TIMEOUT_MS}")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        conn.execute("PRAGMA foreign_keys = ON")
+        return conn
+    
+    @contextmanager
+    def transaction(self):
+        """Commit ao final do bloco, rollback em caso de erro"""
+        conn = self.connection()
+        with conn:
+            yield conn
+    
+    def close(self):
+        """Fecha todas as conexões abertas (shutdown do processo)"""
+        with self._lock:
+            connections, self._connections = self._connections, []
+        
+        for conn in connections:
+            conn.close()
+        
+        self._local = threading.local()
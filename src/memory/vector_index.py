@@ -0,0 +1,92 @@
+from typing import Iterable, Optional, Tuple
+import faiss
+import numpy as np
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class QuestionVectorIndex:
+    """Índice ANN (FAISS HNSW) sobre embeddings das perguntas cacheadas
+    
+    Os vetores são normalizados, então o inner product equivale à
+    similaridade de cosseno. Os ids do índice são os ids de semantic_cache.
+    """
+    
+    HNSW_M = 32
+    EF_CONSTRUCTION = 80
+    EF_SEARCH = 64
+    SEARCH_K = 4
+    MAX_SEARCH_K = 64
+    
+    # HNSW não suporta remoção: ids removidos viram "tombstones" ignorados na
+    # busca; acima desta fração o dono do índice deve reconstruí-lo
+    REBUILD_TOMBSTONE_RATIO = 0.25
+    
+    def __init__(self):
+        self._index = None
+        self._dimension = None
+        self._removed = set()
+        self._lock = threading.Lock()
+    
+    def __len__(self) -> int:
+        total = self._index.ntotal if self._index is not None else 0
+        return total - len(self._removed)
+    
+    @staticmethod
+    def normalize(vector: Iterable[float]) -> np.ndarray:
+        array = np.asarray(vector, dtype=np.float32).reshape(-1)
+        norm = np.linalg.norm(array)
+        return array / norm if norm > 0 else array
+    
+    def _create_index(self, dimension: int):
+        hnsw = faiss.IndexHNSWFlat(dimension, self.HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        hnsw.hnsw.efConstruction = self.EF_CONSTRUCTION
+        hnsw.hnsw.efSearch = self.EF_SEARCH
+        self._index = faiss.IndexIDMap(hnsw)
+        self._dimension = dimension
+    
+    def add(self, cache_id: int, vector: np.ndarray):
+        vector = self.normalize(vector)
+        with self._lock:
+            if self._index is None:
+                self._create_index(vector.shape[0])
+            elif vector.shape[0] != self._dimension:
+                logger.warning(
+                    f"Embedding dimension mismatch ({vector.shape[0]} != {self._dimension}), skipping"
+                )
+                return
+            self._index.add_with_ids(vector.reshape(1, -1), np.array([cache_id], dtype=np.int64))
+    
+    def remove(self, cache_ids: Iterable[int]):
+        with self._lock:
+            self._removed.update(int(cache_id) for cache_id in cache_ids)
+    
+    def needs_rebuild(self) -> bool:
+        if self._index is None or self._index.ntotal == 0:
+            return False
+        return len(self._removed) > self._index.ntotal * self.REBUILD_TOMBSTONE_RATIO
+    
+    def reset(self):
+        with self._lock:
+            self._index = None
+            self._dimension = None
+            self._removed = set()
+    
+    def search(self, vector: np.ndarray) -> Optional[Tuple[int, float]]:
+        """Retorna (cache_id, similaridade) do vizinho mais próximo"""
+        vector = self.normalize(vector)
+        with self._lock:
+            if self._index is None or self._index.ntotal == 0:
+                return None
+            if vector.shape[0] != self._dimension:
+                return None
+            k = min(self.SEARCH_K + len(self._removed), self.MAX_SEARCH_K, self._index.ntotal)
+            scores, ids = self._index.search(vector.reshape(1, -1), k)
+            removed = self._removed
+        
+        for cache_id, score in zip(ids[0], scores[0]):
+            if cache_id >= 0 and int(cache_id) not in removed:
+                return int(cache_id), float(score)
+        return None
@@ -0,0 +1,112 @@
+from typing import Any, Callable, Dict, Hashable, List, Tuple
+import queue
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+FlushFn = Callable[[List[Tuple[str, Any]], Dict[Hashable, int]], None]
+
+
+class WriteBehindWriter:
+    """Escritor em background para a memória (write-behind)
+    
+    As escritas entram numa fila limitada e uma thread dedicada as grava em
+    lotes, numa única transação por lote. Hits de cache não entram na fila:
+    são agregados em memória (chave -> incremento) e aplicados no próximo
+    flush. Se a fila encher, a escrita é feita de forma síncrona no
+    chamador (backpressure sem perda de dados).
+    """
+    
+    MAX_QUEUE_SIZE = 10000
+    BATCH_SIZE = 500
+    FLUSH_INTERVAL = 0.2
+    PUT_TIMEOUT = 0.05
+    
+    _FLUSH = "__flush__"
+    
+    def __init__(self, flush_fn: FlushFn, name: str = "memory-write-behind"):
+        self._flush_fn = flush_fn
+        self._queue = queue.Queue(maxsize=self.MAX_QUEUE_SIZE)
+        self._hits: Dict[Hashable, int] = {}
+        self._hits_lock = threading.Lock()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+    
+    def submit(self, kind: str, payload: Any):
+        """Enfileira uma escrita (retorna sem esperar o SQLite)"""
+        if self._closed:
+            self._flush_fn([(kind, payload)], {})
+            return
+        
+        try:
+            self._queue.put((kind, payload), timeout=self.PUT_TIMEOUT)
+        except queue.Full:
+            logger.warning("Write-behind queue full, writing synchronously")
+            self._flush_fn([(kind, payload)], {})
+    
+    def record_hit(self, key: Hashable):
+        with self._hits_lock:
+            self._hits[key] = self._hits.get(key, 0) + 1
+    
+    def flush(self, timeout: float = 10.0) -> bool:
+        """Bloqueia até tudo que foi enfileirado antes da chamada ser gravado"""
+        if self._closed:
+            return True
+        
+        done = threading.Event()
+        self._queue.put((self._FLUSH, done))
+        return done.wait(timeout)
+    
+    def close(self):
+        """Grava o que estiver pendente e encerra a thread"""
+        if self._closed:
+            return
+        
+        self.flush()
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+    
+    def _take_hits(self) -> Dict[Hashable, int]:
+        with self._hits_lock:
+            hits, self._hits = self._hits, {}
+        return hits
+    
+    def _run(self):
+        while True:
+            try:
+                item = self._queue.get(timeout=self.FLUSH_INTERVAL)
+            except queue.Empty:
+                item = False
+            
+            if item is None:
+                return
+            
+            batch, waiters = [], []
+            while item:
+                kind, payload = item
+                if kind == self._FLUSH:
+                    waiters.append(payload)
+                    break
+                batch.append(item)
+                if len(batch) >= self.BATCH_SIZE:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    item = False
+            
+            hits = self._take_hits()
+            if batch or hits:
+                try:
+                    self._flush_fn(batch, hits)
+                except Exception as e:
+                    logger.error(f"Write-behind flush failed ({len(batch)} ops): {e}")
+            
+            for waiter in waiters:
+                waiter.set()
+            
+            if item is None:
+                return
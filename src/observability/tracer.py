@@ -3,6 +3,7 @@ from opentelemetry import trace
 from opentelemetry.sdk.trace import TracerProvider
 from opentelemetry.sdk.trace.export import SimpleSpanProcessor, ConsoleSpanExporter
 from opentelemetry.sdk.resources import Resource
+from src.config.registry import lazy
 import logging
 from datetime import datetime
 from typing import Dict, Any, Optional
@@ -10,26 +11,22 @@ import json
 
 logger = logging.getLogger(__name__)
 
-# Configuração do provedor de trace com identificação do serviço
-trace.set_tracer_provider(
-    TracerProvider(
+
+def _configure_provider():
+    """Provedor de trace com identificação do serviço + exportador para console"""
+    provider = TracerProvider(
         resource=Resource.create({"service.name": "sql-agent"})
     )
-)
-
-# Cria o tracer global
-tracer = trace.get_tracer(__name__)
-
-# Exportador para console (exibe spans no terminal)
-console_exporter = ConsoleSpanExporter()
-span_processor = SimpleSpanProcessor(console_exporter)
-trace.get_tracer_provider().add_span_processor(span_processor)
+    # Exportador para console (exibe spans no terminal)
+    provider.add_span_processor(SimpleSpanProcessor(ConsoleSpanExporter()))
+    trace.set_tracer_provider(provider)
 
 
 class ObservabilityTracer:
     """Classe para observabilidade e logging estruturado"""
     def __init__(self):
-        self.tracer = tracer
+        _configure_provider()
+        self.tracer = trace.get_tracer(__name__)
         self.logs = []
 
     def start_span(self, name: str, attributes: Optional[Dict[str, Any]] = None):
@@ -61,4 +58,4 @@ class ObservabilityTracer:
         self.logs = []
 
 
-tracer = ObservabilityTracer()
+tracer = lazy("tracer", ObservabilityTracer)
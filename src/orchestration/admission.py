@@ -0,0 +1,196 @@
+from typing import Deque, Dict, NamedTuple, Optional, Tuple
+from collections import deque
+from src.config.registry import lazy
+from src.orchestration.mcp_context import MCPContext
+import itertools
+import threading
+import asyncio
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class AdmissionDecision(NamedTuple):
+    admitted: bool
+    reason: str = ""
+    ticket: Optional[int] = None
+    waited_ms: float = 0.0
+
+
+class AdmissionController:
+    """Controle de admissão entre o validator e o executor
+    
+    O custo estimado pelo validator (estimated_cost) vira unidades de custo.
+    Queries caras (EXPENSIVE_LEVELS) disputam MAX_EXPENSIVE vagas globais: sem
+    vaga, esperam até QUEUE_TIMEOUT segundos na fila (no máximo MAX_QUEUED
+    esperando) e depois são rejeitadas. Cada user_id tem USER_BUDGET unidades
+    por janela deslizante de BUDGET_WINDOW segundos. Queries baratas nunca
+    esperam vaga, então usuários interativos não ficam atrás das análises.
+    Hit no cache de SQL é servido antes da admissão (admit_query). A vaga é
+    devolvida pelo execute_query (release); se a SQL entrou no cache enquanto
+    esperava, as unidades cobradas também voltam.
+    """
+    
+    COST_UNITS = {"low": 1, "medium": 5, "high": 25, "very_high": 100}
+    EXPENSIVE_LEVELS = ("high", "very_high")
+    MAX_EXPENSIVE = 2
+    MAX_QUEUED = 8
+    QUEUE_TIMEOUT = 10.0
+    USER_BUDGET = 300
+    BUDGET_WINDOW = 60.0
+    
+    def __init__(self, max_expensive: Optional[int] = None, max_queued: Optional[int] = None,
+                 queue_timeout: Optional[float] = None, user_budget: Optional[int] = None,
+                 budget_window: Optional[float] = None, enabled: bool = True):
+        self.enabled = enabled
+        self.max_expensive = max_expensive if max_expensive is not None else self.MAX_EXPENSIVE
+        self.max_queued = max_queued if max_queued is not None else self.MAX_QUEUED
+        self.queue_timeout = queue_timeout if queue_timeout is not None else self.QUEUE_TIMEOUT
+        self.user_budget = user_budget if user_budget is not None else self.USER_BUDGET
+        self.budget_window = budget_window if budget_window is not None else self.BUDGET_WINDOW
+        
+        self._slots = threading.Condition()
+        self._running = 0
+        self._waiting = 0
+        self._lock = threading.Lock()
+        self._spent: Dict[str, Deque[Tuple[float, int, int]]] = {}   # user -> (ts, ticket, unidades)
+        self._tickets: Dict[int, Tuple[str, bool]] = {}               # ticket -> (user, tem vaga)
+        self._ids = itertools.count(1)
+    
+    def cost_units(self, validation_result: Optional[dict]) -> int:
+        level = (validation_result or {}).get('estimated_cost', 'low')
+        return self.COST_UNITS.get(level, self.COST_UNITS["very_high"])
+    
+    def is_expensive(self, validation_result: Optional[dict]) -> bool:
+        return (validation_result or {}).get('estimated_cost') in self.EXPENSIVE_LEVELS
+    
+    def spent(self, user_id: str) -> int:
+        with self._lock:
+            return sum(units for _, _, units in self._window(user_id))
+    
+    def running(self) -> int:
+        with self._slots:
+            return self._running
+    
+    def _window(self, user_id: str) -> Deque[Tuple[float, int, int]]:
+        """Gastos do usuário dentro da janela (chamar com _lock)"""
+        entries = self._spent.setdefault(user_id, deque())
+        cutoff = time.monotonic() - self.budget_window
+        while entries and entries[0][0] < cutoff:
+            entries.popleft()
+        return entries
+    
+    def _charge(self, user_id: str, units: int) -> Tuple[Optional[int], str]:
+        with self._lock:
+            entries = self._window(user_id)
+            used = sum(u for _, _, u in entries)
+            if used + units > self.user_budget:
+                retry_in = entries[0][0] + self.budget_window - time.monotonic() if entries else 0.0
+                return None, (
+                    f"Orçamento de custo esgotado para '{user_id}' "
+                    f"({used}/{self.user_budget} unidades em {self.budget_window:.0f}s). "
+                    f"Tente novamente em {max(retry_in, 0):.0f}s."
+                )
+            ticket = next(self._ids)
+            entries.append((time.monotonic(), ticket, units))
+            self._tickets[ticket] = (user_id, False)
+            return ticket, ""
+    
+    def _refund(self, ticket: int):
+        with self._lock:
+            user_id, _ = self._tickets.get(ticket, (None, False))
+            entries = self._spent.get(user_id)
+            if entries:
+                self._spent[user_id] = deque(e for e in entries if e[1] != ticket)
+    
+    def _acquire_slot(self) -> bool:
+        with self._slots:
+            if self._running >= self.max_expensive and self._waiting >= self.max_queued:
+                return False
+            self._waiting += 1
+            try:
+                admitted = self._slots.wait_for(
+                    lambda: self._running < self.max_expensive, timeout=self.queue_timeout
+                )
+                if admitted:
+                    self._running += 1
+                return admitted
+            finally:
+                self._waiting -= 1
+    
+    def admit(self, user_id: str, validation_result: Optional[dict]) -> AdmissionDecision:
+        if not self.enabled:
+            return AdmissionDecision(True)
+        units = self.cost_units(validation_result)
+        ticket, reason = self._charge(user_id, units)
+        if ticket is None:
+            return AdmissionDecision(False, reason)
+        if not self.is_expensive(validation_result):
+            return AdmissionDecision(True, ticket=ticket)
+        
+        start = time.monotonic()
+        if not self._acquire_slot():
+            self.release(ticket, refund=True)
+            return AdmissionDecision(False, (
+                f"Servidor ocupado com queries caras ({self.max_expensive} em execução). "
+                f"Refine a pergunta ou tente novamente."
+            ))
+        with self._lock:
+            self._tickets[ticket] = (user_id, True)
+        return AdmissionDecision(True, ticket=ticket, waited_ms=(time.monotonic() - start) * 1000)
+    
+    async def aadmit(self, user_id: str, validation_result: Optional[dict]) -> AdmissionDecision:
+        """Mesma fila do admit (vagas globais), esperando fora do event loop"""
+        if not self.enabled or not self.is_expensive(validation_result):
+            return self.admit(user_id, validation_result)
+        return await asyncio.to_thread(self.admit, user_id, validation_result)
+    
+    def release(self, ticket: Optional[int], refund: bool = False):
+        """Devolve a vaga (e as unidades, se refund) de um ticket; idempotente"""
+        if ticket is None:
+            return
+        if refund:
+            self._refund(ticket)
+        with self._lock:
+            _, holds_slot = self._tickets.pop(ticket, (None, False))
+        if holds_slot:
+            with self._slots:
+                self._running -= 1
+                self._slots.notify()
+    
+    def record(self, context: MCPContext, decision: AdmissionDecision):
+        """Registra a decisão no contexto (metadata serializável)"""
+        context.metadata['admission'] = {
+            'admitted': decision.admitted,
+            'ticket': decision.ticket,
+            'waited_ms': round(decision.waited_ms, 1),
+            'cost_units': self.cost_units(context.validation_result),
+        }
+        if not decision.admitted:
+            logger.warning(f"Query rejected by admission control: {decision.reason}")
+            context.add_error("admission_control", decision.reason)
+            context.execution_result = {'success': False, 'error': decision.reason, 'data': []}
+        elif decision.waited_ms >= 1:
+            logger.info(f"Expensive query admitted after {decision.waited_ms:.0f} ms in queue")
+    
+    def release_for(self, context: MCPContext):
+        """Chamado pelo execute_query ao terminar (sucesso ou erro)"""
+        admission = context.metadata.get('admission') or {}
+        self.release(admission.get('ticket'), refund=bool(context.metadata.get('sql_cache_hit')))
+        admission['ticket'] = None
+
+
+def _create_admission_controller() -> AdmissionController:
+    from src.config.settings import settings
+    
+    return AdmissionController(
+        enabled=settings.admission_enabled,
+        max_expensive=settings.admission_max_expensive,
+        queue_timeout=settings.admission_queue_timeout,
+        user_budget=settings.admission_user_budget,
+        budget_window=settings.admission_budget_window,
+    )
+
+
+admission_controller = lazy("admission_controller", _create_admission_controller)
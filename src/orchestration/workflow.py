@@ -98,6 +98,7 @@ def format_response_node(state: AgentState) -> AgentState:
                 sql_query=state["context"].generated_sql,
                 result=state["context"].execution_result,
                 metadata=state["context"].metadata,
+                table_versions=(state["context"].execution_result or {}).get("table_versions"),
             )
         except Exception as e:
             tracer.log_error("format_response", e)
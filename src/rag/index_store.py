@@ -0,0 +1,100 @@
+from typing import List
+from pathlib import Path
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from langchain.docstore.document import Document
+import faiss
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import logging
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILE = "index.faiss"
+DOCS_FILE = "documents.json"
+
+
+def documents_hash(documents: List[Document], embeddings) -> str:
+    """Hash do conteúdo dos documentos + modelo de embeddings (chave do índice)"""
+    payload = json.dumps({
+        "model": getattr(embeddings, "model", type(embeddings).__name__),
+        "documents": [[doc.page_content, doc.metadata] for doc in documents],
+    }, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def load_or_build_index(documents: List[Document], embeddings, index_dir: str, name: str) -> FAISS:
+    """Carrega o índice FAISS do disco (mmap) ou o constrói e salva
+    
+    O diretório leva o hash dos documentos: mudou o conteúdo, muda o
+    diretório e o índice é reconstruído (uma única vez, por todos os workers).
+    """
+    path = Path(index_dir) / f"{name}-{documents_hash(documents, embeddings)[:16]}"
+    
+    if (path / INDEX_FILE).exists():
+        try:
+            vectorstore = _load(path, embeddings)
+            logger.info(f"Schema index loaded from {path}")
+            return vectorstore
+        except Exception as e:
+            logger.warning(f"Failed to load schema index {path}, rebuilding: {e}")
+    
+    vectorstore = FAISS.from_documents(documents, embeddings)
+    try:
+        _save(vectorstore, path)
+        _remove_stale(path, name)
+    except OSError as e:
+        logger.warning(f"Failed to persist schema index: {e}")
+    return vectorstore
+
+
+def _load(path: Path, embeddings) -> FAISS:
+    try:
+        index = faiss.read_index(str(path / INDEX_FILE), faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+    except RuntimeError:
+        # Tipos de índice sem suporte a mmap: leitura normal
+        index = faiss.read_index(str(path / INDEX_FILE))
+    
+    with open(path / DOCS_FILE, encoding="utf-8") as f:
+        stored = json.load(f)
+    
+    docstore = InMemoryDocstore({
+        doc_id: Document(page_content=doc["page_content"], metadata=doc["metadata"])
+        for doc_id, doc in stored["documents"].items()
+    })
+    index_to_docstore_id = {int(position): doc_id for position, doc_id in stored["ids"].items()}
+    return FAISS(embeddings, index, docstore, index_to_docstore_id)
+
+
+def _save(vectorstore: FAISS, path: Path):
+    """Grava num diretório temporário e renomeia (workers concorrentes não veem índice parcial)"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_dir = Path(tempfile.mkdtemp(prefix=f".{path.name}-", dir=path.parent))
+    
+    try:
+        faiss.write_index(vectorstore.index, str(tmp_dir / INDEX_FILE))
+        with open(tmp_dir / DOCS_FILE, "w", encoding="utf-8") as f:
+            json.dump({
+                "ids": {str(position): doc_id for position, doc_id in vectorstore.index_to_docstore_id.items()},
+                "documents": {
+                    doc_id: {"page_content": doc.page_content, "metadata": doc.metadata}
+                    for doc_id, doc in vectorstore.docstore._dict.items()
+                },
+            }, f, ensure_ascii=False)
+        os.replace(tmp_dir, path)
+        logger.info(f"Schema index saved to {path}")
+    except OSError:
+        # Outro worker salvou o mesmo índice primeiro
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        if not (path / INDEX_FILE).exists():
+            raise
+
+
+def _remove_stale(current: Path, name: str):
+    for old in current.parent.glob(f"{name}-*"):
+        digest = old.name[len(name) + 1:]
+        if old != current and old.is_dir() and len(digest) == 16:
+            shutil.rmtree(old, ignore_errors=True)
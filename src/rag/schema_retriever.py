@@ -1,14 +1,25 @@
-from typing import List, Dict, Optional
-from langchain_community.vectorstores import FAISS
-from langchain_openai import OpenAIEmbeddings
-from langchain.docstore.document import Document
+from typing import TYPE_CHECKING, List, Dict, Optional
+from src.config.registry import lazy
 from src.config.settings import settings
+from src.database.column_statistics import column_statistics
+from src.database.schema_catalog import schema_catalog
 import logging
 import json
 
+if TYPE_CHECKING:
+    from langchain.docstore.document import Document
+
 logger = logging.getLogger(__name__)
 
 
+# Camadas opcionais usadas por cada estratégia do QueryRouter
+# (Layer 1 - metadados - é sempre retornada)
+STRATEGY_LAYERS = {
+    "full_pipeline": {"schema", "statistics"},
+    "filtered_rag": {"schema"},
+}
+
+
 class MultiLayerSchemaRetriever:
     """AGENTE 1 EVOLUÍDO: RAG em 3 camadas
     
@@ -18,34 +29,16 @@ class MultiLayerSchemaRetriever:
     """
     
     def __init__(self):
+        from langchain_openai import OpenAIEmbeddings
+        
         self.embeddings = OpenAIEmbeddings(openai_api_key=settings.openai_api_key)
         self.vectorstore = None
         
-        # LAYER 1: Metadados (lightweight, sempre disponível)
-        self.metadata = {
-            "clientes": {
-                "count": 5,  # Em produção: 3_000_000
-                "size_mb": 1,  # Em produção: 500 MB
-                "has_index": True,
-                "indexed_columns": ["id", "email"],
-                "date_range": "2020-2025"
-            },
-            "transacoes": {
-                "count": 10,  # Em produção: 150_000_000
-                "size_mb": 2,  # Em produção: 5 GB
-                "has_index": True,
-                "indexed_columns": ["cliente_id", "produto_id", "data_transacao"],
-                "date_range": "2020-2025"
-            },
-            "produtos": {
-                "count": 6,  # Em produção: 25_000
-                "size_mb": 0.1,
-                "has_index": True,
-                "indexed_columns": ["id", "categoria"]
-            }
-        }
+        # LAYER 1: Metadados vêm do catálogo vivo do PostgreSQL
+        self.catalog = schema_catalog
+        self.statistics = column_statistics
         
-        # LAYER 3: Estatísticas pré-computadas
+        # LAYER 3: Estatísticas pré-computadas + pg_stats por coluna
         self.query_statistics = {
             "frequent_queries": [
                 "SELECT COUNT(*) FROM clientes",
@@ -64,14 +57,25 @@ class MultiLayerSchemaRetriever:
         
         self._init_vectorstore()
     
+    @property
+    def metadata(self) -> Dict:
+        """LAYER 1: tabelas, cardinalidade, colunas, índices e FKs"""
+        return self.catalog.table_metadata()
+    
     def _init_vectorstore(self):
         """LAYER 2: Schema documents (FAISS)"""
+        from src.rag.index_store import load_or_build_index
+        
         schema_docs = self._create_schema_documents()
-        self.vectorstore = FAISS.from_documents(schema_docs, self.embeddings)
+        self.vectorstore = load_or_build_index(
+            schema_docs, self.embeddings, settings.schema_index_dir, "rag_schema"
+        )
         logger.info("Multi-layer schema retriever initialized")
     
-    def _create_schema_documents(self) -> List[Document]:
+    def _create_schema_documents(self) -> List["Document"]:
         """Documentos com descrições detalhadas"""
+        from langchain.docstore.document import Document
+        
         documents = [
             Document(
                 page_content="""
@@ -184,34 +188,80 @@ class MultiLayerSchemaRetriever:
     def retrieve_relevant_schema(self, question: str, strategy: str = "full") -> Dict:
         """Retrieve com estratégia adaptativa"""
         try:
-            # LAYER 1: Sempre retorna metadados
-            metadata_context = self._filter_metadata_by_question(question)
-            
             # LAYER 2: Schema RAG (só se necessário)
-            schema_context = ""
-            if strategy in ["full_pipeline", "filtered_rag"]:
+            docs = []
+            if "schema" in STRATEGY_LAYERS.get(strategy, set()):
                 docs = self.vectorstore.similarity_search(question, k=2)
-                schema_context = "\n\n".join([doc.page_content for doc in docs])
             
-            # LAYER 3: Estatísticas (para queries analíticas)
-            stats_context = ""
-            if strategy in ["full_pipeline", "analytics"]:
-                stats_context = self._get_relevant_statistics(question)
+            return self._build_result(question, strategy, docs)
             
-            result = {
-                "metadata": metadata_context,
-                "schema": schema_context,
-                "statistics": stats_context,
-                "strategy_used": strategy
-            }
+        except Exception as e:
+            logger.error(f"Error in schema retrieval: {e}")
+            return {"metadata": {}, "schema": "", "statistics": ""}
+    
+    async def aretrieve_relevant_schema(self, question: str, strategy: str = "full") -> Dict:
+        """Versão assíncrona (embedding da pergunta via asimilarity_search)"""
+        try:
+            docs = []
+            if "schema" in STRATEGY_LAYERS.get(strategy, set()):
+                docs = await self.vectorstore.asimilarity_search(question, k=2)
             
-            logger.info(f"Retrieved schema (strategy: {strategy})")
-            return result
+            return self._build_result(question, strategy, docs)
             
         except Exception as e:
             logger.error(f"Error in schema retrieval: {e}")
             return {"metadata": {}, "schema": "", "statistics": ""}
     
+    def _build_result(self, question: str, strategy: str, docs: List["Document"]) -> Dict:
+        # LAYER 1: Sempre retorna metadados
+        metadata_context = self._filter_metadata_by_question(question)
+        
+        schema_context = "\n\n".join([doc.page_content for doc in docs])
+        
+        # LAYER 3: Estatísticas (para queries analíticas)
+        stats_context = ""
+        if "statistics" in STRATEGY_LAYERS.get(strategy, set()):
+            stats_context = self._get_relevant_statistics(question)
+        
+        result = {
+            "metadata": metadata_context,
+            "schema": schema_context,
+            "statistics": stats_context,
+            "strategy_used": strategy
+        }
+        
+        logger.info(f"Retrieved schema (strategy: {strategy})")
+        return result
+    
+    def apply_strategy(self, schema_data: Dict, strategy: str) -> Dict:
+        """Descarta as camadas que a estratégia não usa.
+        
+        Permite buscar o schema de forma especulativa (full_pipeline) em
+        paralelo com o roteamento e recortar o resultado depois.
+        """
+        layers = STRATEGY_LAYERS.get(strategy, set())
+        return {
+            "metadata": schema_data.get("metadata", {}),
+            "schema": schema_data.get("schema", "") if "schema" in layers else "",
+            "statistics": schema_data.get("statistics", "") if "statistics" in layers else "",
+            "strategy_used": strategy
+        }
+    
+    def describe_schema(self, question: str) -> str:
+        """Responde perguntas estruturais direto do catálogo (sem LLM)"""
+        tables = self._filter_metadata_by_question(question)
+        
+        lines = ["Estrutura do banco de dados:", ""]
+        for table, info in tables.items():
+            lines.append(f"Tabela {table} (~{info.get('count', 0)} registros)")
+            if info.get("columns"):
+                lines.append(f"  Colunas: {', '.join(info['columns'])}")
+            if info.get("indexed_columns"):
+                lines.append(f"  Colunas indexadas: {', '.join(info['indexed_columns'])}")
+            lines.append("")
+        
+        return "\n".join(lines).strip()
+    
     def _filter_metadata_by_question(self, question: str) -> Dict:
         """Filtra metadados relevantes baseado na pergunta"""
         question_lower = question.lower()
@@ -228,7 +278,8 @@ class MultiLayerSchemaRetriever:
         if not relevant_tables:
             return self.metadata
         
-        return {table: self.metadata[table] for table in relevant_tables if table in self.metadata}
+        metadata = self.metadata
+        return {table: metadata[table] for table in relevant_tables if table in metadata}
     
     def _get_relevant_statistics(self, question: str) -> str:
         """Retorna estatísticas relevantes"""
@@ -239,7 +290,11 @@ class MultiLayerSchemaRetriever:
         
         stats.append(f"Limites otimizados:\n{json.dumps(self.query_statistics['optimal_limits'], indent=2)}")
         
+        columns = self.statistics.describe(list(self._filter_metadata_by_question(question)))
+        if columns:
+            stats.append(f"Estatísticas das colunas (pg_stats):\n{columns}")
+        
         return "\n\n".join(stats)
 
 
-schema_retriever = MultiLayerSchemaRetriever()
\ No newline at end of file
+schema_retriever = lazy("rag_schema_retriever", MultiLayerSchemaRetriever)
\ No newline at end of file
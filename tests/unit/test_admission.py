@@ -0,0 +1,116 @@
+import pytest
+import threading
+import time
+from src.orchestration.admission import AdmissionController
+from src.orchestration.mcp_context import MCPContext
+
+
+CHEAP = {'is_valid': True, 'estimated_cost': 'low'}
+EXPENSIVE = {'is_valid': True, 'estimated_cost': 'very_high'}
+
+
+@pytest.mark.unit
+class TestAdmissionController:
+    
+    def test_user_budget_is_enforced_per_window(self):
+        controller = AdmissionController(user_budget=150, budget_window=0.2)
+        
+        first = controller.admit("analista", EXPENSIVE)
+        controller.release(first.ticket)
+        second = controller.admit("analista", EXPENSIVE)
+        
+        assert first.admitted and not second.admitted
+        assert "Orçamento" in second.reason
+        # Outro usuário tem orçamento próprio
+        assert controller.admit("interativo", CHEAP).admitted
+        
+        time.sleep(0.25)
+        assert controller.admit("analista", EXPENSIVE).admitted
+    
+    def test_expensive_queries_wait_for_a_slot_then_reject(self):
+        controller = AdmissionController(max_expensive=1, queue_timeout=0.05)
+        
+        running = controller.admit("a", EXPENSIVE)
+        rejected = controller.admit("b", EXPENSIVE)
+        
+        assert running.admitted and not rejected.admitted
+        assert controller.spent("b") == 0   # rejeitada não consome orçamento
+        # Queries baratas não disputam as vagas
+        assert controller.admit("c", CHEAP).admitted
+    
+    def test_queued_query_is_admitted_when_slot_is_released(self):
+        controller = AdmissionController(max_expensive=1, queue_timeout=2.0)
+        running = controller.admit("a", EXPENSIVE)
+        decisions = []
+        
+        waiter = threading.Thread(target=lambda: decisions.append(controller.admit("b", EXPENSIVE)))
+        waiter.start()
+        time.sleep(0.05)
+        controller.release(running.ticket)
+        waiter.join(timeout=2)
+        
+        assert decisions[0].admitted and decisions[0].waited_ms > 0
+        assert controller.running() == 1
+    
+    def test_release_for_refunds_sql_cache_hits(self):
+        controller = AdmissionController()
+        context = MCPContext(user_id="u", session_id="s", original_question="q")
+        context.validation_result = EXPENSIVE
+        
+        controller.record(context, controller.admit("u", EXPENSIVE))
+        context.metadata['sql_cache_hit'] = True
+        controller.release_for(context)
+        controller.release_for(context)
+        
+        assert controller.running() == 0
+        assert controller.spent("u") == 0
+    
+    def test_rejection_is_recorded_in_context(self):
+        controller = AdmissionController(user_budget=10)
+        context = MCPContext(user_id="u", session_id="s", original_question="q")
+        context.validation_result = EXPENSIVE
+        
+        controller.record(context, controller.admit("u", EXPENSIVE))
+        
+        assert context.metadata['admission']['admitted'] is False
+        assert context.execution_result['success'] is False
+        assert context.errors[0]['stage'] == "admission_control"
+
+
+class CachedMemory:
+    def __init__(self, results):
+        self.results = results
+    
+    def get_sql_result(self, sql):
+        return self.results.get(sql)
+
+
+@pytest.mark.unit
+def test_sql_cache_hit_is_served_before_admission(monkeypatch):
+    import src.agents.query_executor as executor_module
+    import src.langgraph_workflow as workflow
+    from src.database.schema_catalog import FALLBACK_TABLES, SchemaCatalog
+    
+    cached_sql = "SELECT id FROM transacoes"
+    monkeypatch.setattr(executor_module, "memory", CachedMemory({
+        cached_sql: {'success': True, 'columns': ['id'], 'data': [{'id': 1}]},
+    }))
+    controller = AdmissionController(user_budget=10)
+    monkeypatch.setattr(workflow, "admission_controller", controller)
+    monkeypatch.setattr(workflow, "query_executor", executor_module.SmartQueryExecutor(
+        catalog=SchemaCatalog(fetch_fn=lambda: FALLBACK_TABLES)))
+    
+    def admit(sql):
+        context = MCPContext(user_id="u", session_id="s", original_question="q")
+        context.generated_sql = sql
+        context.validation_result = EXPENSIVE
+        state = workflow.admit_query_node({"context": context, "errors": []})
+        return context, workflow.should_run_admitted(state)
+    
+    context, route = admit(cached_sql)
+    assert route == "cached" and list(context.execution_result['data']) == [{'id': 1}]
+    assert 'admission' not in context.metadata and controller.spent("u") == 0
+    
+    # Miss: passa pela admissão (e o orçamento de 10 não cobre a query cara)
+    context, route = admit("SELECT valor_total FROM transacoes")
+    assert route == "rejected" and context.metadata['admission']['admitted'] is False
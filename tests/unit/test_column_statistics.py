@@ -0,0 +1,135 @@
+import pytest
+from src.database.column_statistics import (
+    DEFAULT_EQ_SEL, ColumnStatistics, ColumnStats,
+)
+from src.database.schema_catalog import FALLBACK_TABLES, SchemaCatalog
+from src.orchestration.mcp_context import MCPContext
+
+
+def _tables(**counts):
+    tables = {name: dict(info) for name, info in FALLBACK_TABLES.items()}
+    for name, count in counts.items():
+        tables[name]["count"] = count
+    return tables
+
+
+STATS = {
+    ("produtos", "categoria"): ColumnStats(
+        null_frac=0.0, n_distinct=10,
+        most_common_vals=("Eletrônicos", "Livros"), most_common_freqs=(0.4, 0.2),
+    ),
+    ("transacoes", "data_transacao"): ColumnStats(
+        null_frac=0.0, n_distinct=-0.5,
+        histogram_bounds=("2020-01-01", "2021-01-01", "2022-01-01", "2023-01-01", "2024-01-01"),
+    ),
+    ("transacoes", "valor_total"): ColumnStats(
+        null_frac=0.1, n_distinct=-0.8, histogram_bounds=(0.0, 100.0, 200.0, 300.0, 400.0),
+    ),
+    ("transacoes", "cliente_id"): ColumnStats(null_frac=0.0, n_distinct=-0.02),
+    ("clientes", "id"): ColumnStats(null_frac=0.0, n_distinct=-1),
+}
+
+
+@pytest.fixture
+def catalog():
+    tables = _tables(transacoes=150_000_000, clientes=3_000_000, produtos=25_000)
+    return SchemaCatalog(fetch_fn=lambda: tables)
+
+
+@pytest.fixture
+def statistics(catalog):
+    return ColumnStatistics(fetch_fn=lambda: STATS, catalog=catalog)
+
+
+@pytest.mark.unit
+class TestSelectivity:
+    
+    def test_equality_uses_most_common_values(self, statistics):
+        assert statistics.selectivity("produtos", "categoria", "=", "'Livros'") == pytest.approx(0.2)
+        # Restante (0.4) dividido entre os 8 distintos fora da lista
+        assert statistics.selectivity("produtos", "categoria", "=", "'Moda'") == pytest.approx(0.05)
+        assert statistics.selectivity("produtos", "categoria", "IN", ["'Livros'", "'Moda'"]) == pytest.approx(0.25)
+    
+    def test_range_uses_histogram(self, statistics):
+        assert statistics.selectivity(
+            "transacoes", "data_transacao", ">=", "'2023-01-01'"
+        ) == pytest.approx(0.25)
+        assert statistics.selectivity(
+            "transacoes", "data_transacao", "BETWEEN", ("'2021-01-01'", "'2022-01-01'")
+        ) == pytest.approx(0.25)
+        # Numérico: interpola dentro do bucket e desconta os nulos
+        assert statistics.selectivity("transacoes", "valor_total", "<", 50) == pytest.approx(0.9 * 0.125)
+    
+    def test_unknown_column_uses_planner_defaults(self, statistics):
+        assert statistics.selectivity("clientes", "nome", "=", "'Ana'") == DEFAULT_EQ_SEL
+    
+    def test_join_selectivity_and_row_estimate(self, statistics):
+        join = statistics.join_selectivity("transacoes", "cliente_id", "clientes", "id")
+        assert join == pytest.approx(1 / 3_000_000)
+        
+        rows = statistics.estimate_rows("transacoes", [("data_transacao", ">=", "'2023-01-01'")])
+        assert rows == 37_500_000
+    
+    
+    def test_without_stats_unique_columns_use_the_catalog(self, catalog):
+        statistics = ColumnStatistics(fetch_fn=dict, catalog=catalog)
+        
+        assert statistics.estimate_rows("clientes", [("id", "IN", ["1", "2", "3"])]) == 3
+        assert statistics.selectivity("clientes", "nome", "=", "'Ana'") == DEFAULT_EQ_SEL
+    
+    def test_without_stats_fk_join_uses_referenced_rows(self, catalog):
+        statistics = ColumnStatistics(fetch_fn=dict, catalog=catalog)
+        
+        join = statistics.join_selectivity("transacoes", "cliente_id", "clientes", "id")
+        assert join == pytest.approx(1 / 3_000_000)
+        
+        # Sem PK do lado referenciado no catálogo, vale a FK
+        catalog.snapshot()["clientes"]["unique_columns"] = []
+        assert statistics.join_selectivity("clientes", "id", "transacoes", "cliente_id") == \
+            pytest.approx(1 / 3_000_000)
+
+@pytest.mark.unit
+class TestValidatorCostEstimate:
+    
+    def _validate(self, catalog, statistics, sql):
+        from src.agents.sql_validator import SQLValidatorOptimizer
+        
+        validator = SQLValidatorOptimizer(catalog=catalog, statistics=statistics)
+        context = MCPContext(user_id="u", session_id="s", original_question="q")
+        context.generated_sql = sql
+        validator.validate(context)
+        return context.validation_result
+    
+    def test_selective_filter_lowers_cost(self, catalog, statistics):
+        result = self._validate(
+            catalog, statistics, "SELECT nome FROM produtos WHERE categoria = 'Moda'"
+        )
+        
+        assert result["estimated_rows"] == 1250
+        assert result["estimated_cost"] == "medium"
+    
+    def test_limit_with_order_by_still_scans(self, catalog, statistics):
+        result = self._validate(
+            catalog, statistics,
+            "SELECT t.valor_total FROM transacoes t "
+            "WHERE t.data_transacao >= '2023-01-01' ORDER BY t.valor_total DESC LIMIT 10"
+        )
+        
+        assert result["estimated_rows"] == 10
+        assert result["estimated_cost"] == "very_high"
+    
+    def test_ungrouped_aggregate_returns_one_row(self, catalog, statistics):
+        result = self._validate(catalog, statistics, "SELECT COUNT(*) FROM transacoes")
+        
+        assert result["estimated_rows"] == 1
+        assert result["scanned_rows"] == 150_000_000
+        assert not any("pode retornar" in warning for warning in result["warnings"])
+    
+    def test_fk_join_keeps_fact_table_cardinality(self, catalog, statistics):
+        result = self._validate(
+            catalog, statistics,
+            "SELECT c.nome FROM clientes c JOIN transacoes t ON c.id = t.cliente_id "
+            "WHERE t.data_transacao >= '2023-01-01'"
+        )
+        
+        assert result["estimated_rows"] == 37_500_000
@@ -0,0 +1,58 @@
+import pytest
+import json
+import numpy as np
+from datetime import date
+from decimal import Decimal
+from src.database.columnar import ColumnarResult, to_json
+
+
+COLUMNS = ["id", "valor", "desconto", "data", "categoria"]
+ROWS = [
+    (1, Decimal("10.50"), None, date(2024, 1, 2), "Livros"),
+    (2, Decimal("3.25"), Decimal("1.00"), date(2024, 1, 3), None),
+    (3, Decimal("7.00"), None, None, "Moda"),
+]
+
+
+@pytest.fixture
+def result():
+    return ColumnarResult.from_rows(COLUMNS, ROWS)
+
+
+@pytest.mark.unit
+class TestColumnarResult:
+    
+    def test_numeric_columns_are_typed_arrays(self, result):
+        assert result.column("id").dtype == np.int64
+        assert result.column("valor").dtype == np.float64
+        assert result.column("valor").sum() == pytest.approx(20.75)
+        assert result.column("categoria").dtype == object
+    
+    def test_rows_are_built_on_demand_as_dicts(self, result):
+        assert len(result) == 3
+        assert result[0] == {"id": 1, "valor": 10.5, "desconto": None,
+                             "data": date(2024, 1, 2), "categoria": "Livros"}
+        assert type(result[0]["id"]) is int and result[-1]["desconto"] is None
+        assert [row["id"] for row in result] == [1, 2, 3]
+    
+    def test_slice_is_a_view(self, result):
+        page = result[1:]
+        
+        assert np.shares_memory(page.column("valor"), result.column("valor"))
+        assert page.to_records()[0]["desconto"] == 1.0
+        assert page.to_records()[1]["desconto"] is None
+    
+    def test_json_matches_the_list_of_dicts(self, result):
+        payload = json.loads(to_json({"data": result}))
+        
+        assert payload["data"][0] == {"id": 1, "valor": 10.5, "desconto": None,
+                                      "data": "2024-01-02", "categoria": "Livros"}
+        assert payload["data"][2]["data"] is None
+    
+    def test_cached_records_round_trip(self, result):
+        cached = json.loads(to_json(result))
+        
+        restored = ColumnarResult.from_records(cached)
+        
+        assert restored.columns == result.columns and restored[1]["valor"] == 3.25
+        assert len(ColumnarResult.from_records([])) == 0
@@ -0,0 +1,42 @@
+import pytest
+from langchain.docstore.document import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+
+class CountingEmbeddings(DeterministicFakeEmbedding):
+    calls: int = 0
+    
+    def embed_documents(self, texts):
+        self.calls += 1
+        return super().embed_documents(texts)
+
+
+def make_docs(extra=""):
+    return [
+        Document(page_content="Tabela: clientes" + extra, metadata={"table": "clientes"}),
+        Document(page_content="Tabela: produtos", metadata={"table": "produtos"}),
+    ]
+
+
+@pytest.mark.unit
+class TestSchemaIndexStore:
+    
+    def test_index_is_reused_from_disk(self, tmp_path):
+        from src.rag.index_store import load_or_build_index
+        embeddings = CountingEmbeddings(size=8)
+        
+        load_or_build_index(make_docs(), embeddings, str(tmp_path), "schema")
+        loaded = load_or_build_index(make_docs(), embeddings, str(tmp_path), "schema")
+        
+        assert embeddings.calls == 1
+        assert loaded.similarity_search("Tabela: clientes", k=1)[0].metadata == {"table": "clientes"}
+    
+    def test_changed_documents_rebuild_index(self, tmp_path):
+        from src.rag.index_store import load_or_build_index
+        embeddings = CountingEmbeddings(size=8)
+        
+        load_or_build_index(make_docs(), embeddings, str(tmp_path), "schema")
+        load_or_build_index(make_docs(extra=" (nova coluna)"), embeddings, str(tmp_path), "schema")
+        
+        assert embeddings.calls == 2
+        assert len(list(tmp_path.glob("schema-*"))) == 1
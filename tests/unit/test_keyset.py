@@ -0,0 +1,56 @@
+import pytest
+from src.database.keyset import decode_token, encode_token, page_query, plan_keyset
+from src.database.schema_catalog import FALLBACK_TABLES, SchemaCatalog
+
+
+@pytest.fixture
+def catalog():
+    return SchemaCatalog(fetch_fn=lambda: FALLBACK_TABLES)
+
+
+@pytest.mark.unit
+class TestKeysetPlan:
+    
+    def test_order_by_is_completed_with_primary_key(self, catalog):
+        sql = ("SELECT id, valor_total, data_transacao FROM transacoes "
+               "WHERE valor_total > 10 ORDER BY data_transacao DESC LIMIT 5000;")
+        
+        plan = plan_keyset(sql, ["id", "valor_total", "data_transacao"], catalog)
+        
+        assert plan.base_sql == ("SELECT id, valor_total, data_transacao FROM transacoes "
+                                 "WHERE valor_total > 10")
+        assert plan.keys == ("data_transacao", "id") and plan.descending
+        assert plan.limit == 5000 and not plan.ordered
+    
+    def test_order_by_primary_key_is_already_a_keyset(self, catalog):
+        plan = plan_keyset("SELECT c.id, c.nome FROM clientes c ORDER BY c.id", ["id", "nome"], catalog)
+        
+        assert plan.keys == ("id",) and plan.ordered
+    
+    @pytest.mark.parametrize("sql, columns", [
+        ("SELECT nome FROM clientes ORDER BY nome", ["nome"]),                   # sem PK
+        ("SELECT id, nome FROM clientes ORDER BY nome ASC, id DESC", ["id", "nome"]),
+        ("SELECT id FROM clientes ORDER BY id LIMIT 10 OFFSET 5", ["id"]),
+        ("SELECT id FROM clientes ORDER BY LOWER(nome)", ["id"]),
+        ("SELECT c.id FROM clientes c JOIN transacoes t ON t.cliente_id = c.id", ["id"]),
+    ])
+    def test_no_plan_without_a_reliable_unique_key(self, catalog, sql, columns):
+        assert plan_keyset(sql, columns, catalog) is None
+    
+    def test_page_query_filters_by_row_value(self, catalog):
+        plan = plan_keyset("SELECT id, nome FROM clientes ORDER BY nome DESC",
+                           ["id", "nome"], catalog)
+        
+        sql, params = page_query(plan, ["Maria", 7], 101)
+        
+        assert sql == ('SELECT * FROM (SELECT id, nome FROM clientes) AS _keyset '
+                       'WHERE ("nome", "id") < (:k0, :k1) ORDER BY "nome" DESC, "id" DESC '
+                       'LIMIT :page_size')
+        assert params == {"page_size": 101, "k0": "Maria", "k1": 7}
+    
+    def test_token_round_trip(self):
+        token = encode_token("abc123", ["2024-01-01", 42], 1000)
+        
+        assert decode_token(token) == ("abc123", ["2024-01-01", 42], 1000)
+        with pytest.raises(ValueError):
+            decode_token("not-a-token")
@@ -0,0 +1,285 @@
+import pytest
+import threading
+import time
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+from src.orchestration.admission import AdmissionController
+
+
+BRANCHES = ["route_query", "retrieve_schema", "load_history"]
+
+
+class Calls:
+    """Ordem das chamadas aos agentes falsos
+    
+    Os três ramos do fan-out esperam uns pelos outros na barreira: se o
+    grafo os rodasse em sequência, o primeiro estouraria o timeout.
+    """
+    
+    def __init__(self):
+        self.names = []
+        self._lock = threading.Lock()
+        self._barrier = threading.Barrier(len(BRANCHES), timeout=5)
+    
+    def add(self, name):
+        with self._lock:
+            self.names.append(name)
+    
+    def branch(self, name):
+        self._barrier.wait()
+        self.add(name)
+    
+    def index(self, name):
+        return self.names.index(name)
+
+
+def _step(calls, name, action=None):
+    def run(context, *args):
+        calls.add(name)
+        if action:
+            action(context)
+        return context
+    return run
+
+
+def _set(**fields):
+    def apply(context):
+        for key, value in fields.items():
+            setattr(context, key, value)
+    return apply
+
+
+class FakeSchemaRetriever:
+    
+    def __init__(self, calls):
+        self.calls = calls
+    
+    def retrieve_relevant_schema(self, question, strategy):
+        self.calls.branch("retrieve_schema")
+        return {"schema": "clientes(id, nome)"}
+    
+    async def aretrieve_relevant_schema(self, question, strategy):
+        self.calls.add("retrieve_schema")
+        return {"schema": "clientes(id, nome)"}
+    
+    def apply_strategy(self, retrieval, strategy):
+        self.calls.add("join_context")
+        return {"schema": retrieval.get("schema", ""), "metadata": {"clientes": {}}, "statistics": ""}
+    
+    def describe_schema(self, question):
+        self.calls.add("describe_schema")
+        return "Tabela clientes: id, nome"
+
+
+class FakeMemory:
+    
+    def __init__(self, calls, cached=None):
+        self.calls = calls
+        self.cached = cached
+        self.saved = []
+    
+    def check_cache(self, question):
+        return self.cached
+    
+    def get_session_context(self, user_id, session_id):
+        self.calls.branch("load_history")
+        return []
+    
+    def save_interaction(self, **record):
+        self.calls.add("save_memory")
+        self.saved.append(record)
+    
+    def save_cached_response(self, *args):
+        self.calls.add("save_cached_response")
+    
+    async def acheck_cache(self, question):
+        return self.cached
+    
+    async def aget_session_context(self, user_id, session_id):
+        self.calls.add("load_history")
+        return []
+    
+    async def asave_interaction(self, **record):
+        self.calls.add("save_memory")
+        self.saved.append(record)
+
+
+@pytest.fixture
+def calls():
+    return Calls()
+
+
+@pytest.fixture
+def workflow(monkeypatch, calls):
+    """Módulo do workflow com agentes falsos (estratégia em query_router.strategy)"""
+    import src.langgraph_workflow as workflow
+    
+    router = SimpleNamespace(strategy="full_pipeline")
+    
+    def route(context):
+        calls.branch("route_query")
+        context.metadata['routing_strategy'] = router.strategy
+    
+    def execute(context):
+        calls.add("execute_query")
+        context.execution_result = {'success': True, 'data': [{'total': 5}]}
+    
+    agents = {
+        "query_router": router,
+        "schema_retriever": FakeSchemaRetriever(calls),
+        "memory": FakeMemory(calls),
+        "nlp_parser": SimpleNamespace(parse=_step(calls, "parse_nlp")),
+        "sql_generator": SimpleNamespace(generate=_step(
+            calls, "generate_sql", _set(generated_sql="SELECT COUNT(*) AS total FROM clientes"))),
+        "sql_validator": SimpleNamespace(validate=_step(
+            calls, "validate_sql", _set(validation_result={'is_valid': True, 'estimated_cost': 'low'}))),
+        "query_executor": SimpleNamespace(serve_from_cache=lambda context: False,
+                                          execute=lambda context: execute(context) or context),
+        "response_formatter": SimpleNamespace(format=_step(
+            calls, "format_response", _set(formatted_response="Temos 5 clientes."))),
+        "evidence_checker": SimpleNamespace(check=_step(calls, "check_evidence")),
+        "admission_controller": AdmissionController(),
+    }
+    router.route = route
+    for name, agent in agents.items():
+        monkeypatch.setattr(workflow, name, agent)
+    return workflow
+
+
+def _run(workflow, question="Quantos clientes temos?"):
+    graph = workflow.create_workflow()
+    return graph.invoke(workflow._initial_state(question, "u"))
+
+
+@pytest.mark.unit
+class TestContextFanOut:
+    
+    def test_branches_run_together_and_join_before_generation(self, workflow, calls):
+        state = _run(workflow)
+        
+        assert state["errors"] == []
+        assert sorted(calls.names[:3]) == sorted(BRANCHES)
+        assert calls.names.count("join_context") == 1
+        assert calls.index("join_context") == 3
+        assert calls.index("join_context") < calls.index("parse_nlp") < calls.index("generate_sql")
+        assert state["context"].schema_context == "clientes(id, nome)"
+        assert state["context"].formatted_response == "Temos 5 clientes."
+    
+    def test_cache_hit_with_response_skips_the_branches(self, workflow, calls):
+        workflow.memory.cached = {
+            'sql_query': "SELECT COUNT(*) AS total FROM clientes", 'result': [{'total': 5}],
+            'cache_id': 1, 'result_version': 1, 'formatted_response': "Temos 5 clientes.",
+        }
+        
+        state = _run(workflow)
+        
+        assert calls.names == ["save_memory"]
+        assert state["context"].formatted_response == "Temos 5 clientes."
+    
+    def test_cache_hit_without_response_is_formatted_without_the_branches(self, workflow, calls):
+        workflow.memory.cached = {
+            'sql_query': "SELECT COUNT(*) AS total FROM clientes", 'result': [{'total': 5}],
+            'cache_id': 1, 'result_version': 1,
+        }
+        
+        _run(workflow)
+        
+        assert calls.names == ["format_response", "check_evidence", "save_memory"]
+
+
+@pytest.mark.unit
+class TestStrategyShortcuts:
+    
+    def test_schema_only_answers_from_the_catalog(self, workflow, calls):
+        workflow.query_router.strategy = "schema_only"
+        
+        state = _run(workflow, "Quais colunas tem a tabela clientes?")
+        
+        assert state["context"].formatted_response == "Tabela clientes: id, nome"
+        assert calls.names[3:] == ["join_context", "describe_schema", "save_memory"]
+        for name in ("parse_nlp", "generate_sql", "execute_query", "format_response"):
+            assert name not in calls.names
+    
+    def test_sql_direct_skips_the_nlp_parser(self, workflow, calls):
+        workflow.query_router.strategy = "sql_direct"
+        
+        _run(workflow)
+        
+        assert "parse_nlp" not in calls.names
+        assert calls.names[4:] == ["generate_sql", "validate_sql", "execute_query",
+                                   "format_response", "check_evidence", "save_memory"]
+
+
+@pytest.fixture
+def fake_llm_agents(monkeypatch):
+    """Agentes reais (prompt | llm) com chat models falsos no lugar do OpenAI"""
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+    from src.agents import evidence_checker, nlp_parser, query_router, response_formatter, sql_generator
+    from src.database.schema_catalog import FALLBACK_TABLES, SchemaCatalog
+    
+    settings = SimpleNamespace(openai_api_key="sk-test", model_name="gpt-test", temperature=0.0)
+    modules = (query_router, nlp_parser, sql_generator, response_formatter, evidence_checker)
+    for module in modules:
+        monkeypatch.setattr(module, "settings", settings)
+    monkeypatch.setattr("src.memory.llm_cache.get_llm_cache", lambda agent: None)
+    
+    replies = {
+        "query_router": "SEARCH",
+        "nlp_parser": '{"intent": "SEARCH", "entities": ["clientes"]}',
+        "sql_generator": "```sql\nSELECT nome FROM clientes WHERE estado = 'SP';\n```",
+        "response_formatter": "Ana e Bruno são de SP.",
+        "evidence_checker": '{"is_correct": true, "issues": []}',
+    }
+    agents = {}
+    for module, cls in zip(modules, ("QueryRouter", "NLPParser", "SQLGenerator",
+                                     "ResponseFormatter", "EvidenceChecker")):
+        name = module.__name__.rsplit(".", 1)[-1]
+        agent = getattr(module, cls)()
+        agent.llm = FakeListChatModel(responses=[replies[name]])
+        agents[name] = agent
+    agents["sql_generator"].catalog = SchemaCatalog(fetch_fn=lambda: FALLBACK_TABLES)
+    return agents
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_async_workflow_runs_end_to_end(monkeypatch, calls, fake_llm_agents):
+    import src.agents.query_executor as executor_module
+    import src.langgraph_workflow as workflow
+    from src.agents.sql_validator import SQLValidatorOptimizer
+    from src.database.column_statistics import ColumnStatistics
+    from src.database.schema_catalog import FALLBACK_TABLES, SchemaCatalog
+    
+    catalog = SchemaCatalog(fetch_fn=lambda: FALLBACK_TABLES)
+    executor = executor_module.SmartQueryExecutor(catalog=catalog)
+    monkeypatch.setattr(executor, "_aexecute_with_streaming", AsyncMock(
+        side_effect=lambda sql, context: executor._build_result(
+            ["nome"], [("Ana",), ("Bruno",)], False, time.time())))
+    monkeypatch.setattr(executor_module, "memory", SimpleNamespace(
+        aget_sql_result=AsyncMock(return_value=None), asave_sql_result=AsyncMock()))
+    monkeypatch.setattr(executor_module, "data_versions", SimpleNamespace(
+        versions_for=lambda sql: {"clientes": 7}))
+    
+    memory = FakeMemory(calls)
+    for name, agent in fake_llm_agents.items():
+        monkeypatch.setattr(workflow, name, agent)
+    monkeypatch.setattr(workflow, "memory", memory)
+    monkeypatch.setattr(workflow, "schema_retriever", FakeSchemaRetriever(calls))
+    monkeypatch.setattr(workflow, "sql_validator", SQLValidatorOptimizer(
+        catalog=catalog, statistics=ColumnStatistics(fetch_fn=dict, catalog=catalog)))
+    monkeypatch.setattr(workflow, "query_executor", executor)
+    monkeypatch.setattr(workflow, "admission_controller", AdmissionController())
+    
+    graph = workflow.create_async_workflow()
+    state = await graph.ainvoke(workflow._initial_state("Quais clientes são de SP?", "u"))
+    context = state["context"]
+    
+    assert state["errors"] == [] and context.errors == []
+    assert context.metadata['routing_strategy'] == "filtered_rag"
+    assert context.parsed_intent["intent"] == "SEARCH"
+    assert context.generated_sql.startswith("SELECT nome FROM clientes WHERE estado = 'SP'")
+    assert list(context.execution_result['data']) == [{"nome": "Ana"}, {"nome": "Bruno"}]
+    assert context.formatted_response.startswith("Ana e Bruno são de SP.")
+    assert context.metadata['evidence_check']['is_correct'] is True
+    executor._aexecute_with_streaming.assert_awaited_once()
+    assert memory.saved[0]['table_versions'] == {"clientes": 7}
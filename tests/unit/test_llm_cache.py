@@ -0,0 +1,77 @@
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.prompts import ChatPromptTemplate
+
+
+@pytest.fixture
+def store(tmp_path):
+    from src.memory.llm_cache import LLMCacheStore
+    return LLMCacheStore(db_path=str(tmp_path / "llm.db"), max_entries=3)
+
+
+def make_chain(store, agent="query_router"):
+    from src.memory.llm_cache import LLMResponseCache
+    llm = FakeListChatModel(responses=["AGGREGATION", "SEARCH"], cache=LLMResponseCache(store, agent))
+    prompt = ChatPromptTemplate.from_messages([("user", "Classifique: {question}")])
+    return prompt | llm, llm
+
+
+@pytest.mark.unit
+class TestLLMResponseCache:
+    
+    def test_identical_prompt_is_served_from_cache(self, store):
+        chain, llm = make_chain(store)
+        
+        first = chain.invoke({"question": "Quantos clientes temos?"})
+        second = chain.invoke({"question": "Quantos clientes temos?"})
+        
+        assert first.content == second.content == "AGGREGATION"
+        assert llm.i == 1
+        assert store.statistics()["query_router"] == {"entries": 1, "hits": 1}
+    
+    def test_different_prompt_misses(self, store):
+        chain, llm = make_chain(store)
+        
+        chain.invoke({"question": "Quantos clientes temos?"})
+        other = chain.invoke({"question": "Liste os produtos"})
+        
+        assert other.content == "SEARCH"
+    
+    @pytest.mark.asyncio
+    async def test_async_chain_uses_cache(self, store):
+        chain, llm = make_chain(store)
+        
+        await chain.ainvoke({"question": "Quantos clientes temos?"})
+        cached = await chain.ainvoke({"question": "Quantos clientes temos?"})
+        
+        assert cached.content == "AGGREGATION"
+        assert llm.i == 1
+    
+    def test_hit_is_counted_by_write_behind(self, store):
+        from langchain_core.messages import AIMessage
+        from langchain_core.outputs import ChatGeneration
+        from src.memory.llm_cache import LLMResponseCache
+        cache = LLMResponseCache(store, "nlp_parser")
+        cache.update("prompt", "llm", [ChatGeneration(message=AIMessage(content="ok"))])
+        
+        changes = store.storage.connection().total_changes
+        
+        for _ in range(3):
+            assert cache.lookup("prompt", "llm") is not None
+        
+        # Lookup não escreve na conexão do chamador; a thread do writer grava os hits
+        assert store.storage.connection().total_changes == changes
+        assert store.statistics()["nlp_parser"]["hits"] == 3
+    
+    def test_max_entries_evicts_least_recently_used(self, store):
+        from langchain_core.messages import AIMessage
+        from langchain_core.outputs import ChatGeneration
+        from src.memory.llm_cache import LLMResponseCache
+        cache = LLMResponseCache(store, "nlp_parser")
+        
+        for i in range(5):
+            cache.update(f"prompt {i}", "llm", [ChatGeneration(message=AIMessage(content=str(i)))])
+        
+        assert store.statistics()["nlp_parser"]["entries"] == 3
+        assert cache.lookup("prompt 4", "llm")[0].message.content == "4"
+        assert cache.lookup("prompt 0", "llm") is None
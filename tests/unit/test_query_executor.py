@@ -0,0 +1,259 @@
+import pytest
+from contextlib import contextmanager
+from decimal import Decimal
+import io
+
+
+class FakeServerCursor:
+    """Resultado de cursor no servidor: gera linhas sob demanda e conta o que foi buscado"""
+    
+    def __init__(self, total_rows):
+        self.total_rows = total_rows
+        self.pulled = 0
+        self.closed = False
+    
+    def keys(self):
+        return ["id", "valor"]
+    
+    def partitions(self, size):
+        while self.pulled < self.total_rows:
+            size = min(size, self.total_rows - self.pulled)
+            batch = [(self.pulled + i, Decimal("1.50")) for i in range(size)]
+            self.pulled += size
+            yield batch
+    
+    def close(self):
+        self.closed = True
+
+
+class FakeSession:
+    def __init__(self, total_rows):
+        self.total_rows = total_rows
+        self.options = []
+        self.cursor = None
+    
+    def execute(self, statement, params=None, execution_options=None):
+        self.options.append(execution_options)
+        if "statement_timeout" in str(statement):
+            return None
+        self.cursor = FakeServerCursor(self.total_rows)
+        return self.cursor
+
+
+@pytest.fixture
+def run(monkeypatch):
+    import src.agents.query_executor as module
+    
+    def factory(total_rows, batch_size=100):
+        session = FakeSession(total_rows)
+        
+        @contextmanager
+        def fake_session():
+            yield session
+        
+        monkeypatch.setattr(module, "get_db_session", fake_session)
+        executor = module.SmartQueryExecutor(batch_size=batch_size)
+        return executor._execute_with_streaming("SELECT id, valor FROM transacoes", None), session
+    
+    return factory
+
+
+@pytest.mark.unit
+class TestServerSideStreaming:
+    
+    def test_query_runs_on_server_cursor_with_batch_size(self, run):
+        result, session = run(10, batch_size=250)
+        
+        assert session.options[-1] == {"yield_per": 250}
+        assert result["row_count"] == 10 and not result["truncated"]
+        assert result["data"][0] == {"id": 0, "valor": 1.5}
+    
+    def test_large_result_is_not_fetched_past_the_limit(self, run):
+        result, session = run(1_000_000, batch_size=100)
+        
+        assert result["truncated"] and result["row_count"] == 1000
+        assert session.cursor.pulled <= 1000 + 100
+        assert session.cursor.closed
+    
+    def test_exactly_the_limit_is_not_truncated(self, run):
+        result, _ = run(1000)
+        
+        assert result["row_count"] == 1000 and not result["truncated"]
+
+
+@pytest.fixture
+def executor(monkeypatch):
+    import src.agents.query_executor as module
+    
+    session = FakeSession(250)
+    
+    @contextmanager
+    def fake_session():
+        yield session
+    
+    monkeypatch.setattr(module, "get_db_session", fake_session)
+    executor = module.SmartQueryExecutor(batch_size=100)
+    executor.session = session
+    return executor
+
+
+@pytest.mark.unit
+class TestBatchIterator:
+    
+    def test_first_batch_arrives_before_the_rest_is_fetched(self, executor):
+        batches = executor.iter_batches("SELECT id, valor FROM transacoes")
+        
+        first = next(batches)
+        
+        assert executor.session.cursor.pulled == 100
+        assert first.columns == ("id", "valor") and first.offset == 0
+        assert first.rows[0] == (0, 1.5) and type(first.rows[0][1]) is float
+        
+        batches.close()
+        assert executor.session.cursor.closed
+    
+    def test_max_rows_marks_the_last_batch(self, executor):
+        batches = list(executor.iter_batches("SELECT id, valor FROM transacoes", max_rows=150))
+        
+        assert [len(b.rows) for b in batches] == [100, 50]
+        assert batches[-1].truncated and not batches[0].truncated
+    
+    def test_export_sink_gets_every_row(self, executor):
+        output = io.StringIO()
+        
+        assert executor.export_csv("SELECT id, valor FROM transacoes", output) == 250
+        
+        lines = output.getvalue().splitlines()
+        assert lines[0] == "id,valor" and lines[-1] == "249,1.5" and len(lines) == 251
+
+
+class ListCursor:
+    def __init__(self, columns, rows):
+        self.columns, self.rows = columns, rows
+    
+    def keys(self):
+        return self.columns
+    
+    def partitions(self, size):
+        for start in range(0, len(self.rows), size):
+            yield self.rows[start:start + size]
+    
+    def close(self):
+        pass
+
+
+class KeysetSession:
+    """clientes com 2500 linhas; a SQL original devolve fora de ordem"""
+    
+    ROWS = [(i, f"cliente {i}") for i in range(2500)]
+    
+    def __init__(self):
+        self.statements = []
+    
+    def execute(self, statement, params=None, execution_options=None):
+        sql = str(statement)
+        if "statement_timeout" in sql:
+            return None
+        self.statements.append(sql)
+        if "_keyset" not in sql:
+            return ListCursor(["id", "nome"], list(reversed(self.ROWS)))
+        rows = [r for r in self.ROWS if "k0" not in params or r[0] > params["k0"]]
+        return ListCursor(["id", "nome"], rows[:params["page_size"]])
+
+
+class FakeMemory:
+    def __init__(self):
+        self.cursors = {}
+    
+    def get_sql_result(self, sql):
+        return None
+    
+    def save_sql_result(self, sql, result):
+        pass
+    
+    def save_page_cursor(self, sql, plan):
+        from src.database.sql_fingerprint import fingerprint
+        self.cursors[fingerprint(sql)] = {"sql_query": sql, "plan": plan}
+    
+    def get_page_cursor(self, key):
+        return self.cursors.get(key)
+
+
+@pytest.mark.unit
+def test_truncated_result_is_paged_by_keyset_without_llm(monkeypatch):
+    import src.agents.query_executor as module
+    from src.database.schema_catalog import FALLBACK_TABLES, SchemaCatalog
+    from src.orchestration.mcp_context import MCPContext
+    
+    session = KeysetSession()
+    
+    @contextmanager
+    def fake_session():
+        yield session
+    
+    monkeypatch.setattr(module, "get_db_session", fake_session)
+    monkeypatch.setattr(module, "memory", FakeMemory())
+    executor = module.SmartQueryExecutor(catalog=SchemaCatalog(fetch_fn=lambda: FALLBACK_TABLES))
+    context = MCPContext(user_id="u", session_id="s", original_question="Liste os clientes")
+    context.generated_sql = "SELECT id, nome FROM clientes"
+    context.validation_result = {"is_valid": True}
+    
+    first = executor.execute(context).execution_result
+    second = executor.fetch_page(first["next_page"])
+    third = executor.fetch_page(second["next_page"])
+    
+    # Sem ORDER BY: a primeira página é relida na ordem da PK
+    assert [r["id"] for r in first["data"]][:3] == [0, 1, 2] and len(first["data"]) == 1000
+    assert second["data"][0]["id"] == 1000 and second["rows_served"] == 2000
+    assert len(third["data"]) == 500 and "next_page" not in third and not third["truncated"]
+    assert len(session.statements) == 4
+    assert executor.fetch_page("bogus")["success"] is False
+
+
+class FakeSpillWriter:
+    def __init__(self, columns):
+        self.columns = list(columns)
+        self.rows = []
+        self.aborted = False
+    
+    def write(self, rows):
+        self.rows.extend(rows)
+    
+    def close(self):
+        from src.memory.result_spill import SpillHandle
+        return SpillHandle("/tmp/spill/result.arrow", self.columns, len(self.rows), 1234)
+    
+    def abort(self):
+        self.aborted = True
+
+
+class FakeSpillStore:
+    def __init__(self):
+        self.writers = []
+    
+    def writer(self, columns):
+        self.writers.append(FakeSpillWriter(columns))
+        return self.writers[-1]
+
+
+@pytest.mark.unit
+def test_result_past_the_memory_limit_spills_instead_of_truncating(monkeypatch):
+    import src.agents.query_executor as module
+    
+    session, store = FakeSession(5000), FakeSpillStore()
+    
+    @contextmanager
+    def fake_session():
+        yield session
+    
+    monkeypatch.setattr(module, "get_db_session", fake_session)
+    executor = module.SmartQueryExecutor(batch_size=100, spill_store=store, spill_max_rows=4000)
+    
+    result = executor._execute_with_streaming("SELECT id, valor FROM transacoes", None)
+    
+    written = store.writers[0].rows
+    assert len(written) == 4000 and written[1500] == (1500, Decimal("1.50"))
+    assert result["spill"]["row_count"] == 4000 and result["row_count"] == 4000
+    assert len(result["data"]) == 1000 and result["truncated"]
+    assert session.cursor.pulled <= 4000 + 100
+    assert "data" not in executor._cacheable(result)
@@ -0,0 +1,92 @@
+import pytest
+from src.database.query_planner import QueryPlanner, summarize_plan
+from src.database.schema_catalog import FALLBACK_TABLES, SchemaCatalog
+from src.orchestration.mcp_context import MCPContext
+
+
+SEQ_SCAN_PLAN = [{"Plan": {
+    "Node Type": "Aggregate", "Total Cost": 2_750_000.0, "Plan Rows": 1,
+    "Plans": [{
+        "Node Type": "Seq Scan", "Relation Name": "transacoes",
+        "Total Cost": 2_500_000.0, "Plan Rows": 150_000_000,
+    }],
+}}]
+
+INDEX_PLAN = [{"Plan": {
+    "Node Type": "Limit", "Total Cost": 8.3, "Plan Rows": 1,
+    "Plans": [{
+        "Node Type": "Index Scan", "Relation Name": "clientes",
+        "Total Cost": 8.3, "Plan Rows": 1,
+    }],
+}}]
+
+
+@pytest.fixture
+def catalog():
+    tables = {name: dict(info) for name, info in FALLBACK_TABLES.items()}
+    tables["transacoes"]["count"] = 150_000_000
+    return SchemaCatalog(fetch_fn=lambda: tables)
+
+
+def validate(planner, catalog, sql, max_plan_cost=1_000_000):
+    from src.agents.sql_validator import SQLValidatorOptimizer
+    from src.database.column_statistics import ColumnStatistics
+    
+    validator = SQLValidatorOptimizer(
+        catalog=catalog,
+        statistics=ColumnStatistics(fetch_fn=dict, catalog=catalog),
+        planner=planner,
+        use_explain=True,
+        max_plan_cost=max_plan_cost,
+    )
+    context = MCPContext(user_id="u", session_id="s", original_question="q")
+    context.generated_sql = sql
+    validator.validate(context)
+    return context.validation_result
+
+
+@pytest.mark.unit
+class TestQueryPlanner:
+    
+    def test_summarize_plan_collects_seq_scans(self):
+        estimate = summarize_plan(SEQ_SCAN_PLAN[0]["Plan"])
+        
+        assert estimate.total_cost == 2_750_000.0
+        assert estimate.plan_rows == 1
+        assert estimate.seq_scans == (("transacoes", 150_000_000),)
+    
+    def test_plans_are_cached_by_fingerprint(self):
+        calls = []
+        planner = QueryPlanner(explain_fn=lambda sql: calls.append(sql) or INDEX_PLAN)
+        
+        planner.explain("SELECT nome FROM clientes WHERE id = 1")
+        planner.explain("select nome\n  from clientes where id = 1;")
+        planner.explain("SELECT nome FROM clientes WHERE id = 2")
+        
+        assert len(calls) == 2
+    
+    def test_explain_failure_returns_none(self):
+        def failing(sql):
+            raise TimeoutError("statement timeout")
+        
+        assert QueryPlanner(explain_fn=failing).explain("SELECT 1") is None
+    
+    def test_validator_blocks_large_seq_scan(self, catalog):
+        planner = QueryPlanner(explain_fn=lambda sql: SEQ_SCAN_PLAN)
+        
+        result = validate(planner, catalog, "SELECT SUM(valor_total) FROM transacoes WHERE quantidade > 1 LIMIT 10")
+        
+        assert result["is_valid"] is False
+        assert result["estimated_cost"] == "very_high"
+        assert any("Seq Scan em 'transacoes'" in w for w in result["warnings"])
+        assert any("bloqueada" in e for e in result["errors"])
+    
+    def test_validator_uses_planner_numbers_for_cheap_plan(self, catalog):
+        planner = QueryPlanner(explain_fn=lambda sql: INDEX_PLAN)
+        
+        result = validate(planner, catalog, "SELECT nome FROM clientes WHERE id = 1")
+        
+        assert result["is_valid"] is True
+        assert result["plan_cost"] == 8.3
+        assert result["estimated_rows"] == 1
+        assert result["estimated_cost"] == "low"
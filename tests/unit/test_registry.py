@@ -0,0 +1,83 @@
+import pytest
+import subprocess
+import sys
+import threading
+
+
+@pytest.fixture
+def registry():
+    from src.config.registry import ComponentRegistry
+    return ComponentRegistry()
+
+
+class Counter:
+    
+    def __init__(self):
+        self.value = 0
+    
+    def increment(self):
+        self.value += 1
+        return self.value
+
+
+@pytest.mark.unit
+class TestComponentRegistry:
+    
+    def test_component_is_built_on_first_use_only(self, registry):
+        builds = []
+        counter = registry.register("counter", lambda: builds.append(1) or Counter())
+        
+        assert builds == []
+        assert not registry.is_initialized("counter")
+        
+        counter.increment()
+        counter.increment()
+        
+        assert builds == [1]
+        assert counter.value == 2
+    
+    def test_proxy_forwards_setattr_and_call(self, registry):
+        counter = registry.register("counter", Counter)
+        factory = registry.register("factory", lambda: Counter)
+        
+        counter.value = 10
+        
+        assert registry.get("counter").value == 10
+        assert isinstance(factory(), Counter)
+    
+    def test_concurrent_first_access_builds_once(self, registry):
+        builds = []
+        counter = registry.register("counter", lambda: builds.append(1) or Counter())
+        
+        threads = [threading.Thread(target=lambda: counter.value) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        assert builds == [1]
+    
+    def test_startup_report_and_warmup(self, registry):
+        registry.register("counter", Counter)
+        registry.register("other", Counter)
+        
+        registry.warmup(["counter"])
+        report = {item["component"]: item for item in registry.startup_report()}
+        
+        assert report["counter"]["initialized"] is True
+        assert report["other"] == {"component": "other", "initialized": False, "build_ms": 0.0}
+
+
+@pytest.mark.unit
+def test_workflow_import_builds_nothing():
+    """Importar o workflow não cria agentes, clientes OpenAI nem grafos"""
+    script = (
+        "import sys\n"
+        "import src.langgraph_workflow\n"
+        "from src.config.registry import registry\n"
+        "assert not any(item['initialized'] for item in registry.startup_report())\n"
+        "assert 'langchain_openai' not in sys.modules\n"
+        "assert 'langgraph' not in sys.modules\n"
+    )
+    result = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
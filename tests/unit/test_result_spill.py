@@ -0,0 +1,112 @@
+import pytest
+import numpy as np
+from datetime import date
+from decimal import Decimal
+import os
+from src.memory.result_spill import SpillStore, load_result, open_spill, read_preview, stored_result
+
+
+COLUMNS = ["id", "valor", "desconto", "data", "categoria"]
+
+
+def _rows(start, count):
+    return [
+        (i, Decimal("1.50") * i, None if i % 2 else Decimal("0.10"), date(2024, 1, 1), f"cat{i % 3}")
+        for i in range(start, start + count)
+    ]
+
+
+@pytest.fixture
+def store(tmp_path):
+    # pyarrow é dependência de dev: só o job sem opcionais pode pular
+    if os.environ.get("SKIP_OPTIONAL_DEPS"):
+        pytest.importorskip("pyarrow")
+    return SpillStore(str(tmp_path))
+
+
+@pytest.mark.unit
+class TestResultSpill:
+    
+    def test_batches_are_written_and_read_back_by_memory_map(self, store):
+        writer = store.writer(COLUMNS)
+        writer.write(_rows(0, 500))
+        writer.write(_rows(500, 700))
+        
+        handle = writer.close()
+        table = open_spill(handle)
+        
+        assert handle.row_count == 1200 and table.num_rows == 1200
+        assert str(table.column("valor").type) == "double"
+        assert table.column("id").to_pylist()[1199] == 1199
+    
+    def test_preview_is_a_columnar_result(self, store):
+        writer = store.writer(COLUMNS)
+        writer.write(_rows(0, 50))
+        handle = writer.close()
+        
+        preview = read_preview(handle, 10)
+        
+        assert len(preview) == 10 and preview.column("id").dtype == np.int64
+        assert preview[1] == {"id": 1, "valor": 1.5, "desconto": None,
+                              "data": date(2024, 1, 1), "categoria": "cat1"}
+    
+    def test_cache_keeps_only_the_handle(self, store):
+        writer = store.writer(COLUMNS)
+        writer.write(_rows(0, 20))
+        result = {"data": [], "spill": writer.close().to_dict()}
+        
+        stored = stored_result(result)
+        
+        assert set(stored) == {"spill"}
+        assert len(load_result(stored, max_rows=5)) == 5
+    
+    def test_null_only_first_batch_takes_the_type_of_later_batches(self, store):
+        writer = store.writer(["id", "desconto"])
+        writer.write([(i, None) for i in range(10)])
+        writer.write([(10, 5), (11, None)])
+        writer.write([(12, Decimal("0.25"))])
+        
+        table = open_spill(writer.close())
+        
+        assert str(table.column("desconto").type) == "double"
+        assert table.column("desconto").to_pylist()[9:] == [None, 5.0, None, 0.25]
+        assert table.column("id").to_pylist() == list(range(13))
+    
+    def test_empty_and_null_only_results_keep_their_columns(self, store):
+        empty = store.writer(COLUMNS).close()
+        writer = store.writer(["desconto"])
+        writer.write([(None,), (None,)])
+        
+        assert open_spill(empty).column_names == COLUMNS
+        assert read_preview(writer.close(), 5)[1] == {"desconto": None}
+    
+    def test_handle_exposes_an_id_instead_of_the_path(self, store, tmp_path):
+        writer = store.writer(COLUMNS)
+        writer.write(_rows(0, 5))
+        handle = writer.close()
+        
+        assert str(tmp_path) not in handle.spill_id
+        assert handle.path.endswith(f"{handle.spill_id}.arrow")
+    
+    def test_abort_removes_the_partial_file(self, store, tmp_path):
+        writer = store.writer(COLUMNS)
+        writer.write(_rows(0, 10))
+        
+        writer.abort()
+        
+        assert list(tmp_path.iterdir()) == []
+    
+    def test_expired_files_are_purged(self, store):
+        store.ttl = -1
+        writer = store.writer(COLUMNS)
+        writer.write(_rows(0, 10))
+        writer.close()
+        
+        assert store.purge() == 1
+
+
+@pytest.mark.unit
+def test_results_without_spill_round_trip_as_records():
+    stored = stored_result({"data": [{"id": 1, "valor": 2.5}]})
+    
+    assert load_result(stored)[0] == {"id": 1, "valor": 2.5}
@@ -0,0 +1,96 @@
+import pytest
+from src.database.schema_catalog import FALLBACK_TABLES, SchemaCatalog, build_tables, index_columns
+from src.orchestration.mcp_context import MCPContext
+
+
+COLUMNS = [
+    ("clientes", "id", "integer"),
+    ("clientes", "nome", "character varying"),
+    ("transacoes", "id", "integer"),
+    ("transacoes", "cliente_id", "integer"),
+    ("transacoes", "data_transacao", "timestamp without time zone"),
+]
+INDEXES = [
+    ("clientes", "CREATE UNIQUE INDEX clientes_pkey ON public.clientes USING btree (id)"),
+    ("transacoes", "CREATE UNIQUE INDEX transacoes_pkey ON public.transacoes USING btree (id)"),
+    ("transacoes", "CREATE INDEX idx_transacoes_data ON public.transacoes USING btree (data_transacao DESC)"),
+]
+SIZES = [
+    ("clientes", 3_000_000.0, 500 * 1024 * 1024),
+    ("transacoes", 150_000_000.0, 5 * 1024 ** 3),
+]
+CONSTRAINTS = [
+    ("PRIMARY KEY", "clientes", "id", "clientes", "id"),
+    ("PRIMARY KEY", "transacoes", "id", "transacoes", "id"),
+    ("FOREIGN KEY", "transacoes", "cliente_id", "clientes", "id"),
+]
+
+
+@pytest.fixture
+def live_tables():
+    return build_tables(COLUMNS, INDEXES, SIZES, CONSTRAINTS)
+
+
+@pytest.mark.unit
+class TestSchemaCatalog:
+    
+    def test_build_tables_from_introspection_rows(self, live_tables):
+        transacoes = live_tables["transacoes"]
+        
+        assert transacoes["count"] == 150_000_000
+        assert transacoes["size_mb"] == 5120.0
+        assert transacoes["columns"] == ["id", "cliente_id", "data_transacao"]
+        assert transacoes["indexed_columns"] == ["id", "data_transacao"]
+        assert transacoes["primary_key"] == ["id"]
+        assert transacoes["unique_columns"] == ["id"]
+        assert transacoes["foreign_keys"] == [{"column": "cliente_id", "references": "clientes.id"}]
+    
+    def test_index_columns_parses_multi_column_and_quoted(self):
+        indexdef = 'CREATE INDEX idx ON public.t USING btree ("Cliente_Id", data DESC)'
+        
+        assert index_columns(indexdef) == ["Cliente_Id", "data"]
+    
+    def test_expression_and_partial_indexes_are_ignored(self):
+        expression = "CREATE UNIQUE INDEX idx ON public.clientes USING btree (lower((email)::text))"
+        partial = "CREATE INDEX idx ON public.clientes USING btree (id) WHERE (ativo = true)"
+        
+        assert index_columns(expression) == []
+        assert index_columns(partial) == []
+        assert index_columns("CREATE INDEX idx ON t USING btree (id) INCLUDE (nome)") == ["id"]
+    
+    def test_catalog_is_reused_within_refresh_interval(self, live_tables):
+        calls = []
+        catalog = SchemaCatalog(fetch_fn=lambda: calls.append(1) or live_tables, refresh_interval=60)
+        
+        catalog.tables()
+        catalog.row_count("transacoes")
+        assert calls == [1]
+        
+        catalog.refresh()
+        catalog.tables()
+        assert calls == [1, 1]
+    
+    def test_falls_back_when_database_is_unavailable(self):
+        def failing_fetch():
+            raise ConnectionError("database down")
+        
+        catalog = SchemaCatalog(fetch_fn=failing_fetch)
+        
+        assert catalog.snapshot() is FALLBACK_TABLES
+        assert catalog.row_count("transacoes") == FALLBACK_TABLES["transacoes"]["count"]
+    
+    def test_validator_uses_real_cardinalities(self, live_tables):
+        from src.agents.sql_validator import SQLValidatorOptimizer
+        from src.database.column_statistics import ColumnStatistics
+        
+        catalog = SchemaCatalog(fetch_fn=lambda: live_tables)
+        validator = SQLValidatorOptimizer(
+            catalog=catalog, statistics=ColumnStatistics(fetch_fn=dict, catalog=catalog)
+        )
+        context = MCPContext(user_id="u", session_id="s", original_question="q")
+        context.generated_sql = "SELECT id FROM transacoes"
+        
+        validator.validate(context)
+        
+        assert context.validation_result["estimated_rows"] == 150_000_000
+        assert context.validation_result["estimated_cost"] == "very_high"
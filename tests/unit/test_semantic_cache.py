@@ -0,0 +1,410 @@
+import pytest
+import time
+
+
+class FakeEmbeddings:
+    """Embeddings determinísticos: perguntas do mesmo grupo são quase iguais"""
+    
+    GROUPS = {
+        "clientes": [1.0, 0.0, 0.0],
+        "produtos": [0.0, 1.0, 0.0],
+    }
+    
+    def __init__(self):
+        self.calls = 0
+    
+    def embed_query(self, text):
+        self.calls += 1
+        for word, vector in self.GROUPS.items():
+            if word in text:
+                return [v + 0.01 * (len(text) % 5) for v in vector]
+        return [0.0, 0.0, 1.0]
+
+
+@pytest.fixture
+def table_versions():
+    """Versões dos dados por tabela (simula pg_stat_user_tables)"""
+    return {"clientes": 1, "produtos": 1, "transacoes": 1}
+
+
+@pytest.fixture
+def cache_factory(tmp_path, monkeypatch, table_versions):
+    monkeypatch.chdir(tmp_path)
+    from src.database.data_versions import DataVersionTracker
+    from src.memory.persistent_memory import SemanticMemoryCache
+    
+    def factory(**kwargs):
+        kwargs.setdefault("data_versions", DataVersionTracker(
+            fetch_fn=lambda: dict(table_versions), refresh_interval=0
+        ))
+        return SemanticMemoryCache(db_path=str(tmp_path / "cache.db"), embeddings=FakeEmbeddings(), **kwargs)
+    
+    return factory
+
+
+@pytest.mark.unit
+class TestSemanticMemoryCache:
+    
+    def test_exact_match_hit(self, cache_factory):
+        cache = cache_factory()
+        cache.save_to_cache("Quantos clientes temos?", "SELECT COUNT(*) FROM clientes", [{"count": 5}])
+        cache.flush()
+        
+        cached = cache.check_cache("quantos clientes temos")
+        
+        assert cached['sql_query'] == "SELECT COUNT(*) FROM clientes"
+        assert cached['result'] == [{"count": 5}]
+    
+    def test_paraphrase_hits_by_similarity(self, cache_factory):
+        cache = cache_factory(similarity_threshold=0.9)
+        cache.save_to_cache("Quantos clientes temos?", "SELECT COUNT(*) FROM clientes", [{"count": 5}])
+        cache.flush()
+        
+        cached = cache.check_cache("Qual o número de clientes?")
+        
+        assert cached is not None
+        assert cached['sql_query'] == "SELECT COUNT(*) FROM clientes"
+    
+    def test_similar_question_with_other_literal_misses(self, cache_factory):
+        cache = cache_factory(similarity_threshold=0.9)
+        cache.save_to_cache("Total de vendas dos clientes em março", "SELECT 1 FROM clientes", [{"total": 5}])
+        cache.flush()
+        
+        assert cache.check_cache("Total de vendas dos clientes em abril") is None
+        assert cache.check_cache("Total de vendas dos clientes em 2023") is None
+        assert cache.check_cache("total das vendas dos clientes em Março") is not None
+    
+    def test_dissimilar_question_misses(self, cache_factory):
+        cache = cache_factory(similarity_threshold=0.9)
+        cache.save_to_cache("Quantos clientes temos?", "SELECT COUNT(*) FROM clientes", [{"count": 5}])
+        cache.flush()
+        
+        assert cache.check_cache("Quantos produtos temos?") is None
+    
+    def test_question_is_embedded_outside_sqlite_transactions(self, cache_factory):
+        from contextlib import contextmanager
+        cache = cache_factory(similarity_threshold=0.9)
+        cache.save_to_cache("Quantos clientes temos?", "SELECT COUNT(*) FROM clientes", [{"count": 5}])
+        cache.flush()
+        
+        open_transactions, embedded_inside = [], []
+        transaction = cache.storage.transaction
+        
+        @contextmanager
+        def tracked():
+            open_transactions.append(1)
+            try:
+                with transaction() as conn:
+                    yield conn
+            finally:
+                open_transactions.pop()
+        
+        embed_query = cache.embeddings.embed_query
+        cache.embeddings.embed_query = lambda text: embedded_inside.append(bool(open_transactions)) or embed_query(text)
+        cache.storage.transaction = tracked
+        
+        assert cache.check_cache("Qual o número de clientes?") is not None
+        assert embedded_inside == [False]
+    
+    def test_index_is_rebuilt_from_disk(self, cache_factory):
+        cache = cache_factory()
+        cache.save_to_cache("Quantos clientes temos?", "SELECT COUNT(*) FROM clientes", [{"count": 5}])
+        cache.close()
+        
+        reopened = cache_factory(similarity_threshold=0.9)
+        
+        assert len(reopened.vector_index) == 1
+        assert reopened.check_cache("Qual o número de clientes?") is not None
+    
+    def test_storage_uses_wal_and_persistent_connection(self, cache_factory):
+        cache = cache_factory()
+        
+        conn = cache.storage.connection()
+        
+        assert conn is cache.storage.connection()
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    
+    def test_concurrent_threads(self, cache_factory):
+        from concurrent.futures import ThreadPoolExecutor
+        cache = cache_factory()
+        
+        def work(i):
+            cache.save_to_cache(f"pergunta {i}", f"SELECT {i}", [{"n": i}])
+            cache.flush()
+            return cache.check_cache(f"pergunta {i}")
+        
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(work, range(40)))
+        
+        assert all(r is not None for r in results)
+        assert cache.get_cache_statistics()['total_cached_queries'] == 40
+        cache.close()
+    
+    def test_write_behind_batches_history_and_hits(self, cache_factory):
+        cache = cache_factory()
+        
+        cache.save_interaction("u1", "s1", "Quantos clientes temos?",
+                               sql_query="SELECT COUNT(*) FROM clientes", result=[{"count": 5}])
+        cache.flush()
+        for _ in range(3):
+            assert cache.check_cache("Quantos clientes temos?") is not None
+        
+        stats = cache.get_cache_statistics()
+        
+        assert len(cache.get_session_context("u1", "s1")) == 1
+        assert stats['total_cache_hits'] == 4
+        cache.close()
+    
+    def test_max_entries_evicts_down_to_budget(self, cache_factory):
+        cache = cache_factory(write_behind=False, max_entries=3)
+        
+        for i in range(5):
+            cache.save_to_cache(f"pergunta {i}", f"SELECT {i}", [{"n": i}])
+        
+        assert cache.get_cache_statistics()['total_cached_queries'] == 3
+        assert len(cache.vector_index) == 3
+    
+    def test_lfu_keeps_frequently_hit_entries(self, cache_factory):
+        cache = cache_factory(write_behind=False, max_entries=2, eviction_policy="lfu")
+        cache.save_to_cache("Quantos clientes temos?", "SELECT COUNT(*) FROM clientes", [{"count": 5}])
+        cache.save_to_cache("Quantos produtos temos?", "SELECT COUNT(*) FROM produtos", [{"count": 7}])
+        for _ in range(3):
+            cache.check_cache("Quantos clientes temos?")
+        
+        cache.save_to_cache("pergunta nova", "SELECT 1", [{"n": 1}])
+        
+        assert cache.check_cache("Quantos clientes temos?") is not None
+        assert cache.check_cache("Quantos produtos temos?") is None
+    
+    def test_max_bytes_budget(self, cache_factory):
+        cache = cache_factory(write_behind=False, max_bytes=2000)
+        
+        for i in range(10):
+            cache.save_to_cache(f"pergunta {i}", f"SELECT {i}", [{"payload": "x" * 300}])
+        
+        stats = cache.get_cache_statistics()
+        assert stats['cache_bytes'] <= 2000
+        assert stats['total_cached_queries'] < 10
+    
+    def test_expired_entry_is_a_miss(self, cache_factory):
+        cache = cache_factory(write_behind=False)
+        cache.save_to_cache("Quantos clientes temos?", "SELECT COUNT(*) FROM clientes",
+                            [{"count": 5}], ttl=0.01)
+        
+        time.sleep(0.02)
+        
+        assert cache.check_cache("Quantos clientes temos?") is None
+    
+    def test_unknown_eviction_policy(self, cache_factory):
+        with pytest.raises(ValueError):
+            cache_factory(eviction_policy="fifo")
+    
+    def test_entry_invalidated_when_its_tables_change(self, cache_factory, table_versions):
+        cache = cache_factory(write_behind=False)
+        cache.save_to_cache("Total gasto por cliente",
+                            "SELECT c.nome, SUM(t.valor_total) FROM clientes c "
+                            "JOIN transacoes t ON t.cliente_id = c.id GROUP BY c.nome", [{"total": 10}],
+                            table_versions={"clientes": 1, "transacoes": 1})
+        cache.save_to_cache("Quantos produtos temos?", "SELECT COUNT(*) FROM produtos", [{"count": 7}],
+                            table_versions={"produtos": 1})
+        
+        table_versions["transacoes"] += 1
+        
+        assert cache.check_cache("Total gasto por cliente") is None
+        assert cache.check_cache("Quantos produtos temos?") is not None
+        assert cache.get_cache_statistics()['total_cached_queries'] == 1
+
+
+@pytest.mark.unit
+def test_question_literals():
+    from src.memory.question_literals import extract_literals
+    
+    assert extract_literals("Vendas de Março de 2024 em São Paulo") == {"marco", "2024", "sao", "paulo"}
+    assert extract_literals("Clientes com nome 'Ana'") == {'"ana"'}
+    assert extract_literals("Quantos clientes temos?") == frozenset()
+
+
+@pytest.mark.unit
+def test_extract_tables():
+    from src.database.data_versions import extract_tables
+    
+    sql = 'SELECT * FROM public."Clientes" c JOIN transacoes t ON t.cliente_id = c.id'
+    
+    assert extract_tables(sql) == ["clientes", "transacoes"]
+    # Join por vírgula; FROM de EXTRACT e texto em literal não são tabelas
+    assert extract_tables("SELECT c.nome FROM clientes c, transacoes t "
+                          "WHERE c.id = t.cliente_id") == ["clientes", "transacoes"]
+    assert extract_tables("SELECT EXTRACT(YEAR FROM data_transacao) AS ano FROM transacoes "
+                          "WHERE descricao <> 'compra from clientes'") == ["transacoes"]
+    assert extract_tables("WITH t AS (SELECT * FROM produtos) SELECT * FROM t") == ["produtos"]
+
+
+@pytest.mark.unit
+class TestStaleWhileRevalidate:
+    
+    def test_soft_expired_hit_is_served_and_refreshed(self, cache_factory):
+        calls = []
+        
+        def refresh_fn(sql):
+            calls.append(sql)
+            return {'success': True, 'data': [{"count": 6}]}
+        
+        cache = cache_factory(write_behind=False, soft_ttl=0.01, refresh_fn=refresh_fn)
+        cache.save_to_cache("Quantos clientes temos?", "SELECT COUNT(*) FROM clientes", [{"count": 5}])
+        time.sleep(0.02)
+        
+        stale = cache.check_cache("Quantos clientes temos?")
+        cache.refresher.wait()
+        
+        assert stale['result'] == [{"count": 5}]
+        assert stale['refreshing'] is True
+        assert calls == ["SELECT COUNT(*) FROM clientes"]
+        assert cache.check_cache("Quantos clientes temos?")['result'] == [{"count": 6}]
+    
+    def test_concurrent_refreshes_are_deduplicated(self, cache_factory):
+        import threading
+        release = threading.Event()
+        calls = []
+        
+        def refresh_fn(sql):
+            calls.append(sql)
+            release.wait(5)
+            return {'success': True, 'data': [{"count": 6}]}
+        
+        cache = cache_factory(write_behind=False, soft_ttl=0.01, refresh_fn=refresh_fn)
+        cache.save_to_cache("Quantos clientes temos?", "SELECT COUNT(*) FROM clientes", [{"count": 5}])
+        time.sleep(0.02)
+        
+        for _ in range(5):
+            assert cache.check_cache("Quantos clientes temos?") is not None
+        release.set()
+        cache.refresher.wait()
+        
+        assert len(calls) == 1
+    
+    def test_refresh_is_tagged_with_the_executor_versions(self, cache_factory, table_versions):
+        from src.database.data_versions import DataVersionTracker
+        fetches = []
+        tracker = DataVersionTracker(fetch_fn=lambda: fetches.append(1) or dict(table_versions),
+                                     refresh_interval=0)
+        
+        def refresh_fn(sql):
+            return {'success': True, 'data': [{"count": 6}], 'table_versions': {"clientes": 2}}
+        
+        cache = cache_factory(soft_ttl=0.01, refresh_fn=refresh_fn, data_versions=tracker)
+        cache.save_to_cache("Quantos clientes temos?", "SELECT COUNT(*) FROM clientes", [{"count": 5}],
+                            table_versions={"clientes": 1})
+        cache.flush()
+        assert fetches == []   # escrita não consulta o PostgreSQL
+        time.sleep(0.02)
+        
+        cache.check_cache("Quantos clientes temos?")
+        cache.refresher.wait()
+        cache.flush()
+        table_versions["clientes"] = 2
+        
+        assert cache.check_cache("Quantos clientes temos?")['result'] == [{"count": 6}]
+    
+    def test_failed_refresh_keeps_cached_result(self, cache_factory):
+        cache = cache_factory(write_behind=False, soft_ttl=0.01,
+                              refresh_fn=lambda sql: {'success': False, 'error': 'timeout'})
+        cache.save_to_cache("Quantos clientes temos?", "SELECT COUNT(*) FROM clientes", [{"count": 5}])
+        time.sleep(0.02)
+        
+        cache.check_cache("Quantos clientes temos?")
+        cache.refresher.wait()
+        
+        assert cache.check_cache("Quantos clientes temos?")['result'] == [{"count": 5}]
+
+
+@pytest.mark.unit
+class TestCachedResponse:
+    
+    def test_formatted_response_is_served_from_cache(self, cache_factory):
+        cache = cache_factory(write_behind=False)
+        cache.save_interaction("u1", "s1", "Quantos clientes temos?",
+                               sql_query="SELECT COUNT(*) FROM clientes", result=[{"count": 5}],
+                               formatted_response="Temos 5 clientes.",
+                               evidence_check={"is_correct": True, "issues": []})
+        
+        cached = cache.check_cache("Quantos clientes temos?")
+        
+        assert cached['formatted_response'] == "Temos 5 clientes."
+        assert cached['evidence_check']['is_correct'] is True
+    
+    def test_refresh_clears_response_and_rejects_outdated_one(self, cache_factory):
+        cache = cache_factory(write_behind=False, soft_ttl=0.01,
+                              refresh_fn=lambda sql: {'success': True, 'data': [{"count": 6}]})
+        cache.save_interaction("u1", "s1", "Quantos clientes temos?",
+                               sql_query="SELECT COUNT(*) FROM clientes", result=[{"count": 5}],
+                               formatted_response="Temos 5 clientes.")
+        time.sleep(0.02)
+        
+        stale = cache.check_cache("Quantos clientes temos?")
+        cache.refresher.wait()
+        # Resposta formatada sobre o resultado antigo não pode ir para a entrada renovada
+        cache.save_cached_response(stale['cache_id'], stale['result_version'], "Temos 5 clientes.")
+        refreshed = cache.check_cache("Quantos clientes temos?")
+        
+        assert refreshed['result'] == [{"count": 6}]
+        assert refreshed['formatted_response'] is None
+        
+        cache.save_cached_response(refreshed['cache_id'], refreshed['result_version'], "Temos 6 clientes.")
+        
+        assert cache.check_cache("Quantos clientes temos?")['formatted_response'] == "Temos 6 clientes."
+
+
+@pytest.mark.unit
+class TestSQLResultCache:
+    
+    def test_equivalent_sql_shares_one_result(self, cache_factory):
+        cache = cache_factory(write_behind=False)
+        cache.save_sql_result("select count(*) as total from Clientes;",
+                              {'success': True, 'data': [{"total": 5}]})
+        
+        cached = cache.get_sql_result("SELECT COUNT(*) AS total\nFROM clientes")
+        
+        assert cached['data'] == [{"total": 5}]
+        assert cache.get_sql_result("SELECT COUNT(*) FROM clientes WHERE id = 1") is None
+    
+    def test_failed_execution_is_not_cached(self, cache_factory):
+        cache = cache_factory(write_behind=False)
+        cache.save_sql_result("SELECT 1", {'success': False, 'error': 'timeout', 'data': []})
+        
+        assert cache.get_sql_result("SELECT 1") is None
+    
+    def test_invalidated_when_tables_change(self, cache_factory, table_versions):
+        cache = cache_factory(write_behind=False)
+        cache.save_sql_result("SELECT COUNT(*) FROM produtos", {'success': True, 'data': [{"count": 7}],
+                                                                'table_versions': {"produtos": 1}})
+        
+        table_versions["produtos"] += 1
+        
+        assert cache.get_sql_result("SELECT COUNT(*) FROM produtos") is None
+    
+    def test_page_cursor_outlives_data_changes(self, cache_factory, table_versions):
+        from src.database.sql_fingerprint import fingerprint
+        
+        cache = cache_factory(write_behind=False)
+        sql = "SELECT id, nome FROM clientes"
+        cache.save_page_cursor(sql, {"keys": ["id"], "base_sql": sql, "descending": False})
+        table_versions["clientes"] += 1
+        
+        cursor = cache.get_page_cursor(fingerprint(sql))
+        
+        assert cursor["sql_query"] == sql and cursor["plan"]["keys"] == ["id"]
+        assert cache.get_page_cursor("unknown") is None
+
+
+@pytest.mark.unit
+def test_sql_fingerprint_canonicalization():
+    from src.database.sql_fingerprint import canonicalize, fingerprint
+    
+    assert fingerprint("select  nome from CLIENTES where id = 1 ;") == \
+        fingerprint("SELECT nome\nFROM clientes\nWHERE id=1")
+    assert fingerprint("SELECT nome FROM clientes WHERE id = 1") != \
+        fingerprint("SELECT nome FROM clientes WHERE id = 2")
+    assert canonicalize("SELECT nome FROM clientes WHERE id = 2", parameterize=True) == \
+        "SELECT nome FROM clientes WHERE id = ?"
+    assert fingerprint("SELECT 1; DROP TABLE clientes") != fingerprint("SELECT 1")
+    assert canonicalize("select 1; select 2;") == "SELECT 1 ; SELECT 2"
@@ -0,0 +1,97 @@
+import pytest
+from unittest.mock import patch
+import sqlparse
+from src.database.column_statistics import ColumnStatistics
+from src.database.schema_catalog import FALLBACK_TABLES, SchemaCatalog
+from src.database.sql_analysis import AnalysisCache, Predicate, analysis_cache, analyze
+from src.orchestration.mcp_context import MCPContext
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    analysis_cache.clear()
+    yield
+    analysis_cache.clear()
+
+
+def validate(sql):
+    from src.agents.sql_validator import SQLValidatorOptimizer
+    
+    catalog = SchemaCatalog(fetch_fn=lambda: FALLBACK_TABLES)
+    validator = SQLValidatorOptimizer(
+        catalog=catalog, statistics=ColumnStatistics(fetch_fn=dict, catalog=catalog)
+    )
+    context = MCPContext(user_id="u", session_id="s", original_question="q")
+    context.generated_sql = sql
+    validator.validate(context)
+    return context.validation_result
+
+
+@pytest.mark.unit
+class TestQueryAnalysis:
+    
+    def test_collects_tables_predicates_and_joins(self):
+        analysis = analyze(
+            "SELECT c.nome FROM clientes c JOIN transacoes t ON c.id = t.cliente_id "
+            "WHERE t.data_transacao BETWEEN '2024-01-01' AND '2024-02-01' "
+            "AND c.id IN (1, 2) AND 100 < t.valor_total ORDER BY c.nome LIMIT 20"
+        )
+        
+        assert analysis.tables == {"clientes": "clientes", "c": "clientes",
+                                   "transacoes": "transacoes", "t": "transacoes"}
+        assert analysis.joins[0] == ("c", "id", "t", "cliente_id")
+        assert analysis.predicates == [
+            Predicate("t", "data_transacao", "BETWEEN", ("'2024-01-01'", "'2024-02-01'")),
+            Predicate("c", "id", "IN", ["1", "2"]),
+            Predicate("t", "valor_total", ">", "100"),
+        ]
+        assert analysis.join_count == 1
+        assert analysis.limit == 20 and analysis.has_order_by
+    
+    def test_string_literals_are_not_tables_or_keywords(self):
+        analysis = analyze("SELECT nome FROM clientes WHERE nome = 'FROM transacoes; DROP TABLE x --'")
+        
+        assert analysis.referenced_tables == ["clientes"]
+        assert "DROP" not in analysis.keywords
+        assert not analysis.has_comment and analysis.statement_count == 1
+    
+    def test_subquery_limit_is_not_the_outer_limit(self):
+        analysis = analyze("SELECT * FROM (SELECT id FROM transacoes LIMIT 5) sub")
+        
+        assert analysis.limit is None
+        assert analysis.referenced_tables == ["transacoes"]
+    
+    def test_analysis_is_memoized(self):
+        cache = AnalysisCache(max_entries=1)
+        sql = "SELECT id FROM clientes"
+        
+        first = cache.analyze(sql)
+        
+        assert cache.analyze(sql + "  ") is first
+        cache.analyze("SELECT id FROM produtos")   # max_entries=1: descarta a primeira
+        assert cache.analyze(sql) is not first
+
+
+@pytest.mark.unit
+class TestValidatorUsesAnalysis:
+    
+    def test_sql_is_parsed_once_per_validation(self):
+        with patch("src.database.sql_analysis.sqlparse.parse", wraps=sqlparse.parse) as parse:
+            validate("SELECT nome FROM clientes WHERE id = 1")
+            validate("SELECT nome FROM clientes WHERE id = 1")
+        
+        assert parse.call_count == 1
+    
+    def test_table_name_inside_string_is_ignored(self):
+        result = validate("SELECT nome FROM clientes WHERE nome = 'transacoes'")
+        
+        assert result["is_valid"]
+        assert result["optimized_sql"] == "SELECT nome FROM clientes WHERE nome = 'transacoes'"
+        assert not any("Unknown table" in w for w in result["warnings"])
+    
+    def test_second_statement_is_blocked(self):
+        result = validate("SELECT nome FROM clientes; DROP TABLE clientes")
+        
+        assert not result["is_valid"]
+        assert "Dangerous pattern detected: DROP" in result["errors"]
+        assert "Operation not allowed: DROP" in result["errors"]
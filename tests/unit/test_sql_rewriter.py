@@ -0,0 +1,150 @@
+import pytest
+from src.database.column_statistics import ColumnStatistics
+from src.database.schema_catalog import FALLBACK_TABLES, SchemaCatalog
+from src.database.sql_analysis import analyze
+from src.database.sql_rewriter import QueryRewriter
+from src.orchestration.mcp_context import MCPContext
+
+
+@pytest.fixture
+def catalog():
+    return SchemaCatalog(fetch_fn=lambda: FALLBACK_TABLES)
+
+
+@pytest.fixture
+def rewriter(catalog):
+    return QueryRewriter(catalog, max_limit=10000)
+
+
+def rewrite(rewriter, sql, question=""):
+    return rewriter.rewrite(sql, analyze(sql), question)
+
+
+@pytest.mark.unit
+class TestQueryRewriter:
+    
+    def test_limit_goes_to_the_outer_query(self, rewriter):
+        result = rewrite(rewriter, "SELECT id FROM (SELECT id FROM transacoes LIMIT 5) x;")
+        assert result.sql == "SELECT id FROM (SELECT id FROM transacoes LIMIT 5) x LIMIT 100;"
+        
+        result = rewrite(rewriter, "SELECT id FROM transacoes UNION SELECT id FROM clientes")
+        assert result.sql.endswith("UNION SELECT id FROM clientes LIMIT 100")
+    
+    def test_limit_follows_a_trailing_subquery(self, rewriter):
+        result = rewrite(rewriter, "SELECT nome FROM clientes c, transacoes t "
+                                   "WHERE t.id IN (SELECT id FROM produtos);")
+        assert result.sql.endswith("WHERE t.id IN (SELECT id FROM produtos) LIMIT 100;")
+        
+        result = rewrite(rewriter, "SELECT id FROM transacoes t WHERE EXISTS "
+                                   "(SELECT 1 FROM clientes c WHERE c.id = t.cliente_id)")
+        assert result.sql.endswith("WHERE c.id = t.cliente_id) LIMIT 100")
+        
+        result = rewrite(rewriter, "SELECT id FROM transacoes -- recentes")
+        assert result.sql == "SELECT id FROM transacoes LIMIT 100 -- recentes"
+    
+    def test_fetch_and_non_numeric_limits_are_kept(self, rewriter):
+        for sql in ("SELECT id FROM transacoes ORDER BY id FETCH FIRST 10 ROWS ONLY",
+                    "SELECT id FROM transacoes LIMIT ALL",
+                    "SELECT id FROM transacoes LIMIT :n"):
+            assert rewrite(rewriter, sql).applied == ()
+    
+    def test_limit_message_names_the_query_shape(self, rewriter):
+        union = rewrite(rewriter, "SELECT nome FROM clientes UNION SELECT nome FROM produtos")
+        join = rewrite(rewriter, "SELECT c.nome FROM clientes c JOIN produtos p ON p.id = c.id")
+        
+        assert "UNION" in union.optimizations[0]
+        assert "JOINs" in join.optimizations[0]
+    
+    def test_limit_above_maximum_is_tightened(self, rewriter):
+        result = rewrite(rewriter, "SELECT id FROM clientes ORDER BY id LIMIT 50000")
+        
+        assert result.sql == "SELECT id FROM clientes ORDER BY id LIMIT 10000"
+        assert result.applied == ("limit",)
+    
+    def test_single_row_aggregate_gets_no_limit(self, rewriter):
+        assert rewrite(rewriter, "SELECT COUNT(*) FROM transacoes").applied == ()
+    
+    def test_repeated_or_becomes_in(self, rewriter):
+        result = rewrite(rewriter, "SELECT nome FROM produtos WHERE categoria = 'Livros' "
+                                   "OR categoria = 'Moda' OR preco > 100")
+        
+        assert result.sql == ("SELECT nome FROM produtos WHERE categoria IN ('Livros', 'Moda') "
+                              "OR preco > 100")
+    
+    def test_or_mixed_with_and_is_left_alone(self, rewriter):
+        sql = "SELECT nome FROM clientes WHERE id = 1 OR id = 2 AND saldo > 0"
+        
+        assert rewrite(rewriter, sql).sql == sql
+    
+    def test_select_star_is_expanded_to_question_columns(self, rewriter):
+        result = rewrite(rewriter, "SELECT * FROM clientes", "Qual o e-mail e o saldo dos clientes?")
+        
+        assert result.sql == "SELECT id, nome, email, saldo FROM clientes"
+        assert rewrite(rewriter, "SELECT * FROM clientes", "Liste os clientes").applied == ()
+    
+    def test_select_star_needs_an_exact_column_name(self, rewriter, catalog):
+        # "clientes" não é cliente_id: expandir esconderia as colunas pedidas
+        sql = "SELECT * FROM transacoes LIMIT 10"
+        assert rewrite(rewriter, sql, "Mostre as transações dos clientes").applied == ()
+        
+        catalog._column_aliases = {"transacoes": {"valor_total": ("valor gasto",)}}
+        result = rewrite(rewriter, sql, "Qual o valor gasto nas transações?")
+        assert result.sql == "SELECT id, valor_total FROM transacoes LIMIT 10"
+    
+    def test_date_filter_is_pushed_into_derived_table(self, rewriter):
+        sql = ("SELECT c.nome, t.valor_total FROM clientes c "
+               "JOIN (SELECT cliente_id, valor_total, data_transacao FROM transacoes) t "
+               "ON c.id = t.cliente_id WHERE t.data_transacao >= '2024-01-01' LIMIT 10")
+        
+        result = rewrite(rewriter, sql)
+        
+        assert ("FROM transacoes WHERE transacoes.data_transacao >= '2024-01-01') t"
+                in result.sql)
+        assert rewrite(rewriter, result.sql).applied == ()
+    
+    def test_date_filter_is_pushed_into_cte_read_once(self, rewriter):
+        sql = ("WITH t AS (SELECT * FROM transacoes) "
+               "SELECT id FROM t WHERE t.data_transacao >= '2024-01-01' LIMIT 10")
+        
+        assert "date_pushdown" in rewrite(rewriter, sql).applied
+    
+    @pytest.mark.parametrize("sql", [
+        "WITH t AS (SELECT * FROM transacoes) SELECT id FROM t "
+        "WHERE t.data_transacao >= '2024-01-01' UNION ALL SELECT id FROM t",
+        "WITH t AS (SELECT * FROM transacoes) SELECT id, (SELECT COUNT(*) FROM t) AS total "
+        "FROM t WHERE t.data_transacao >= '2024-01-01' LIMIT 10",
+        "WITH t AS (SELECT * FROM transacoes) SELECT a.id FROM t a JOIN t b ON b.id = a.id "
+        "WHERE t.data_transacao >= '2024-01-01' LIMIT 10",
+    ])
+    def test_no_pushdown_into_cte_read_more_than_once(self, rewriter, sql):
+        assert "date_pushdown" not in rewrite(rewriter, sql).applied
+    
+    def test_no_pushdown_through_limit_or_or(self, rewriter):
+        limited = ("SELECT t.id FROM (SELECT id, data_transacao FROM transacoes LIMIT 5) t "
+                   "WHERE t.data_transacao >= '2024-01-01'")
+        with_or = ("SELECT t.id FROM (SELECT id, data_transacao FROM transacoes) t "
+                   "WHERE t.data_transacao >= '2024-01-01' OR t.id = 1 LIMIT 10")
+        
+        assert "date_pushdown" not in rewrite(rewriter, limited).applied
+        assert rewrite(rewriter, with_or).applied == ()
+
+
+@pytest.mark.unit
+def test_validator_records_rewrites(catalog):
+    from src.agents.sql_validator import SQLValidatorOptimizer
+    
+    validator = SQLValidatorOptimizer(
+        catalog=catalog, statistics=ColumnStatistics(fetch_fn=dict, catalog=catalog)
+    )
+    context = MCPContext(user_id="u", session_id="s", original_question="Valor total das transações")
+    context.generated_sql = "SELECT * FROM transacoes WHERE produto_id = 1 OR produto_id = 2"
+    
+    validator.validate(context)
+    
+    result = context.validation_result
+    assert context.generated_sql == (
+        "SELECT id, valor_total FROM transacoes WHERE produto_id IN (1, 2) LIMIT 100"
+    )
+    assert result["rewrites"] == ["or_to_in", "select_star", "limit"]
+    assert len(result["optimizations"]) == 3
+    assert not any("SELECT *" in w for w in result["warnings"])